@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Micro-benchmark of the per file cost of parsing RST into doctrees.
+
+Compares ``docutils.core.publish_doctree``, which sets up docutils for every
+file, with the reused ``DoctreeParser`` of the rst2dtree task on a set of
+small generated RST files.
+
+usage: python benchmarks/rst2dtree_parse.py [number of files]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'src'))
+
+from docutils.core import publish_doctree  # noqa: E402
+from docutils.io import FileInput  # noqa: E402
+
+from escadrille.tasks.rst2dtree import DoctreeParser  # noqa: E402
+
+PAGE = '''Page %d
+=========
+
+:date: 2017-08-27 12:00
+:tags: benchmark
+
+A short paragraph with *emphasis*, ``literals`` and a
+`link <https://example.com/%d>`_.
+
+Section
+-------
+
+- one
+- two
+'''
+
+
+def write_pages(directory, count):
+    """Write count small RST pages and return their paths."""
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, 'page%d.rst' % index)
+        with open(path, 'w') as fout:
+            fout.write(PAGE % (index, index))
+        paths.append(path)
+    return paths
+
+
+def publish_each(paths):
+    """Parse each file with a fresh docutils setup."""
+    for path in paths:
+        with open(path, 'r') as fin:
+            publish_doctree(source=fin, source_class=FileInput)
+
+
+def reuse_parser(paths):
+    """Parse each file with one reused DoctreeParser."""
+    parser = DoctreeParser()
+    for path in paths:
+        parser.parse(path)
+
+
+def main():
+    """Time both ways of parsing and print the cost per file."""
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    directory = tempfile.mkdtemp()
+    try:
+        paths = write_pages(directory, count)
+        # warm up imports and caches
+        publish_each(paths[:5])
+        reuse_parser(paths[:5])
+        for name, parse in [('publish_doctree', publish_each),
+                            ('DoctreeParser', reuse_parser)]:
+            start = time.perf_counter()
+            parse(paths)
+            elapsed = time.perf_counter() - start
+            print('%-16s %6.2f ms per file (%d files)' %
+                  (name, elapsed * 1000.0 / count, count))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -232,10 +232,13 @@ setup(
     package_dir={'': 'src'},
     packages=find_packages('src'),
     entry_points={
-        'console_scripts': ['escadrille=escadrille.core:CliInterface.main']
+        'console_scripts': [
+            'escadrille=escadrille.core:CliInterface.main',
+            'escadrille-client=escadrille.serve:client_main']
     },
     use_2to3=False,
     install_requires=install_requires(),
+    extras_require={'images': ['Pillow']},
     zip_safe=True,
     include_package_data=True,
     test_suite='escadrille.tests',
@@ -0,0 +1,81 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Asyncio support for tasks whose __call__ method is a coroutine.
+
+Coroutine tasks are run on one event loop in a background thread, so any
+number of them, and the subprocesses they wait on, can be in flight without
+tying up the scheduler's worker threads.
+
+Importing asyncio is slow, so the scheduler and the tasks only import this
+module once a coroutine actually needs to run.
+"""
+
+import asyncio
+import subprocess
+import threading
+
+
+class EventLoopThread(object):
+    """An asyncio event loop running in a background thread."""
+
+    def __init__(self):
+        """Create the event loop and start its thread."""
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, daemon=True,
+                                       name='escadrille-asyncio')
+        self.thread.start()
+
+    def _run_loop(self):
+        """Run the event loop until it is stopped."""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """Schedule a coroutine and return a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def close(self):
+        """Stop the event loop and wait for its thread to finish."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+async def check_call(command, env=None):
+    """Run a command without a shell, raising on a non-zero return code.
+
+    The asyncio equivalent of ``subprocess.check_call`` for a list of
+    arguments. The command runs with the env environment when one is given.
+    """
+    process = await asyncio.create_subprocess_exec(*command, env=env)
+    returncode = await process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, command)
+
+
+async def getoutput(command):
+    """Run a command without a shell and return its output.
+
+    The asyncio equivalent of ``subprocess.getoutput`` for a list of
+    arguments: stderr is included in the output, a trailing newline is
+    stripped and the return code is ignored.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT)
+    output, _ = await process.communicate()
+    output = output.decode('utf-8', errors='replace')
+    if output.endswith('\n'):
+        output = output[:-1]
+    return output
@@ -0,0 +1,166 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Build several sites in one process.
+
+The sites share one pool of worker threads, so the "jobs" budget applies to
+the whole batch, and tasks that are identical across sites (same task class,
+same resolved config and same incoming shared state) are only run once.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+from .cache import task_signature
+
+
+def read_manifest(path):
+    """Return the config file paths listed in a sites manifest.
+
+    The manifest lists one config file per line. Blank lines and lines
+    starting with "#" are ignored and relative paths are relative to the
+    manifest's directory.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    configs = []
+    with open(path, 'r') as fin:
+        for line in fin:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                configs.append(os.path.join(base, os.path.expanduser(line)))
+    return configs
+
+
+class TaskDeduplicator(object):
+    """Run identical tasks once and share their results between sites."""
+
+    def __init__(self):
+        """Set up instance vars for a TaskDeduplicator object."""
+        self.lock = threading.Lock()
+        self.results = {}
+
+    @staticmethod
+    def key(task, view):
+        """Return the key identifying identical runs of a task."""
+        return json.dumps([task_signature(task), dict(view)], sort_keys=True,
+                          default=repr)
+
+    def claim(self, task, view):
+        """Return the future of the task's results and whether we own it.
+
+        The owner runs the task and publishes its results to the future.
+        """
+        key = self.key(task, view)
+        with self.lock:
+            future = self.results.get(key)
+            owner = future is None
+            if owner:
+                future = self.results[key] = Future()
+        return future, owner
+
+    @staticmethod
+    def publish(future, task, view, new_state):
+        """Set the results of the task run on the future."""
+        state = None
+        if new_state is not None:
+            state = (dict(view.changes), list(view.removed))
+        future.set_result((task.status, list(task.warnings),
+                           list(task.errors), state))
+
+    @staticmethod
+    def reuse(task, view, result):
+        """Apply the results of an identical run to the task and view."""
+        print('Task "%s" is identical to a task of another site, reusing '
+              'its results.' % task.tag)
+        task.status, warnings, errors, state = result
+        task.warnings, task.errors = list(warnings), list(errors)
+        if state is None:
+            return None
+        changes, removed = state
+        view.update(changes)
+        for key in removed:
+            view.pop(key, None)
+        return view
+
+    def run(self, task, view, run):
+        """Run the task with the run callable, or reuse an identical run.
+
+        Returns the task's new state like ``InterfaceCore.run_task``.
+        """
+        future, owner = self.claim(task, view)
+        if not owner:
+            return self.reuse(task, view, future.result())
+        try:
+            new_state = run()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        self.publish(future, task, view, new_state)
+        return new_state
+
+    async def run_async(self, task, view, run):
+        """Run a coroutine task like run, without blocking the event loop.
+
+        The run callable returns the coroutine running the task.
+        """
+        future, owner = self.claim(task, view)
+        if not owner:
+            result = await asyncio.wrap_future(future)
+            return self.reuse(task, view, result)
+        try:
+            new_state = await run()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        self.publish(future, task, view, new_state)
+        return new_state
+
+
+class SiteBatch(object):
+    """Build several sites concurrently with a shared worker pool.
+
+    Each site is an engine object (see ``escadrille.core.InterfaceCore``)
+    with its config file loaded.
+    """
+
+    def __init__(self, sites, jobs=None):
+        """Set up instance vars for a SiteBatch object."""
+        self.sites = sites
+        self.jobs = jobs if jobs else os.cpu_count() or 1
+
+    def build_site(self, site):
+        """Build one site and return its status."""
+        print('Building site %s.' % site.config_file.filename)
+        try:
+            return site.build_site()
+        except Exception as exc:
+            print('Site %s failed: %s' % (site.config_file.filename, exc))
+            return 1
+
+    def run(self):
+        """Build every site and return the first non-zero status."""
+        dedup = TaskDeduplicator()
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            for site in self.sites:
+                site.executor = executor
+                site.dedup = dedup
+            with ThreadPoolExecutor(max_workers=len(self.sites)) as sites:
+                statuses = list(sites.map(self.build_site, self.sites))
+        for site, status in zip(self.sites, statuses):
+            print('Site %s: %s' % (site.config_file.filename,
+                                   'failed' if status else 'succeeded'))
+        return next((status for status in statuses if status), 0)
@@ -0,0 +1,236 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Task level incremental build cache.
+
+A cacheable task is fingerprinted from its class, its resolved config
+section, the general config section, the stat info of the files it reads and
+the shared state keys it requires, or the whole shared state when it does not
+declare its requirements. After a successful run the files the task wrote are
+stored as content addressed blobs along with the changes it made to the
+shared state. When a later run produces the same fingerprint the task is not
+executed; its outputs are restored from the blobs and its state changes are
+replayed instead.
+
+Blobs are hard links to the outputs where possible, copies otherwise. A task
+rewriting an output in place also changes a linked blob, so the stat info of
+each blob is recorded when it is stored and a blob whose stat info changed
+since is not used.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+
+from .config import GeneralOpts
+from .config import Sections
+from .verbosity import dprint
+from .version import VERSION
+
+
+def walk_files(paths):
+    """Yield every file found at the given file and directory paths."""
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            for dirpath, dirnames, fnames in os.walk(path):
+                dirnames.sort()
+                for fname in sorted(fnames):
+                    yield os.path.join(dirpath, fname)
+
+
+def hash_file(path):
+    """Return the sha1 hex digest of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fin:
+        for block in iter(lambda: fin.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# general options that do not change the results of a task
+VOLATILE_OPTS = [GeneralOpts.enabled_tasks.name, GeneralOpts.jobs.name,
+                 GeneralOpts.cache_dir.name]
+
+
+def task_signature(task):
+    """Return a list identifying the task's class and resolved config."""
+    config_file = task.config_file
+    general = {}
+    if config_file.has_section(Sections.general.name):
+        general = {key: value for key, value in
+                   config_file.section(Sections.general.name).items()
+                   if key not in VOLATILE_OPTS}
+    section = {}
+    if config_file.has_section(task.tag):
+        section = dict(config_file.section(task.tag).items())
+    return [VERSION, task.__class__.__module__, task.__class__.__name__,
+            general, section]
+
+
+class BuildCache(object):
+    """Persistent store of task fingerprints, outputs and state changes."""
+
+    def __init__(self, path):
+        """Set up instance vars for a BuildCache object."""
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.records_dir = os.path.join(self.path, 'tasks')
+        self.blobs_dir = os.path.join(self.path, 'blobs')
+
+    def _record_path(self, task):
+        """Return the path of the cache record for a task."""
+        key = '%s:%s' % (os.path.abspath(task.config_file.filename),
+                         task.tag)
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.records_dir, name + '.pkl')
+
+    def _blob_path(self, digest):
+        """Return the path of the blob holding content with the digest."""
+        return os.path.join(self.blobs_dir, digest[:2], digest)
+
+    def fingerprint(self, task, shared_state):
+        """Return the hex digest identifying a run of the task."""
+        inputs = []
+        for path in walk_files(task.input_paths()):
+            stat = os.stat(path)
+            inputs.append((path, stat.st_size, stat.st_mtime_ns))
+        requires = task.get_requires()
+        if requires is None:
+            state = dict(shared_state)
+        else:
+            state = {key: shared_state[key] for key in requires
+                     if key in shared_state}
+        data = json.dumps([task_signature(task), inputs, state],
+                          sort_keys=True, default=repr)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def lookup(self, task, fingerprint):
+        """Return the stored record for the task if the fingerprint matches."""
+        try:
+            with open(self._record_path(task), 'rb') as fin:
+                record = pickle.load(fin)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if record.get('fingerprint') != fingerprint or 'state' not in record:
+            return None
+        for output in record['outputs'].values():
+            if len(output) != 5 or not self._blob_valid(output[0],
+                                                        output[4]):
+                return None
+        return record
+
+    def _blob_valid(self, digest, blob_stat):
+        """Return True if a blob still has the stat info it was stored with."""
+        try:
+            stat = os.stat(self._blob_path(digest))
+        except OSError:
+            return False
+        return (stat.st_size, stat.st_mtime_ns) == tuple(blob_stat)
+
+    def replay(self, task, record, view):
+        """Restore a task's outputs and replay its changes to the view."""
+        for path, output in record['outputs'].items():
+            digest, size, mtime_ns, mode, _ = output
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                    continue
+            dprint('cache: restoring %s' % path)
+            outdir = os.path.dirname(path)
+            if not os.path.exists(outdir):
+                os.makedirs(outdir)
+            # replace rather than overwrite, the path may link to a blob
+            fd, tmp = tempfile.mkstemp(dir=outdir)
+            os.close(fd)
+            shutil.copyfile(self._blob_path(digest), tmp)
+            os.chmod(tmp, mode)
+            os.utime(tmp, ns=(mtime_ns, mtime_ns))
+            os.replace(tmp, path)
+        task.warnings = list(record['warnings'])
+        task.errors = []
+        task.status = 0
+        if record['state'] is None:
+            return None
+        changes, removed = record['state']
+        view.update(changes)
+        for key in removed:
+            view.pop(key, None)
+        return view
+
+    def _store_blob(self, path, digest):
+        """Link or copy a file into the blob store and return its stat info.
+
+        A blob that is already there is kept if it still holds the content
+        of its digest.
+        """
+        blob = self._blob_path(digest)
+        if os.path.exists(blob) and hash_file(blob) == digest:
+            stat = os.stat(blob)
+            return stat.st_size, stat.st_mtime_ns
+        blob_dir = os.path.dirname(blob)
+        if not os.path.exists(blob_dir):
+            os.makedirs(blob_dir, exist_ok=True)
+        tmp = os.path.join(blob_dir, '%s.%d.tmp' % (digest, os.getpid()))
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(path, tmp)
+        except OSError:
+            # e.g. on another file system
+            shutil.copyfile(path, tmp)
+        os.replace(tmp, blob)
+        stat = os.stat(blob)
+        return stat.st_size, stat.st_mtime_ns
+
+    def store(self, task, fingerprint, view):
+        """Record the results of a successful task run.
+
+        The view is the task's StateView holding its changes, or None when the
+        task returned no state.
+        """
+        record_path = self._record_path(task)
+        previous = {}
+        try:
+            with open(record_path, 'rb') as fin:
+                previous = pickle.load(fin)['outputs']
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError):
+            pass
+        outputs = {}
+        for path in walk_files(task.output_paths()):
+            stat = os.stat(path)
+            old = previous.get(path)
+            if (old is not None and len(old) == 5 and
+                    old[1] == stat.st_size and old[2] == stat.st_mtime_ns and
+                    self._blob_valid(old[0], old[4])):
+                digest, blob_stat = old[0], old[4]
+            else:
+                digest = hash_file(path)
+                blob_stat = self._store_blob(path, digest)
+            outputs[path] = (digest, stat.st_size, stat.st_mtime_ns,
+                             stat.st_mode & 0o7777, blob_stat)
+        state = None
+        if view is not None:
+            state = (dict(view.changes), list(view.removed))
+        record = {'fingerprint': fingerprint, 'outputs': outputs,
+                  'state': state, 'warnings': list(task.warnings)}
+        if not os.path.exists(self.records_dir):
+            os.makedirs(self.records_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.records_dir)
+        with os.fdopen(fd, 'wb') as fout:
+            pickle.dump(record, fout)
+        os.replace(tmp, record_path)
+        dprint('cache: stored %d outputs for %s' % (len(outputs), task.tag))
@@ -0,0 +1,232 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A SQLite catalog of the images in the gallery directories.
+
+The catalog holds one row per image file, keyed by absolute path, with the
+size and modification time of the file, its content hash, its dimensions, its
+EXIF capture date and its EXIF orientation. ``MediaCatalog.scan`` walks a
+directory and only reads the images that are new or whose size or
+modification time changed, and forgets the images that were removed, so the
+images of a gallery can be listed, sorted by name or capture date, along with
+their dimensions without opening a single image. A catalog opened read only
+never writes, it reads through a connection kept by the calling thread.
+
+The dimensions are those of the image as displayed, i.e. swapped when the
+orientation rotates it by 90 degrees. The metadata is read with Pillow when
+it is installed, otherwise, or for files Pillow cannot read, the dimensions,
+date and orientation are NULL.
+"""
+
+import os
+from collections import namedtuple
+
+from escadrille.cache import hash_file
+from escadrille.images import is_image
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    taken TEXT,
+    orientation INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_directory ON images (directory);
+'''
+
+ImageRecord = namedtuple('ImageRecord', [
+    'path', 'directory', 'name', 'size', 'mtime_ns', 'hash', 'width',
+    'height', 'taken', 'orientation'])
+
+# the SQL order of the images for each value of the "order" argument
+ORDERS = {'name': 'name', 'date': 'taken IS NULL, taken, name'}
+
+# EXIF tags
+ORIENTATION = 0x0112
+DATE_TIME = 0x0132
+EXIF_IFD = 0x8769
+DATE_TIME_ORIGINAL = 0x9003
+# orientations rotating the image by 90 or 270 degrees
+TRANSPOSED = (5, 6, 7, 8)
+
+
+def exif_date(value):
+    """Return an EXIF "YYYY:MM:DD HH:MM:SS" date as "YYYY-MM-DD HH:MM:SS"."""
+    if not isinstance(value, str):
+        return None
+    value = value.strip('\x00 ')
+    return value.replace(':', '-', 2) if value else None
+
+
+def read_metadata(path):
+    """Return the width, height, capture date and orientation of an image."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None, None, None, None
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+            width, height = image.size
+            taken = (exif.get_ifd(EXIF_IFD).get(DATE_TIME_ORIGINAL) or
+                     exif.get(DATE_TIME))
+            orientation = exif.get(ORIENTATION)
+    except Exception:
+        return None, None, None, None
+    if orientation in TRANSPOSED:
+        width, height = height, width
+    return width, height, exif_date(taken), orientation
+
+
+class MediaCatalog(object):
+    """A SQLite file of image metadata keyed by path."""
+
+    def __init__(self, path, read_only=False):
+        """Set up instance vars for a MediaCatalog object."""
+        self.path = path
+        self.read_only = read_only
+        self.connection = None
+
+    def open(self):
+        """Open the catalog, creating it when it does not exist.
+
+        A read only catalog must exist already.
+        """
+        if self.connection is None and self.read_only:
+            from escadrille.doctrees import read_connection
+            self.connection = read_connection(self.path)
+        elif self.connection is None:
+            # sqlite3 is slow to import so only import it when used
+            import sqlite3
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript(SCHEMA)
+        return self
+
+    def commit(self):
+        """Commit the changes to the catalog."""
+        self.connection.commit()
+
+    def close(self):
+        """Commit the changes and close the catalog.
+
+        The connection of a read only catalog is kept for the thread's next
+        reads.
+        """
+        if self.connection is not None and not self.read_only:
+            self.commit()
+            self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        """Open the catalog."""
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        """Close the catalog."""
+        self.close()
+
+    @staticmethod
+    def record(path, stat):
+        """Return the ImageRecord of an image, reading the image."""
+        width, height, taken, orientation = read_metadata(path)
+        return ImageRecord(path, os.path.dirname(path),
+                           os.path.basename(path), stat.st_size,
+                           stat.st_mtime_ns, hash_file(path), width, height,
+                           taken, orientation)
+
+    def scan(self, root, skip=None):
+        """Bring the catalog up to date with the images under root.
+
+        The directories whose path the skip function returns True for are
+        not scanned. Returns the number of images read and the number of
+        images removed from the catalog.
+        """
+        root = os.path.abspath(os.path.expanduser(root)).rstrip(os.sep)
+        # the paths under root sort between root + "/" and root + "0"
+        known = {path: (size, mtime_ns) for path, size, mtime_ns in
+                 self.connection.execute(
+                     'SELECT path, size, mtime_ns FROM images '
+                     'WHERE path > ? AND path < ?',
+                     (root + os.sep, root + chr(ord(os.sep) + 1)))}
+        seen, changed = set(), []
+        for dirpath, dirnames, fnames in os.walk(root):
+            if skip is not None:
+                dirnames[:] = [name for name in dirnames
+                               if not skip(os.path.join(dirpath, name))]
+            for fname in fnames:
+                if not is_image(fname):
+                    continue
+                path = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(path)
+                    seen.add(path)
+                    if known.get(path) != (stat.st_size, stat.st_mtime_ns):
+                        changed.append(self.record(path, stat))
+                except OSError:
+                    continue
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '
+            '?)', changed)
+        removed = [(path,) for path in known if path not in seen]
+        self.connection.executemany('DELETE FROM images WHERE path = ?',
+                                    removed)
+        self.commit()
+        return len(changed), len(removed)
+
+    def directories(self, root):
+        """Return the sorted directories holding images under root."""
+        root = os.path.abspath(os.path.expanduser(root)).rstrip(os.sep)
+        return [row[0] for row in self.connection.execute(
+            'SELECT DISTINCT directory FROM images WHERE directory = ? OR '
+            '(directory > ? AND directory < ?) ORDER BY directory',
+            (root, root + os.sep, root + chr(ord(os.sep) + 1)))]
+
+    def iter_images(self, directory, order='name'):
+        """Yield the ImageRecords of a directory sorted by name or date.
+
+        The records are read from the catalog as they are consumed.
+        """
+        if order not in ORDERS:
+            raise ValueError('Unknown image order: %s' % order)
+        directory = os.path.abspath(os.path.expanduser(directory))
+        for row in self.connection.execute(
+                'SELECT * FROM images WHERE directory = ? ORDER BY %s' %
+                ORDERS[order], (directory,)):
+            yield ImageRecord(*row)
+
+    def images(self, directory, order='name'):
+        """Return the ImageRecords of a directory sorted by name or date."""
+        return list(self.iter_images(directory, order))
+
+    def count(self, directory):
+        """Return the number of images in a directory."""
+        directory = os.path.abspath(os.path.expanduser(directory))
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM images WHERE directory = ?',
+            (directory,)).fetchone()[0]
+
+    def get(self, path):
+        """Return the ImageRecord of an image, or None."""
+        row = self.connection.execute(
+            'SELECT * FROM images WHERE path = ?',
+            (os.path.abspath(path),)).fetchone()
+        return None if row is None else ImageRecord(*row)
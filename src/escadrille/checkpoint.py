@@ -0,0 +1,96 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Checkpoints of completed tasks used to resume failed runs.
+
+The checkpoint is an append-only log with one pickled record per successful
+task holding the task's tag and the changes it made to the shared state.
+Appending a record costs O(changes) and replaying the records in order
+rebuilds the shared state of the completed tasks.
+"""
+
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+
+from .state import SharedState
+from .verbosity import dprint
+
+
+class Checkpoint(object):
+    """Append-only log of the tasks completed by a run."""
+
+    def __init__(self, path):
+        """Set up instance vars for a Checkpoint object."""
+        self.path = path
+
+    @classmethod
+    def for_config(cls, config_file):
+        """Return the checkpoint for runs of the given config file."""
+        key = os.path.abspath(config_file.filename).encode('utf-8')
+        name = hashlib.sha1(key).hexdigest() + '.pkl'
+        cache_dir = os.path.abspath(os.path.expanduser(config_file.cache_dir))
+        return cls(os.path.join(cache_dir, 'checkpoints', name))
+
+    def start(self, records=None):
+        """Begin a new log, keeping the given records from an earlier run."""
+        directory = os.path.dirname(self.path)
+        if not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'wb') as fout:
+            for tag, state in (records or {}).items():
+                pickle.dump((tag, state), fout)
+
+    def record(self, tag, view):
+        """Append a completed task and the state changes in its view."""
+        state = None
+        if view is not None:
+            state = (dict(view.changes), list(view.removed))
+        try:
+            data = pickle.dumps((tag, state))
+        except (pickle.PicklingError, TypeError, AttributeError) as exc:
+            dprint('checkpoint: cannot record %s: %s' % (tag, exc))
+            return
+        with open(self.path, 'ab') as fout:
+            fout.write(data)
+
+    def load(self):
+        """Return an ordered map of completed task tag to its state changes.
+
+        A truncated final record, from a run that was killed, is ignored.
+        """
+        records = OrderedDict()
+        try:
+            with open(self.path, 'rb') as fin:
+                while True:
+                    tag, state = pickle.load(fin)
+                    records[tag] = state
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+        return records
+
+    @staticmethod
+    def restore(records):
+        """Return a SharedState rebuilt from the records' state changes."""
+        shared_state = SharedState()
+        for state in records.values():
+            if state is None:
+                continue
+            changes, removed = state
+            view = shared_state.view()
+            view.update(changes)
+            for key in removed:
+                view.pop(key, None)
+            shared_state.commit(view, view)
+        return shared_state
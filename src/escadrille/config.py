@@ -11,14 +11,30 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Escadrille Config File API."""
+"""Escadrille Config File API.
 
+Loading a config file compiles it once into frozen, fully interpolated
+sections, so option lookups are plain dict lookups and the general options
+are typed attributes. The compiled config can be cached on disk, keyed by
+the stat info of the files it was read from, so that repeated runs skip
+parsing entirely. A config file that does not exist is recorded as missing,
+so creating it invalidates the cached config.
+
+An option that cannot be interpolated keeps its raw value and only raises
+its interpolation error when it is looked up, as with ConfigParser.
+"""
+
+import hashlib
+import json
 import os
-from configparser import SafeConfigParser
+from configparser import ConfigParser
 from configparser import ExtendedInterpolation
+from configparser import InterpolationError
 from enum import Enum
+from types import MappingProxyType
 
 from .verbosity import dprint
+from .version import VERSION
 
 
 class GeneralOpts(Enum):
@@ -28,6 +44,8 @@ class GeneralOpts(Enum):
     output_dir = os.path.join(tmp_dir, 'output')
     staging_dir = os.path.join(tmp_dir, 'staging')
     date_format = '%Y-%m-%d %H:%M'
+    jobs = '1'
+    cache_dir = '~/.cache/escadrille'
     enabled_tasks = []
 
 
@@ -37,46 +55,161 @@ class Sections(Enum):
     general = GeneralOpts
 
 
+def file_stats(paths):
+    """Return a map of each path to its stat info, None if it is missing."""
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stats[path] = None
+            continue
+        stats[path] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
 class ConfigFile(object):
-    """Config File API for Escadrille."""
+    """Config File API for Escadrille.
+
+    When compile_cache is a directory, compiled configs are cached there.
+    """
 
     default_path = os.path.abspath('./escadrille.cfg')
     list_sep = ' '
     indent = '  '
     msg_template = '%s%s=%s\n'
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, compile_cache=None):
         """Setup instance vars for ConfigFile objects."""
         self.filename = self.default_path
         if filename is not None:
             self.filename = filename
-        self.parser = None
+        self.compile_cache = compile_cache
+        self.compile({}, {})
         self.loaded = False
 
-    def set_parser_general_defaults(self):
-        """Add default values to the parser for the general section."""
-        key = Sections.general.name
-        self.parser[key] = {}
+    @classmethod
+    def general_defaults(cls):
+        """Return the default values of the general section options."""
+        defaults = {}
         for opt in GeneralOpts:
             if isinstance(opt.value, list):
-                self.parser[key][opt.name] = self.list_sep.join(opt.value)
+                defaults[opt.name] = cls.list_sep.join(opt.value)
             else:
-                self.parser[key][opt.name] = opt.value
+                defaults[opt.name] = opt.value
+        return defaults
+
+    def parse(self):
+        """Parse and interpolate the config file.
+
+        Returns a map of section name to option map, a map of section name
+        to the interpolation error message of each option that could not be
+        interpolated, and the list of files that were read.
+        """
+        parser = ConfigParser(interpolation=ExtendedInterpolation())
+        parser[Sections.general.name] = self.general_defaults()
+        files = []
+        if not os.path.exists(self.filename):
+            dprint('%s: given config file "%s" could not be loaded.'
+                   'No config file loaded. Defaults loaded.' %
+                   (self.__class__.__name__, self.filename))
+        else:
+            files = parser.read(self.filename)
+        sections, errors = {}, {}
+        for section in parser.sections():
+            options = sections[section] = {}
+            for option in parser.options(section):
+                try:
+                    options[option] = parser.get(section, option)
+                except InterpolationError as exc:
+                    options[option] = parser.get(section, option, raw=True)
+                    errors.setdefault(section, {})[option] = exc.message
+        return sections, errors, [os.path.abspath(path) for path in files]
+
+    def cache_path(self):
+        """Return the path of the cached compiled config, or None."""
+        if self.compile_cache is None:
+            return None
+        key = os.path.abspath(self.filename).encode('utf-8')
+        return os.path.join(os.path.abspath(os.path.expanduser(
+            self.compile_cache)), hashlib.sha1(key).hexdigest() + '.json')
+
+    def load_compiled(self, path):
+        """Return the sections and errors of a valid cached config, or None."""
+        try:
+            with open(path, 'r') as fin:
+                cached = json.load(fin)
+        except (OSError, ValueError):
+            return None
+        if (cached.get('version') != VERSION or
+                cached.get('defaults') != self.general_defaults() or
+                cached.get('filename') != os.path.abspath(self.filename) or
+                cached.get('files') != file_stats(cached.get('files', {}))):
+            return None
+        return cached.get('sections'), cached.get('errors', {})
+
+    def store_compiled(self, path, sections, errors, files):
+        """Write the compiled sections to the cache.
+
+        Besides the files that were read, the config file is recorded even
+        when it is missing, so the cache is invalid once it is created.
+        """
+        stats = file_stats([os.path.abspath(self.filename)] + files)
+        if any(stats[name] is None for name in files):
+            return  # a file vanished while loading, do not cache
+        cached = {'version': VERSION, 'defaults': self.general_defaults(),
+                  'filename': os.path.abspath(self.filename),
+                  'files': stats, 'sections': sections, 'errors': errors}
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'w') as fout:
+                json.dump(cached, fout)
+            os.replace(temp_path, path)
+        except OSError as exc:
+            dprint('%s: cannot cache the compiled config: %s' %
+                   (self.__class__.__name__, exc))
 
     def load(self):
-        """Load the configuration file into memory."""
-        if self.filename is not None:
-            self.parser = SafeConfigParser(
-                interpolation=ExtendedInterpolation())
-            self.set_parser_general_defaults()
-            if not os.path.exists(self.filename):
-                dprint('%s: given config file "%s" could not be loaded.'
-                       'No config file loaded. Defaults loaded.' %
-                       (self.__class__.__name__, self.filename))
-            else:
-                self.parser.read(self.filename)
+        """Load and compile the configuration file."""
+        cache_path = self.cache_path()
+        compiled = None
+        if cache_path is not None:
+            compiled = self.load_compiled(cache_path)
+            if compiled is not None:
+                dprint('%s: using compiled config %s' %
+                       (self.__class__.__name__, cache_path))
+        if compiled is None:
+            sections, errors, files = self.parse()
+            if cache_path is not None:
+                self.store_compiled(cache_path, sections, errors, files)
+            compiled = sections, errors
+        self.compile(*compiled)
         self.loaded = True
 
+    def compile(self, sections, errors):
+        """Freeze the sections and set the typed general options."""
+        self.sections = MappingProxyType(
+            {name: MappingProxyType(options)
+             for name, options in sections.items()})
+        self.errors = errors
+        defaults = self.general_defaults()
+
+        def option(opt):
+            """Return the configured or default value of a general opt."""
+            value = self.get(Sections.general.name, opt.name)
+            return defaults[opt.name] if value is None else value
+
+        self._enabled_tasks = tuple(
+            task for task in str(option(GeneralOpts.enabled_tasks)).split(
+                self.list_sep) if task != '')
+        self._tmp_dir = option(GeneralOpts.tmp_dir)
+        self._output_dir = option(GeneralOpts.output_dir)
+        self._staging_dir = option(GeneralOpts.staging_dir)
+        self._date_format = option(GeneralOpts.date_format)
+        self._jobs = int(option(GeneralOpts.jobs))
+        self._cache_dir = option(GeneralOpts.cache_dir)
+
     @property
     def default_config(self):
         """Return the string of an empty, default config file."""
@@ -100,64 +233,52 @@ class ConfigFile(object):
             task_obj = task(config_file=self)
             print(task_obj.default_config)
 
-    def get(self, section, option, *args, **kwargs):
-        """Wrapper to simplify calls to self.parser.get."""
-        if not self.parser:
-            return None
-        if (self.parser.has_section(section) and
-                option in self.parser.options(section)):
-            return self.parser.get(section, option, *args, **kwargs)
+    def get(self, section, option):
+        """Return the value of an option, or None when it is not set.
 
-    def getboolean(self, section, option, *args, **kwargs):
-        """Wrapper to simplify calls to self.parser.get()."""
-        if not self.parser:
+        Raises InterpolationError when the option could not be interpolated.
+        """
+        message = self.errors.get(section, {}).get(option)
+        if message is not None:
+            raise InterpolationError(option, section, message)
+        return self.sections.get(section, {}).get(option)
+
+    def getboolean(self, section, option):
+        """Return the boolean value of an option, or None when not set."""
+        value = self.get(section, option)
+        if value is None:
             return None
-        if (self.parser.has_section(section) and
-                option in self.parser.options(section)):
-            return self.parser.getboolean(section, option, *args, **kwargs)
+        if value.lower() not in ConfigParser.BOOLEAN_STATES:
+            raise ValueError('Not a boolean: %s' % value)
+        return ConfigParser.BOOLEAN_STATES[value.lower()]
 
     def has_section(self, section):
-        """Wrapper to simplify calls to self.parser.has_section."""
-        if not self.parser:
-            return False
-        return self.parser.has_section(section)
+        """Return True if the config file has the given section."""
+        return section in self.sections
 
     def section(self, section):
         """Helper method to simplify retrieving config sections for Tasks."""
-        return None if not self.parser else self.parser[section]
+        return self.sections[section]
 
     @property
     def enabled_tasks(self):
         """Retrieve a list of the enabled tasks from the config file."""
-        enabled = self.get(Sections.general.name,
-                           GeneralOpts.enabled_tasks.name)
-        if enabled is None:
-            return GeneralOpts.enabled_tasks.value
-        return [task for task in str(enabled).split(self.list_sep)
-                if task != '']
+        return list(self._enabled_tasks)
 
     @property
     def tmp_dir(self):
         """The temporary directory to use for the escadrille run."""
-        tmp_dir = self.get(Sections.general.name,
-                           GeneralOpts.tmp_dir.name)
-        return tmp_dir if tmp_dir is not None else GeneralOpts.tmp_dir.value
+        return self._tmp_dir
 
     @property
     def output_dir(self):
         """The output directory to use for the finished product."""
-        output_dir = self.get(Sections.general.name,
-                              GeneralOpts.output_dir.name)
-        default = GeneralOpts.output_dir.value
-        return output_dir if output_dir is not None else default
+        return self._output_dir
 
     @property
     def staging_dir(self):
         """The staging directory to use for the escadrille run."""
-        staging_dir = self.get(Sections.general.name,
-                               GeneralOpts.staging_dir.name)
-        default = GeneralOpts.staging_dir.value
-        return staging_dir if staging_dir is not None else default
+        return self._staging_dir
 
     @property
     def date_format(self):
@@ -165,10 +286,17 @@ class ConfigFile(object):
 
         The provided string must be compatible with ``time.strftime``.
         """
-        date_format = self.get(Sections.general.name,
-                               GeneralOpts.date_format.name)
-        default = GeneralOpts.date_format.value
-        return date_format if date_format is not None else default
+        return self._date_format
+
+    @property
+    def jobs(self):
+        """The number of tasks that may run concurrently."""
+        return self._jobs
+
+    @property
+    def cache_dir(self):
+        """The directory holding the incremental build cache."""
+        return self._cache_dir
 
     def get_task_name(self, tag):
         """Retrieve the task name from the section with the given tag."""
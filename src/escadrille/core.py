@@ -11,13 +11,34 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""The core escadrille business logic."""
+"""The core escadrille business logic.
+
+Escadrille runs from git hooks and cron so its startup time matters. The
+subsystems that are only needed to build, watch or serve a site are imported
+by the methods that use them, keeping "--version", "--list" and
+"--default-config" light (see ``escadrille.startup``).
+"""
 import sys
 import os
 import argparse
 import errno
+import io
+import json
+from collections import OrderedDict
+from contextlib import redirect_stdout
 
 from .config import ConfigFile
+from .config import GeneralOpts
+from .scheduler import Scheduler
+from .scheduler import build_graph
+from .scheduler import downstream
+from .scheduler import select
+from .scheduler import subgraph
+from .state import SharedState
+from .trace import async_span
+from .trace import span
+from . import startup
+from . import trace
 from .tasks import load_tasks
 from .verbosity import DebugAction
 from .verbosity import VerboseAction
@@ -33,7 +54,16 @@ class InterfaceCore(object):
         self.config_file = None
         self.tasks = None
         self.skip = None
+        self.only = None
+        self.jobs = None
+        self.no_cache = None
         self.list_tasks = None
+        self.resume = None
+        self.resume_from = None
+        self.shared_state = None
+        self.executor = None
+        self.dedup = None
+        self.config_cache = None
 
     def build(self):
         """Construct the self.parser object."""
@@ -43,42 +73,230 @@ class InterfaceCore(object):
         """Validate the provided options meet requirements."""
         pass
 
+    def configure(self, options):
+        """Set the engine attributes from the parsed command line options."""
+        self.skip = options.skip
+        self.only = options.only
+        self.jobs = options.jobs
+        self.no_cache = options.no_cache
+        self.resume = options.resume
+        self.resume_from = options.resume_from
+        self.list_tasks = options.list
+
     def _main(self):
         """Main business logic for Escadrille."""
         self.skip = self.skip if self.skip else []
         if self.tasks is None:
-            self.tasks = load_tasks()
+            self.tasks = load_tasks(self.config_file.cache_dir)
         if self.list_tasks is not None and self.list_tasks:
             for index, task_tag in enumerate(
                     self.config_file.enabled_tasks, 1):
                 print('%2d: %s' % (index, task_tag))
             return 0
+        return self.build_site()
+
+    def build_site(self, tasks=None):
+        """Run the enabled tasks and return the first non-zero status.
+
+        The tasks are created unless a map of tag to task object is given.
+        """
+        if tasks is None:
+            with span('create tasks'):
+                tasks = self.create_tasks()
+        graph = self.task_graph(tasks)
+        if self.only:
+            graph = subgraph(graph, select(graph, self.only))
+        from .checkpoint import Checkpoint
+        checkpoint = Checkpoint.for_config(self.config_file)
+        shared_state, completed = None, None
+        if self.resume or self.resume_from:
+            completed = self.resume_checkpoint(checkpoint, graph)
+            shared_state = checkpoint.restore(completed)
+            graph = subgraph(graph, [tag for tag in graph
+                                     if tag not in completed])
+        checkpoint.start(completed)
+        status = self.run_tasks(tasks, graph, shared_state, checkpoint)
+        if status:
+            return status
+        print('All Tasks Completed. Exiting.')
+        return 0
+
+    def resume_checkpoint(self, checkpoint, graph):
+        """Return the checkpoint records of the tasks that need not rerun.
+
+        With resume_from, the tasks before the given tag that completed in
+        the previous run are kept. Otherwise every task that completed in the
+        previous run is kept.
+        """
+        records = checkpoint.load()
+        earlier = list(graph)
+        if self.resume_from:
+            if self.resume_from not in graph:
+                raise KeyError('Task "%s" is not an enabled task.' %
+                               self.resume_from)
+            earlier = earlier[:earlier.index(self.resume_from)]
+        completed = OrderedDict((tag, state) for tag, state in records.items()
+                                if tag in earlier)
+        print('Resuming, skipping completed tasks: %s' %
+              (' '.join(completed) or 'none'))
+        return completed
+
+    def run_tasks(self, tasks, graph, shared_state=None, checkpoint=None):
+        """Run the tasks in graph and return the first non-zero status.
+
+        The shared_state is the SharedState the tasks build upon, a new empty
+        one is used when it is None. It is kept as self.shared_state after the
+        run. Successful tasks are recorded in the checkpoint if one is given.
+        """
+        jobs = self.jobs if self.jobs is not None else self.config_file.jobs
+        cache = None
+        if not self.no_cache:
+            from .cache import BuildCache
+            cache = BuildCache(self.config_file.cache_dir)
         # container for tasks to pass intermediary data to each other
-        shared_state = {}
-        for task_tag in self.config_file.enabled_tasks:
+        if shared_state is None:
+            shared_state = SharedState()
+        self.shared_state = shared_state
+
+        def start(task_tag):
+            """Hand the task its own view of the current state."""
             if task_tag in self.skip:
                 print('Skipping task "%s".' % task_tag)
-                continue
+                return None
+            task = tasks[task_tag]
+            view = task.shared_state = shared_state.view()
+            if task.is_async():
+                return self.start_async(task, view, cache)
+            if self.dedup is not None:
+                return lambda: (view, self.dedup.run(
+                    task, view, lambda: self.run_task(task, view, cache)))
+            return lambda: (view, self.run_task(task, view, cache))
+
+        def finish(task_tag, result):
+            """Commit the changes made by the task and report its status."""
+            view, new_state = result
+            shared_state.commit(view, new_state)
+            status = self.report(tasks[task_tag])
+            if not status and checkpoint is not None:
+                checkpoint.record(task_tag,
+                                  None if new_state is None else view)
+            return status
+
+        return Scheduler(graph, jobs, self.executor).run(start, finish)
+
+    async def start_async(self, task, view, cache):
+        """Run a coroutine task and return its view and new state."""
+        if self.dedup is not None:
+            return view, await self.dedup.run_async(
+                task, view, lambda: self.run_task_async(task, view, cache))
+        return view, await self.run_task_async(task, view, cache)
+
+    def create_tasks(self):
+        """Return an ordered map of tag to task object for enabled tasks."""
+        tasks = OrderedDict()
+        for task_tag in self.config_file.enabled_tasks:
             task_name = self.config_file.get_task_name(task_tag)
-            task = self.tasks[task_name](config_file=self.config_file,
-                                         tag=task_tag,
-                                         shared_state=shared_state.copy())
+            tasks[task_tag] = self.tasks[task_name](
+                config_file=self.config_file, tag=task_tag)
+        return tasks
+
+    def load_config_file(self, filename):
+        """Return the loaded ConfigFile for a config file path.
+
+        Compiled configs are cached in the config_cache directory. It
+        defaults to one below the default cache directory since the
+        configured one is only known once the config is loaded.
+        """
+        compile_cache = self.config_cache
+        if compile_cache is None:
+            compile_cache = os.path.join(GeneralOpts.cache_dir.value,
+                                         'configs')
+        config_file = ConfigFile(filename, compile_cache=compile_cache)
+        with span('load config'):
+            config_file.load()
+        return config_file
+
+    @staticmethod
+    def task_graph(tasks):
+        """Return the dependency graph of an ordered map of tasks."""
+        return build_graph(OrderedDict(
+            (tag, (task.get_requires(), task.get_provides()))
+            for tag, task in tasks.items()))
+
+    @staticmethod
+    def check_cache(task, view, cache):
+        """Return the task's fingerprint and its cached record, if any.
+
+        The fingerprint is None when the task is not cached at all.
+        """
+        if cache is None or not task.cacheable:
+            return None, None
+        task.load_config()
+        with span('%s fingerprint' % task.tag, category='cache'):
+            fingerprint = cache.fingerprint(task, view)
+            return fingerprint, cache.lookup(task, fingerprint)
+
+    @staticmethod
+    def replay_task(task, view, cache, record):
+        """Replay the cached results of a task and return its new state."""
+        print('Task "%s" is up to date, using cached results.' % task.tag)
+        with span('%s replay' % task.tag, category='cache'):
+            return cache.replay(task, record, view)
+
+    @staticmethod
+    def store_task(task, view, cache, fingerprint, new_state):
+        """Normalize the task's new state and store it in the cache.
+
+        A new state other than the view itself replaces the view's content
+        and the view is returned instead.
+        """
+        if new_state is not None and new_state is not view:
+            view.replace(new_state)
+            new_state = view
+        if fingerprint is not None and not task.status:
+            with span('%s store' % task.tag, category='cache'):
+                cache.store(task, fingerprint, new_state)
+        return new_state
+
+    @classmethod
+    def run_task(cls, task, view, cache=None):
+        """Run a task, or replay its cached results when up to date.
+
+        The view is the task's StateView. The task's new state is returned
+        as the view itself, or None when the task returned no state.
+        """
+        fingerprint, record = cls.check_cache(task, view, cache)
+        if record is not None:
+            return cls.replay_task(task, view, cache, record)
+        with span('%s __call__' % task.tag, category='task'):
             new_state = task()
-            if new_state is not None and new_state != shared_state:
-                shared_state = new_state
-            if task.status is not None and task.status != 0:
-                print('Task "%s" did not succeed: errno %s\n  Warnings:\n'
-                      '    %s\n  Errors:\n    %s' %
-                      (task.tag, task.status,
-                       '\n    '.join(task.warnings),
-                       '\n    '.join(task.errors)))
-                return task.status
-            elif task.warnings:
-                print('Task "%s" succeeded with warnings:\n    %s' %
-                      (task_tag, '\n    '.join(task.warnings)))
-            else:
-                print('Task %s succeeded.' % task.tag)
-        print('All Tasks Completed. Exiting.')
+        return cls.store_task(task, view, cache, fingerprint, new_state)
+
+    @classmethod
+    async def run_task_async(cls, task, view, cache=None):
+        """Run a task with a coroutine __call__ method like run_task."""
+        fingerprint, record = cls.check_cache(task, view, cache)
+        if record is not None:
+            return cls.replay_task(task, view, cache, record)
+        with async_span('%s __call__' % task.tag, category='task'):
+            new_state = await task()
+        return cls.store_task(task, view, cache, fingerprint, new_state)
+
+    @staticmethod
+    def report(task):
+        """Print the outcome of a task and return its non-zero status."""
+        if task.status is not None and task.status != 0:
+            print('Task "%s" did not succeed: errno %s\n  Warnings:\n'
+                  '    %s\n  Errors:\n    %s' %
+                  (task.tag, task.status,
+                   '\n    '.join(task.warnings),
+                   '\n    '.join(task.errors)))
+            return task.status
+        elif task.warnings:
+            print('Task "%s" succeeded with warnings:\n    %s' %
+                  (task.tag, '\n    '.join(task.warnings)))
+        else:
+            print('Task %s succeeded.' % task.tag)
         return 0
 
 
@@ -88,9 +306,14 @@ class ConfigMixin(InterfaceCore):
     def build(self):
         """Add config file options to the parser."""
         self.parser.add_argument(
-            '-c', '--config', action='store', dest='config',
+            '-c', '--config', action='append', dest='config',
             default=None,
-            help='Specify the config file to use.')
+            help='Specify the config file to use. Repeat to build several '
+            'sites in one process.')
+        self.parser.add_argument(
+            '--sites', action='store', dest='sites', default=None,
+            metavar='FILE',
+            help='Build every site listed in a manifest of config files.')
         self.parser.add_argument(
             '--default-config', action='store_true', dest='default_config',
             default=False, help='Print a default config section and exit.')
@@ -98,34 +321,289 @@ class ConfigMixin(InterfaceCore):
             '--debug-config', action='store_true', dest='debug_config',
             default=False, help='Debug the config file instead of running '
             'escadrille tasks.')
+        self.parser.add_argument(
+            '--config-cache', action='store', dest='config_cache',
+            default=None, metavar='DIR',
+            help='The directory of the compiled config cache. Defaults to '
+            '"configs" in the default cache directory, %s.' %
+            GeneralOpts.cache_dir.value)
         super().build()
 
     def validate_args(self, args):
-        """If provided, ensure that the config file path exists."""
-        if args.config is not None and not os.path.exists(args.config):
-            raise FileNotFoundError(errno.ENOENT, "Config File not found",
-                                    args.config)
+        """If provided, ensure that the config file paths exist."""
+        if args.sites is not None:
+            if not os.path.exists(args.sites):
+                raise FileNotFoundError(errno.ENOENT, "Sites File not found",
+                                        args.sites)
+            from .batch import read_manifest
+            args.config = (args.config or []) + read_manifest(args.sites)
+        for config in args.config or []:
+            if not os.path.exists(config):
+                raise FileNotFoundError(errno.ENOENT, "Config File not found",
+                                        config)
+        if args.config and len(args.config) > 1 and (
+                args.debug_config or args.default_config or args.watch or
+                args.serve):
+            self.parser.error('Only one config file can be used with '
+                              '--debug-config, --default-config, --watch or '
+                              '--serve.')
         super().validate_args(args)
 
     def print_config_debug(self, options):
         """A procedure to parse and help identify issues with config files."""
         print('cmdline args: %s' % options)
         print('Parsing Config File...')
-        config_file = ConfigFile(options.config)
+        config_file = ConfigFile(options.config[0] if options.config
+                                 else None)
         config_file.load()
-        print('Config Sections: %s' % config_file.parser.sections())
-        for section in config_file.parser.sections():
+        print('Config Sections: %s' % list(config_file.sections))
+        for section in config_file.sections:
             print('Options in section %s: %s' %
-                  (section, config_file.parser.options(section)))
+                  (section, list(config_file.section(section))))
         print('Enabled Tasks: %s' % config_file.enabled_tasks)
-        for task in load_tasks().values():
+        for task in load_tasks(config_file.cache_dir).values():
             task_obj = task(config_file=config_file)
             print(task_obj.debug_msg())
 
         return 0
 
 
-class CliInterface(ConfigMixin, InterfaceCore):
+class WatchMixin(InterfaceCore):
+    """Mixin class to add a watch mode that rebuilds on input changes."""
+
+    # seconds without further changes before a rebuild starts
+    debounce = 0.5
+
+    def __init__(self):
+        """Set up instance defaults for the watch mode."""
+        super().__init__()
+        self.watch = None
+
+    def build(self):
+        """Add watch mode options to the parser."""
+        self.parser.add_argument(
+            '-w', '--watch', action='store_true', dest='watch',
+            default=False, help='After building, watch the task inputs and '
+            'the config file and rebuild the affected tasks on changes.')
+        super().build()
+
+    def configure(self, options):
+        """Set the watch mode attributes from the command line options."""
+        super().configure(options)
+        self.watch = options.watch
+
+    def _main(self):
+        """Build the site and then, if requested, watch for changes."""
+        status = super()._main()
+        if not self.watch or self.list_tasks:
+            return status
+        return self.watch_inputs()
+
+    def watched_paths(self, tasks):
+        """Return an ordered map of task tag to the paths it watches."""
+        watched = OrderedDict()
+        for tag, task in tasks.items():
+            if tag in self.skip:
+                continue
+            task.load_config()
+            watched[tag] = [task.sanitize_path(path)
+                            for path in task.watch_paths()]
+        return watched
+
+    @staticmethod
+    def affected_tasks(graph, watched, changed):
+        """Return the tags of the tasks to rerun for the changed paths."""
+        from .watch import is_within
+        tags = [tag for tag, paths in watched.items()
+                if any(is_within(change, path)
+                       for change in changed for path in paths)]
+        return [tag for tag in downstream(graph, tags) if tag in graph]
+
+    def create_watcher(self, watched):
+        """Return a watcher of the config file and the watched paths."""
+        from .watch import create_watcher
+        paths = [os.path.abspath(self.config_file.filename)]
+        for task_paths in watched.values():
+            paths.extend(task_paths)
+        return create_watcher(paths)
+
+    @staticmethod
+    def written_paths(tasks, tags):
+        """Return the paths written by the tasks with the given tags."""
+        return [task.sanitize_path(path) for tag, task in tasks.items()
+                if tag in tags for path in task.output_paths()]
+
+    def wait_for_changes(self, watcher, graph, watched, written=()):
+        """Block until inputs change and return the tasks to rerun.
+
+        Changes to the written paths, the outputs of the last build, are
+        ignored. Returns None when the config file itself changed.
+        """
+        from .watch import collect_changes
+        from .watch import is_within
+        config_path = os.path.abspath(self.config_file.filename)
+        print('Watching for changes, press Ctrl-C to stop.')
+        while True:
+            changed = set(
+                change for change in collect_changes(watcher, self.debounce)
+                if not any(is_within(change, path) for path in written))
+            dprint('changed paths: %s' % sorted(changed))
+            if config_path in changed:
+                return None
+            rebuild = self.affected_tasks(graph, watched, changed)
+            if rebuild:
+                return rebuild
+
+    def watch_inputs(self):
+        """Rebuild the tasks affected by changes to their inputs.
+
+        One watcher is kept across rebuilds, so changes saved while a rebuild
+        runs trigger the next one. It is only replaced when the config file
+        changes.
+        """
+        tasks = self.create_tasks()
+        watcher = self.create_watcher(self.watched_paths(tasks))
+        written = []
+        try:
+            while True:
+                graph = self.task_graph(tasks)
+                if self.only:
+                    graph = subgraph(graph, select(graph, self.only))
+                watched = self.watched_paths(tasks)
+                rebuild = self.wait_for_changes(watcher, graph, watched,
+                                                written)
+                if rebuild is None:
+                    print('Config file changed, rebuilding all tasks.')
+                    watcher.close()
+                    self.config_file = self.load_config_file(
+                        self.config_file.filename)
+                    tasks = self.create_tasks()
+                    watcher = self.create_watcher(self.watched_paths(tasks))
+                    self.build_site(tasks)
+                    written = self.written_paths(tasks, list(tasks))
+                    tasks = self.create_tasks()
+                    continue
+                print('Rebuilding tasks: %s' % ' '.join(rebuild))
+                status = self.run_tasks(tasks, subgraph(graph, rebuild),
+                                        self.shared_state)
+                written = self.written_paths(tasks, rebuild)
+                tasks = self.create_tasks()
+                if not status:
+                    print('Rebuild Completed.')
+        finally:
+            watcher.close()
+
+
+class ServeMixin(WatchMixin):
+    """Mixin class to add a build daemon listening on a Unix socket.
+
+    The daemon keeps the task registry, the parsed config file and the shared
+    state of the last build in memory and serves build requests sent by the
+    ``escadrille-client`` command (see ``escadrille.serve``).
+    """
+
+    def __init__(self):
+        """Set up instance defaults for the build daemon."""
+        super().__init__()
+        self.serve = None
+        self.socket = None
+        self.config_mtime = None
+
+    def build(self):
+        """Add build daemon options to the parser."""
+        self.parser.add_argument(
+            '--serve', action='store_true', dest='serve', default=False,
+            help='Run as a build daemon serving escadrille-client requests.')
+        self.parser.add_argument(
+            '--socket', action='store', dest='socket', default=None,
+            metavar='PATH', help='The build daemon socket. Defaults to the '
+            'config file path plus ".sock".')
+        super().build()
+
+    def configure(self, options):
+        """Set the build daemon attributes from the command line options."""
+        super().configure(options)
+        self.serve = options.serve
+        self.socket = options.socket
+
+    def _main(self):
+        """Serve build requests if requested, otherwise build normally."""
+        if not self.serve:
+            return super()._main()
+        self.skip = self.skip if self.skip else []
+        if self.tasks is None:
+            self.tasks = load_tasks(self.config_file.cache_dir)
+        self.config_mtime = self.get_config_mtime()
+        from .serve import BuildServer
+        from .serve import default_socket_path
+        path = self.socket or default_socket_path(self.config_file.filename)
+        server = BuildServer(path, self.handle_build)
+        print('Serving build requests on %s, press Ctrl-C to stop.' % path)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+        return 0
+
+    def get_config_mtime(self):
+        """Return the modification time of the config file, if any."""
+        try:
+            return os.stat(self.config_file.filename).st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_config(self):
+        """Reload the config file if it changed since it was loaded.
+
+        Returns True when the config was reloaded.
+        """
+        mtime = self.get_config_mtime()
+        if mtime == self.config_mtime:
+            return False
+        self.config_file = self.load_config_file(self.config_file.filename)
+        self.config_mtime = mtime
+        self.shared_state = None
+        return True
+
+    def serve_build(self, request):
+        """Run the build described by a request and return its status."""
+        if self.reload_config():
+            print('Config file changed, reloaded.')
+        changed = request.get('changed')
+        if changed and self.shared_state is not None:
+            tasks = self.create_tasks()
+            graph = self.task_graph(tasks)
+            rebuild = self.affected_tasks(graph, self.watched_paths(tasks),
+                                          changed)
+            if not rebuild:
+                print('No tasks are affected by the changes.')
+                return 0
+            print('Rebuilding tasks: %s' % ' '.join(rebuild))
+            return self.run_tasks(self.create_tasks(),
+                                  subgraph(graph, rebuild),
+                                  self.shared_state)
+        only, self.only = self.only, request.get('only') or self.only
+        try:
+            return self.build_site()
+        finally:
+            self.only = only
+
+    def handle_build(self, request):
+        """Run a build request and return the response for the client."""
+        output = io.StringIO()
+        with redirect_stdout(output):
+            try:
+                status = self.serve_build(request)
+            except Exception as exc:
+                # a failed build must not take the daemon down
+                print('Build failed: %s' % exc)
+                status = 1
+        print('Build request %s finished with status %s.' %
+              (json.dumps(request), status))
+        return {'status': status, 'output': output.getvalue()}
+
+
+class CliInterface(ServeMixin, WatchMixin, ConfigMixin, InterfaceCore):
     """A Command Line User Interface."""
 
     description = """Escadrille: Automated Website Generation"""
@@ -147,9 +625,37 @@ class CliInterface(ConfigMixin, InterfaceCore):
         self.parser.add_argument(
             '-s', '--skip', dest='skip', action='append', metavar='TASK',
             help='Specify an enabled task to skip.')
+        self.parser.add_argument(
+            '--only', dest='only', action='append', metavar='TASK',
+            help='Only run the specified enabled task and the tasks it '
+            'requires.')
+        self.parser.add_argument(
+            '-j', '--jobs', dest='jobs', action='store', type=int,
+            default=None, metavar='N',
+            help='Number of tasks to run concurrently. Overrides the "jobs" '
+            'option of the general config section.')
+        self.parser.add_argument(
+            '--no-cache', dest='no_cache', action='store_true',
+            help='Run every task instead of using cached results.')
+        self.parser.add_argument(
+            '--resume', dest='resume', action='store_true',
+            help='Resume the previous run, skipping the tasks it completed.')
+        self.parser.add_argument(
+            '--resume-from', dest='resume_from', action='store',
+            default=None, metavar='TASK',
+            help='Resume the previous run from the specified task, skipping '
+            'the earlier tasks it completed.')
         self.parser.add_argument(
             '-l', '--list', dest='list', action='store_true',
             help='List the enabled tasks in the config file.')
+        self.parser.add_argument(
+            '--trace', dest='trace', action='store', default=None,
+            metavar='FILE',
+            help='Write a Chrome trace event file of the run\'s timings.')
+        self.parser.add_argument(
+            startup.REPORT_FLAG, dest='startup_report', action='store_true',
+            help='Run the rest of the command line in a new interpreter and '
+            'report the import time of each escadrille module.')
         super().build()
         self.built = True
 
@@ -162,20 +668,49 @@ class CliInterface(ConfigMixin, InterfaceCore):
         return args
 
     def _main(self):
+        if startup.REPORT_FLAG in sys.argv[1:]:
+            # before parsing, so that flags like --version can be profiled
+            return startup.startup_report(sys.argv[1:])
         options = self.parse_cmd_line()
+        if options.trace:
+            trace.enable()
+        try:
+            with span('escadrille'):
+                return self.run(options)
+        finally:
+            if options.trace:
+                trace.write(options.trace)
+
+    def run(self, options):
+        """Run escadrille with the parsed command line options."""
+        configs = options.config or [None]
+        self.config_cache = options.config_cache
         dprint('loading configuration...')
-        self.config_file = ConfigFile(options.config)
-        self.config_file.load()
-        self.tasks = load_tasks()
-        self.skip = options.skip
-        self.list_tasks = options.list
+        self.config_file = self.load_config_file(configs[0])
+        self.tasks = load_tasks(self.config_file.cache_dir)
+        self.configure(options)
         if options.default_config:
             self.config_file.print_default_config(self.tasks)
             return 0
         if options.debug_config:
             return self.print_config_debug(options)
+        if len(configs) > 1 and not self.list_tasks:
+            return self.build_sites(configs, options)
         return super()._main()
 
+    def build_sites(self, configs, options):
+        """Build the sites of several config files in one process."""
+        sites = []
+        for config in configs:
+            site = InterfaceCore()
+            site.config_file = self.load_config_file(config)
+            site.tasks = self.tasks
+            site.configure(options)
+            site.skip = site.skip if site.skip else []
+            sites.append(site)
+        from .batch import SiteBatch
+        return SiteBatch(sites, options.jobs).run()
+
     @classmethod
     def main(cls):
         """Escadrille main entry point for CLI usage."""
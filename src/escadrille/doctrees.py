@@ -0,0 +1,275 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Storage of the doctrees made by the rst2dtree task.
+
+The doctrees are stored either as one pickle file per RST source or packed
+into a single SQLite archive. The archive holds the compressed pickle of each
+doctree in one row, keyed by source path and indexed by title, so a doctree is
+loaded without reading the rest of the archive.
+
+The "dtrees" shared state maps titles to doctree handles, which are small
+and picklable and only read their doctree when it is first loaded. The loaded
+doctrees are kept in a process wide LRU cache, bounded by the total pickled
+size of its doctrees, so the tasks of a run share decoded doctrees without
+holding every doctree in memory. The doctrees are shared, so they must not be
+modified; use ``doctree.deepcopy()`` to get a private copy.
+"""
+
+import os
+import pickle
+import threading
+import zlib
+from collections import OrderedDict
+
+# default bound of the doctree cache, in pickled bytes
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS doctrees (
+    source TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS doctrees_title ON doctrees (title);
+'''
+
+
+def dumps(doctree):
+    """Return the compressed pickle of a doctree."""
+    return zlib.compress(pickle.dumps(doctree, pickle.HIGHEST_PROTOCOL))
+
+
+def load_doctree(ref):
+    """Load a doctree from a "dtrees" value, a handle or a pickle path."""
+    if isinstance(ref, str):
+        with open(ref, 'rb') as fin:
+            return pickle.load(fin)
+    return ref.load()
+
+
+class DoctreeCache(object):
+    """A thread safe LRU cache of doctrees bounded by their pickled size.
+
+    Doctrees bigger than the whole cache are loaded but not cached.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        """Set up instance vars for a DoctreeCache object."""
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # handle: (doctree, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, handle):
+        """Return the handle's doctree, reading it on a cache miss."""
+        with self.lock:
+            entry = self.entries.get(handle)
+            if entry is not None:
+                self.entries.move_to_end(handle)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        # read outside of the lock so that other threads are not held up
+        doctree, size = handle.read()
+        with self.lock:
+            if handle not in self.entries and size <= self.max_bytes:
+                self.entries[handle] = (doctree, size)
+                self.size += size
+                self.evict()
+        return doctree
+
+    def evict(self):
+        """Drop the least recently used doctrees until within bounds."""
+        while self.size > self.max_bytes:
+            _, (_, size) = self.entries.popitem(last=False)
+            self.size -= size
+
+    def resize(self, max_bytes):
+        """Change the bound of the cache."""
+        with self.lock:
+            self.max_bytes = max_bytes
+            self.evict()
+
+    def clear(self):
+        """Drop every cached doctree."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+DOCTREE_CACHE = DoctreeCache()
+
+
+class DoctreeHandle(object):
+    """Reference to the stored doctree of a source, loaded through the cache.
+
+    Handles are small and picklable, so they can be kept in the shared state,
+    the build cache and the checkpoint. The hash of the doctree's source is
+    part of the handle so that a changed doctree changes the shared state and
+    is not served from the cache.
+    """
+
+    def __init__(self, path, source, digest):
+        """Set up instance vars for a DoctreeHandle object."""
+        self.path = path
+        self.source = source
+        self.digest = digest
+
+    def key(self):
+        """Return the tuple identifying the doctree."""
+        return (self.path, self.source, self.digest)
+
+    def read(self):
+        """Read the doctree and return it with its pickled size."""
+        raise NotImplementedError
+
+    def load(self):
+        """Return the doctree, shared with the other users of the handle."""
+        return DOCTREE_CACHE.get(self)
+
+    def __eq__(self, other):
+        """Return True if both handles refer to the same doctree."""
+        return type(self) is type(other) and self.key() == other.key()
+
+    def __hash__(self):
+        """Return the hash of the handle."""
+        return hash(self.key())
+
+    def __repr__(self):
+        """Return a stable representation, used in build fingerprints."""
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join(repr(part) for part in self.key()))
+
+
+class PickleHandle(DoctreeHandle):
+    """Reference to a doctree pickled to its own file."""
+
+    def read(self):
+        """Read the doctree and return it with its pickled size."""
+        with open(self.path, 'rb') as fin:
+            data = fin.read()
+        return pickle.loads(data), len(data)
+
+
+class DoctreeArchive(object):
+    """A SQLite file of compressed doctrees keyed by source path."""
+
+    def __init__(self, path):
+        """Set up instance vars for a DoctreeArchive object."""
+        self.path = path
+        self.connection = None
+
+    def open(self):
+        """Open the archive, creating it when it does not exist."""
+        if self.connection is None:
+            # sqlite3 is slow to import so only import it when used
+            import sqlite3
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.connection = sqlite3.connect(self.path)
+            self.connection.executescript(SCHEMA)
+        return self
+
+    def commit(self):
+        """Commit the changes to the archive."""
+        self.connection.commit()
+
+    def close(self):
+        """Commit the changes and close the archive."""
+        if self.connection is not None:
+            self.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        """Open the archive."""
+        return self.open()
+
+    def __exit__(self, *exc_info):
+        """Close the archive."""
+        self.close()
+
+    def sources(self):
+        """Return the set of source paths in the archive."""
+        return {row[0] for row in
+                self.connection.execute('SELECT source FROM doctrees')}
+
+    def put(self, source, title, digest, data):
+        """Store the compressed doctree of a source."""
+        self.connection.execute(
+            'INSERT OR REPLACE INTO doctrees VALUES (?, ?, ?, ?)',
+            (source, title, digest, data))
+
+    def remove(self, sources):
+        """Remove the doctrees of the sources."""
+        self.connection.executemany('DELETE FROM doctrees WHERE source = ?',
+                                    [(source,) for source in sources])
+
+    def get(self, source):
+        """Return the pickled doctree of a source."""
+        return fetch(self.connection, source)
+
+    def handle(self, source, digest):
+        """Return the handle of a source's doctree."""
+        return ArchiveHandle(self.path, source, digest)
+
+
+def fetch(connection, source):
+    """Return the pickled doctree of a source from an archive connection."""
+    row = connection.execute(
+        'SELECT data FROM doctrees WHERE source = ?', (source,)).fetchone()
+    if row is None:
+        raise KeyError(source)
+    return zlib.decompress(row[0])
+
+
+_readers = threading.local()
+
+
+def read_connection(path):
+    """Return the calling thread's read only connection to a SQLite file.
+
+    The connection is kept for the following reads, unless the file was
+    replaced since it was opened. The file must exist, only its writer, e.g.
+    DoctreeArchive for an archive, creates it.
+    """
+    import sqlite3
+    from urllib.parse import quote
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    identity = (stat.st_dev, stat.st_ino)
+    connections = getattr(_readers, 'connections', None)
+    if connections is None:
+        connections = _readers.connections = {}
+    cached = connections.get(path)
+    if cached is None or cached[0] != identity:
+        if cached is not None:
+            cached[1].close()
+        connection = sqlite3.connect('file:%s?mode=ro' % quote(path),
+                                     uri=True)
+        connections[path] = cached = (identity, connection)
+    return cached[1]
+
+
+class ArchiveHandle(DoctreeHandle):
+    """Reference to one doctree of a DoctreeArchive."""
+
+    def read(self):
+        """Read the doctree and return it with its pickled size."""
+        data = fetch(read_connection(self.path), self.source)
+        return pickle.loads(data), len(data)
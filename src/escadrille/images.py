@@ -0,0 +1,254 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Resizing of gallery images, cached by content.
+
+Resized images are made with Pillow, an optional dependency (install
+"escadrille[images]"), which is only imported by the processes resizing.
+
+Each resized image is stored in an ImageCache under a key made of the hash of
+the source image's content and the resize parameters, so an image is only
+resized again when its content or the parameters change, whatever its path.
+The hashes of the source images are remembered along with their stat info,
+so unchanged images are not read either, as are the dimensions of the
+resized images. ``make_images`` resizes the missing images in a pool of
+worker processes and copies the cached images to their destinations.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from escadrille.cache import hash_file
+from escadrille import trace
+from escadrille.trace import span
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+# the version of the resizing, change it to make every cached image again
+RESIZE_VERSION = 1
+
+
+def is_image(fname):
+    """Return True if the file name has the extension of an image."""
+    return os.path.splitext(fname)[1].lower() in IMAGE_EXTENSIONS
+
+
+def thumb_name(fname):
+    """Return the file name of an image's thumbnail, a PNG for JPEGs."""
+    if fname.endswith('jpg') or fname.endswith('JPG'):
+        return fname[:-3] + 'png'
+    return fname
+
+
+def resize_image(source, dest, width, height=None):
+    """Write the source image scaled down to fit in width by height.
+
+    Without a height only the width is limited. Returns the (width, height)
+    of the written image.
+    """
+    from PIL import Image
+    extension = os.path.splitext(dest)[1].lower()
+    image_format = Image.registered_extensions()[extension]
+    with Image.open(source) as image:
+        image.thumbnail((width, height or image.height))
+        if image.mode == 'CMYK' and image_format != 'JPEG':
+            image = image.convert('RGB')
+        if image.mode in ('RGBA', 'P') and image_format == 'JPEG':
+            image = image.convert('RGB')
+        temp_path = '%s.%d.tmp' % (dest, os.getpid())
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        image.save(temp_path, format=image_format)
+        size = image.size
+    os.replace(temp_path, dest)
+    return size
+
+
+def image_size(path):
+    """Return the (width, height) of an image file."""
+    from PIL import Image
+    with Image.open(path) as image:
+        return image.size
+
+
+def resize_images(jobs):
+    """Resize a list of (source, dest, params) jobs.
+
+    The params are the keyword arguments of ``resize_image``. Returns the
+    list of error messages and the map of dest to the [width, height] of the
+    written image. This is the function run by the worker processes.
+    """
+    errors, sizes = [], {}
+    for source, dest, params in jobs:
+        try:
+            sizes[dest] = list(resize_image(source, dest, **params))
+        except Exception as exc:
+            errors.append('%s: %s' % (source, exc))
+    return errors, sizes
+
+
+class ImageCache(object):
+    """A content addressed store of resized images."""
+
+    hashes_name = 'hashes.json'
+    sizes_name = 'sizes.json'
+
+    def __init__(self, path):
+        """Set up instance vars for an ImageCache object."""
+        self.path = path
+        self.hashes = None  # source path: [size, mtime_ns, hash]
+        self.sizes = None  # cached image path: [width, height]
+
+    def load_json(self, name):
+        """Return the data of a JSON file of the cache, {} if there is none."""
+        try:
+            with open(os.path.join(self.path, name), 'r') as fin:
+                return json.load(fin)
+        except (OSError, ValueError):
+            return {}
+
+    def store_json(self, name, data):
+        """Write a JSON file of the cache."""
+        path = os.path.join(self.path, name)
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(self.path, exist_ok=True)
+        with open(temp_path, 'w') as fout:
+            json.dump(data, fout, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def load_hashes(self):
+        """Load the remembered hashes of source images, once."""
+        if self.hashes is None:
+            self.hashes = self.load_json(self.hashes_name)
+
+    def store_hashes(self):
+        """Write the remembered hashes of source images."""
+        if self.hashes is not None:
+            self.store_json(self.hashes_name, self.hashes)
+
+    def image_size(self, cached):
+        """Return the [width, height] of a cached image."""
+        if self.sizes is None:
+            self.sizes = self.load_json(self.sizes_name)
+        if cached not in self.sizes:
+            self.sizes[cached] = list(image_size(cached))
+        return self.sizes[cached]
+
+    def record_sizes(self, sizes):
+        """Remember the [width, height] of cached images."""
+        if self.sizes is None:
+            self.sizes = self.load_json(self.sizes_name)
+        self.sizes.update(sizes)
+
+    def store_sizes(self):
+        """Write the remembered dimensions of cached images."""
+        if self.sizes is not None:
+            self.store_json(self.sizes_name, self.sizes)
+
+    def source_hash(self, source):
+        """Return the content hash of a source image."""
+        self.load_hashes()
+        source = os.path.abspath(source)
+        stat = os.stat(source)
+        remembered = self.hashes.get(source)
+        if remembered is not None and remembered[:2] == [stat.st_size,
+                                                         stat.st_mtime_ns]:
+            return remembered[2]
+        digest = hash_file(source)
+        self.hashes[source] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def cached_path(self, source, dest, params, digest=None):
+        """Return the path of the cached image resized from the source.
+
+        The digest is the content hash of the source, when it is known.
+        """
+        if digest is None:
+            digest = self.source_hash(source)
+        key = json.dumps([digest, params, RESIZE_VERSION], sort_keys=True)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        extension = os.path.splitext(dest)[1].lower()
+        return os.path.join(self.path, digest[:2], digest + extension)
+
+
+def install(cached, dest):
+    """Copy a cached image to its destination unless it is there already."""
+    stat = os.stat(cached)
+    try:
+        dest_stat = os.stat(dest)
+        if (dest_stat.st_size, dest_stat.st_mtime_ns) == (stat.st_size,
+                                                          stat.st_mtime_ns):
+            return False
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    shutil.copy2(cached, dest)
+    return True
+
+
+def make_images(cache, jobs, workers=1, shards_per_worker=4, hashes=None):
+    """Make the images of the (source, dest, params) jobs.
+
+    The hashes map source paths to their content hash when it is known
+    already, e.g. from the media catalog, those sources are not read.
+
+    The images that are not in the cache are resized, in a pool of worker
+    processes when workers is more than 1, and every image is then copied
+    from the cache to its destination if it is not there already. Returns
+    the number of resized images, the list of error messages and the map of
+    each made dest to its (width, height).
+    """
+    errors, pending, installs = [], {}, []
+    hashes = hashes or {}
+    with span('hash images', category='images', images=len(jobs)):
+        for source, dest, params in jobs:
+            try:
+                cached = cache.cached_path(source, dest, params,
+                                           hashes.get(source))
+            except OSError as exc:
+                errors.append('%s: %s' % (source, exc))
+                continue
+            if not os.path.exists(cached):
+                pending[cached] = (source, cached, params)
+            installs.append((cached, dest))
+    cache.store_hashes()
+    pending = list(pending.values())
+    with span('resize %d images' % len(pending), category='images'):
+        if workers > 1 and len(pending) > 1:
+            import functools
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            count = min(len(pending), workers * shards_per_worker)
+            shards = [pending[index::count] for index in range(count)]
+            # spawn as forking a process that runs threads is unsafe
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=context) as executor:
+                resize = functools.partial(trace.collect, trace.tracing(),
+                                           resize_images)
+                for (shard_errors, sizes), events in executor.map(resize,
+                                                                  shards):
+                    errors.extend(shard_errors)
+                    cache.record_sizes(sizes)
+                    trace.merge(events)
+        else:
+            shard_errors, sizes = resize_images(pending)
+            errors.extend(shard_errors)
+            cache.record_sizes(sizes)
+    made = {}
+    for cached, dest in installs:
+        if os.path.exists(cached):
+            install(cached, dest)
+            made[dest] = tuple(cache.image_size(cached))
+    cache.store_sizes()
+    return len(pending), errors, made
@@ -0,0 +1,124 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Pelican plugin reading RST content from the doctrees of rst2dtree.
+
+The plugin replaces pelican's RST reader with one that renders the doctree the
+rst2dtree task already parsed for a source file, and gets the metadata from
+its docinfo, instead of parsing the source again. Sources without a doctree,
+or whose content changed since it was parsed, are read by pelican's reader as
+usual.
+
+The doctrees are found through an index, a pickled map of real source path to
+doctree handle, whose path is given by the ESCADRILLE_DOCTREES pelican setting
+or environment variable. The pelican task writes the index and enables the
+plugin when the "dtrees" shared state is available, by running pelican with
+``python -m escadrille.pelican_reader``. The plugin can also be listed in the
+PLUGINS pelican setting.
+
+For pages identical to pelican's own, rst2dtree should parse with the docutils
+settings of pelican's RST reader that affect parsing, i.e. set its
+"docutils_settings" option to {"syntax_highlight": "short"}.
+"""
+
+import os
+import pickle
+import sys
+from io import StringIO
+
+import docutils.core
+import docutils.io
+from docutils.readers.doctree import Reader as DoctreeReader
+from pelican import signals
+from pelican.readers import RstReader
+
+from escadrille.cache import hash_file
+from escadrille.tasks.pelican import DOCTREES_SETTING as SETTING
+
+
+def load_index(path):
+    """Return the map of real source path to doctree handle."""
+    with open(path, 'rb') as fin:
+        return pickle.load(fin)
+
+
+class DoctreeRstReader(RstReader):
+    """Pelican's RST reader, using the doctrees of rst2dtree when it can."""
+
+    def __init__(self, *args, **kwargs):
+        """Set up instance vars for a DoctreeRstReader object."""
+        super().__init__(*args, **kwargs)
+        index = self.settings.get(SETTING) or os.environ.get(SETTING)
+        self.doctrees = load_index(index) if index else {}
+
+    def publisher_settings(self):
+        """Return the docutils settings used by pelican's RST reader."""
+        settings = {'initial_header_level': '2',
+                    'syntax_highlight': 'short',
+                    'input_encoding': 'utf-8',
+                    'halt_level': 2,
+                    'traceback': True,
+                    'warning_stream': StringIO(),
+                    'embed_stylesheet': False}
+        # older pelican versions do not set the language code
+        language_code = getattr(self, '_language_code', None)
+        if language_code is not None:
+            settings['language_code'] = language_code
+        settings.update(self.settings.get('DOCUTILS_SETTINGS') or {})
+        return settings
+
+    def doctree(self, source_path):
+        """Return the up to date doctree of a source, or None."""
+        handle = self.doctrees.get(os.path.realpath(source_path))
+        if handle is None or handle.digest != hash_file(source_path):
+            return None
+        # read a private copy, writing the page modifies the doctree
+        return handle.read()[0]
+
+    def _get_publisher(self, source_path):
+        """Return a publisher that has written the page of a source."""
+        doctree = self.doctree(source_path)
+        if doctree is None:
+            return super()._get_publisher(source_path)
+        publisher = docutils.core.Publisher(
+            reader=DoctreeReader(), writer=self.writer_class(),
+            source_class=docutils.io.DocTreeInput,
+            destination_class=docutils.io.StringOutput)
+        publisher.process_programmatic_settings(
+            None, self.publisher_settings(), None)
+        publisher.set_source(source=doctree, source_path=source_path)
+        publisher.publish()
+        return publisher
+
+
+def add_reader(readers):
+    """Use the DoctreeRstReader for RST files."""
+    for extension in DoctreeRstReader.file_extensions:
+        readers.reader_classes[extension] = DoctreeRstReader
+
+
+def register():
+    """Register the plugin with pelican."""
+    signals.readers_init.connect(add_reader)
+
+
+def main():
+    """Run the pelican command line with the plugin registered."""
+    import pelican
+    register()
+    sys.argv[0] = 'pelican'
+    pelican.main()
+
+
+if __name__ == '__main__':
+    main()
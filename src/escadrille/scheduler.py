@@ -0,0 +1,193 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Dependency aware scheduling of escadrille tasks.
+
+Tasks declare the names they "require" and "provide". A requirement is
+satisfied by any earlier enabled task whose tag matches the name or which
+provides the name. Dependency edges therefore only ever point backwards in
+the "enabled_tasks" order which keeps the graph free of cycles.
+
+A task that does not declare its requirements (``None``) depends on every
+earlier task and a task that does not declare what it provides is depended on
+by every later task. Undeclared tasks therefore behave as barriers, keeping
+the original sequential semantics for tasks that predate the scheduler.
+"""
+
+import inspect
+from collections import OrderedDict
+
+from .verbosity import dprint
+
+
+def build_graph(edges):
+    """Return an ordered map of task tag to the set of tags it depends on.
+
+    The edges argument is an ordered map of task tag to a tuple of the
+    (requires, provides) lists for the task, in "enabled_tasks" order.
+    """
+    graph = OrderedDict()
+    for tag, (requires, _) in edges.items():
+        depends = set()
+        for earlier in graph:
+            earlier_provides = edges[earlier][1]
+            if requires is None or earlier_provides is None:
+                depends.add(earlier)
+            elif earlier in requires or set(requires) & set(earlier_provides):
+                depends.add(earlier)
+        graph[tag] = depends
+    dprint('task graph: %s' % dict(graph))
+    return graph
+
+
+def select(graph, only):
+    """Return the tags in graph needed to run the "only" tags.
+
+    The result includes the transitive dependencies of each tag and is in the
+    same order as the graph.
+    """
+    wanted, pending = set(), list(only)
+    while pending:
+        tag = pending.pop()
+        if tag in wanted:
+            continue
+        if tag not in graph:
+            raise KeyError('Task "%s" is not an enabled task.' % tag)
+        wanted.add(tag)
+        pending.extend(graph[tag])
+    return [tag for tag in graph if tag in wanted]
+
+
+def subgraph(graph, tags):
+    """Return the part of graph containing only the given tags.
+
+    Dependencies on tags outside of the subgraph are dropped, those tasks are
+    considered complete.
+    """
+    tags = set(tags)
+    return OrderedDict((tag, depends & tags)
+                       for tag, depends in graph.items() if tag in tags)
+
+
+def downstream(graph, tags):
+    """Return the tags in graph that depend, transitively, on "tags"."""
+    affected = set(tags)
+    for tag, depends in graph.items():
+        if depends & affected:
+            affected.add(tag)
+    return [tag for tag in graph if tag in affected]
+
+
+class Scheduler(object):
+    """Run the tasks of a dependency graph using a pool of worker threads.
+
+    Ready tasks are started in graph order and at most "jobs" tasks run in
+    the worker pool at any time, so with a single job the tasks run one after
+    another in the order of the config file. An executor shared with other
+    schedulers can be given, otherwise the scheduler uses a pool of its own.
+
+    Work given as a coroutine, rather than a callable, is run on an asyncio
+    event loop in a background thread instead of in the worker pool. It does
+    not count against "jobs", so any number of coroutines can be in flight
+    next to the pooled tasks.
+    """
+
+    def __init__(self, graph, jobs=1, executor=None):
+        """Set up instance vars for a Scheduler object."""
+        self.graph = graph
+        self.jobs = max(1, int(jobs))
+        self.executor = executor
+        self.event_loop = None
+        self.done = set()
+
+    def ready(self, started):
+        """Return the tags that have all of their dependencies completed."""
+        return [tag for tag in self.graph if tag not in started and
+                self.graph[tag] <= self.done]
+
+    def run(self, start, finish):
+        """Run every task in the graph.
+
+        The start callable is called in the calling thread with a task tag and
+        returns a callable to run in a worker thread, a coroutine to run on
+        the event loop, or None when the task should be skipped. The worker's
+        return value is handed, along with the tag, to the finish callable in
+        the calling thread. When finish returns a non-zero status no further
+        tasks are started, the running tasks are waited for and the status is
+        returned.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        try:
+            if self.executor is not None:
+                return self._run(self.executor, start, finish)
+            with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+                return self._run(executor, start, finish)
+        finally:
+            if self.event_loop is not None:
+                self.event_loop.close()
+                self.event_loop = None
+
+    def submit(self, executor, work):
+        """Start the work and return its concurrent.futures.Future."""
+        if not inspect.iscoroutine(work):
+            return executor.submit(work)
+        if self.event_loop is None:
+            from .aio import EventLoopThread
+            self.event_loop = EventLoopThread()
+        return self.event_loop.submit(work)
+
+    def _run(self, executor, start, finish):
+        """Run every task in the graph using the given executor."""
+        from concurrent.futures import FIRST_COMPLETED
+        from concurrent.futures import wait
+        started, running, status = set(), {}, 0
+        # the pooled work waiting for a worker, and the pooled futures
+        queued, pooled = [], set()
+        try:
+            while True:
+                ready = [] if status else self.ready(started)
+                while ready:
+                    tag = ready.pop(0)
+                    started.add(tag)
+                    work = start(tag)
+                    if work is None:
+                        self.done.add(tag)
+                        ready = self.ready(started)
+                    elif inspect.iscoroutine(work):
+                        running[self.submit(executor, work)] = tag
+                    else:
+                        queued.append((tag, work))
+                while queued and not status and len(pooled) < self.jobs:
+                    tag, work = queued.pop(0)
+                    future = self.submit(executor, work)
+                    running[future] = tag
+                    pooled.add(future)
+                if not running:
+                    break
+                completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(completed, key=self._order(running)):
+                    pooled.discard(future)
+                    tag = running.pop(future)
+                    result = finish(tag, future.result())
+                    self.done.add(tag)
+                    if result and not status:
+                        status = result
+        finally:
+            # never leave tasks running in a shared pool after an error
+            wait(running)
+        return status
+
+    def _order(self, running):
+        """Return a sort key placing futures in graph order."""
+        order = list(self.graph)
+        return lambda future: order.index(running[future])
@@ -0,0 +1,130 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unix domain socket protocol for the escadrille build daemon.
+
+A request is a single line of JSON sent by the client. It may contain an
+"only" list of task tags and a "changed" list of paths; an empty request asks
+for a full build. The daemon answers with a single line of JSON holding the
+build "status" and the "output" printed during the build. A connection
+closed without a request only checks that the daemon is listening.
+
+This module is also the thin client (``escadrille-client``) so it must stay
+free of imports beyond the standard library modules it needs.
+"""
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+
+
+def default_socket_path(config_path):
+    """Return the socket path used for a config file by default."""
+    return os.path.abspath(config_path) + '.sock'
+
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+    """Read one build request and write the build response."""
+
+    def handle(self):
+        """Handle a build request from a client."""
+        line = self.rfile.readline()
+        if not line.strip():
+            return  # a liveness check, there is no one to answer
+        try:
+            request = json.loads(line.decode('utf-8'))
+        except ValueError:
+            response = {'status': 1, 'output': 'Invalid build request.\n'}
+        else:
+            response = self.server.build(request)
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class BuildServer(socketserver.UnixStreamServer):
+    """Serve build requests one at a time on a Unix domain socket.
+
+    The build callable is given the request dict and returns the response
+    dict.
+    """
+
+    def __init__(self, path, build):
+        """Bind the socket, replacing a stale socket file if needed."""
+        if os.path.exists(path):
+            try:
+                send_request(path, None)
+            except OSError:
+                os.remove(path)
+            else:
+                raise OSError('A build daemon is already listening on %s' %
+                              path)
+        self.build = build
+        super().__init__(path, BuildRequestHandler)
+
+    def server_close(self):
+        """Close the server and remove the socket file."""
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def send_request(path, request):
+    """Send a build request to the daemon and return its response.
+
+    A request of None only checks that the daemon is listening.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        if request is None:
+            return None
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as fin:
+            return json.loads(fin.readline().decode('utf-8'))
+
+
+def client_main():
+    """Entry point for the thin escadrille-client command."""
+    parser = argparse.ArgumentParser(
+        description='Trigger a build in a running escadrille daemon.')
+    parser.add_argument(
+        '-c', '--config', dest='config', default='escadrille.cfg',
+        help='The config file the daemon was started with.')
+    parser.add_argument(
+        '--socket', dest='socket', default=None, metavar='PATH',
+        help='The daemon socket. Defaults to the config path plus ".sock".')
+    parser.add_argument(
+        '--only', dest='only', action='append', metavar='TASK',
+        help='Only run the specified enabled task and the tasks it requires.')
+    parser.add_argument(
+        '--changed', dest='changed', nargs='+', metavar='PATH',
+        help='Only rerun the tasks affected by changes to these paths.')
+    args = parser.parse_args()
+    request = {}
+    if args.only:
+        request['only'] = args.only
+    if args.changed:
+        request['changed'] = [os.path.abspath(path) for path in args.changed]
+    path = args.socket or default_socket_path(args.config)
+    try:
+        response = send_request(path, request)
+    except OSError as exc:
+        print('Cannot reach the escadrille daemon at %s: %s' % (path, exc))
+        sys.exit(1)
+    except ValueError:
+        print('The escadrille daemon at %s closed the connection without '
+              'answering.' % path)
+        sys.exit(1)
+    sys.stdout.write(response.get('output', ''))
+    sys.exit(response.get('status', 1))
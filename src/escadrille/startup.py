@@ -0,0 +1,146 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Import time profiling of the escadrille startup.
+
+``escadrille --startup-report`` reruns the rest of its command line in a fresh
+interpreter with ``python -X importtime``. The time of every import is then
+attributed to the escadrille module that caused it, either directly or through
+other third party or standard library modules.
+"""
+
+import os
+import sys
+from collections import OrderedDict
+
+REPORT_FLAG = '--startup-report'
+IMPORT_TIME_PREFIX = 'import time:'
+PACKAGE = 'escadrille'
+# bucket for the imports made by the interpreter itself and the imports made
+# from inside functions, which are not nested below the importing module
+TOP_LEVEL = '<top level>'
+# the command run by the report, the command line arguments follow
+DRIVER = ('import sys; sys.argv[0] = "escadrille"; '
+          'from escadrille.core import CliInterface; CliInterface.main()')
+
+
+def parse_importtime(lines):
+    """Return the (name, depth, self_us, cumulative_us) of each import.
+
+    The lines are the stderr output of ``python -X importtime``. Lines that
+    are not import times are ignored. The imports are returned in the order
+    they were reported, which lists each module after the modules it imports.
+    """
+    records = []
+    for line in lines:
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            continue
+        fields = line[len(IMPORT_TIME_PREFIX):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue  # the header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        records.append((name.strip(), depth, self_us, cumulative_us))
+    return records
+
+
+def is_escadrille(name):
+    """Return True if the module name is part of the escadrille package."""
+    return name == PACKAGE or name.startswith(PACKAGE + '.')
+
+
+def attribute(records):
+    """Return an ordered map of escadrille module to its import costs.
+
+    Each value is a dict with the module's own "self" time, the "deps" time
+    of the other modules first imported on its behalf and the "heaviest" of
+    those modules mapped to their cumulative time. Imports made outside of
+    escadrille module imports are attributed to the TOP_LEVEL key. Times are in
+    microseconds.
+    """
+    costs = OrderedDict()
+    stack = []
+    # reversed, every module is seen before the modules it imported
+    for name, depth, self_us, cumulative_us in reversed(records):
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        owner = next((module for _, module in reversed(stack)
+                      if is_escadrille(module)), TOP_LEVEL)
+        stack.append((depth, name))
+        if is_escadrille(name):
+            owner = name
+        cost = costs.setdefault(owner, {'self': 0, 'deps': 0,
+                                        'heaviest': {}})
+        if owner == name:
+            cost['self'] += self_us
+            continue
+        cost['deps'] += self_us
+        parent = stack[-2][1] if len(stack) > 1 else None
+        if parent is None or is_escadrille(parent):
+            cost['heaviest'][name] = cumulative_us
+    return costs
+
+
+def format_report(costs, limit=3):
+    """Return the text report of the attributed import costs."""
+    lines = ['%-40s %8s %8s %8s  %s' % ('module', 'self ms', 'deps ms',
+                                        'total ms', 'heaviest imports')]
+    total = 0
+    for module, cost in sorted(costs.items(), key=lambda item: -(
+            item[1]['self'] + item[1]['deps'])):
+        module_total = cost['self'] + cost['deps']
+        if module != TOP_LEVEL:
+            total += module_total
+        heaviest = sorted(cost['heaviest'].items(), key=lambda item: -item[1])
+        lines.append('%-40s %8.1f %8.1f %8.1f  %s' % (
+            module, cost['self'] / 1000.0, cost['deps'] / 1000.0,
+            module_total / 1000.0,
+            ', '.join('%s (%.1f)' % (name, cumulative_us / 1000.0)
+                      for name, cumulative_us in heaviest[:limit])))
+    lines.append('Total import time caused by escadrille: %.1f ms' %
+                 (total / 1000.0))
+    return '\n'.join(lines)
+
+
+def profile_command(args):
+    """Run escadrille with args under -X importtime.
+
+    Returns the return code and the import time records. The command's own
+    output is passed through.
+    """
+    import subprocess
+    env = dict(os.environ)
+    src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [src_dir] + [path for path in [env.get('PYTHONPATH')] if path])
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', DRIVER] + list(args),
+        env=env, stderr=subprocess.PIPE, universal_newlines=True)
+    lines = process.stderr.splitlines()
+    for line in lines:
+        if not line.startswith(IMPORT_TIME_PREFIX):
+            sys.stderr.write(line + '\n')
+    return process.returncode, parse_importtime(lines)
+
+
+def startup_report(args):
+    """Print the startup import report of escadrille run with args."""
+    args = [arg for arg in args if arg != REPORT_FLAG]
+    returncode, records = profile_command(args)
+    print('\nStartup import report for: escadrille %s' % ' '.join(args))
+    print(format_report(attribute(records)))
+    return returncode
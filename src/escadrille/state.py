@@ -0,0 +1,129 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Layered shared state passed between escadrille tasks.
+
+The engine's state is a stack of immutable layers, newest first. Each layer
+holds the keys one task set and the keys it removed. A task is handed a
+StateView over the current stack which records its own changes without
+copying or modifying the layers below it, so creating a view is O(1) and
+committing the task's results adds a single layer in O(changes).
+"""
+
+from collections.abc import MutableMapping
+
+
+class StateView(MutableMapping):
+    """A task's isolated, writable view of the shared state."""
+
+    def __init__(self, layers=()):
+        """Set up instance vars for a StateView object."""
+        self._layers = layers
+        self.changes = {}
+        self.removed = set()
+
+    def __getitem__(self, key):
+        """Return the newest value for key."""
+        if key in self.changes:
+            return self.changes[key]
+        if key in self.removed:
+            raise KeyError(key)
+        for values, removed in self._layers:
+            if key in values:
+                return values[key]
+            if key in removed:
+                break
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        """Record a new value for key in the view."""
+        self.changes[key] = value
+        self.removed.discard(key)
+
+    def __delitem__(self, key):
+        """Record the removal of key from the view."""
+        if key not in self:
+            raise KeyError(key)
+        self.changes.pop(key, None)
+        self.removed.add(key)
+
+    def __iter__(self):
+        """Iterate over the keys visible in the view."""
+        seen = set(self.removed)
+        for key in self.changes:
+            seen.add(key)
+            yield key
+        for values, removed in self._layers:
+            for key in values:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+            seen.update(removed)
+
+    def __len__(self):
+        """Return the number of keys visible in the view."""
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        """Represent the view as the plain dict it stands in for."""
+        return repr(dict(self))
+
+    def copy(self):
+        """Return a flat dict copy of the view."""
+        return dict(self)
+
+    def replace(self, new_state):
+        """Record the differences between the view and a plain mapping.
+
+        Supports tasks that return a new mapping rather than the view they
+        were given. Unlike changes made through the view this is O(size).
+        """
+        for key, value in new_state.items():
+            if key not in self or self[key] is not value:
+                self[key] = value
+        for key in [key for key in self if key not in new_state]:
+            del self[key]
+
+
+class SharedState(object):
+    """The engine's stack of state layers committed by finished tasks."""
+
+    # flatten the stack once lookups have to walk this many layers
+    compact_limit = 32
+
+    def __init__(self, initial=None):
+        """Set up instance vars for a SharedState object."""
+        self.layers = ()
+        if initial:
+            self.layers = ((dict(initial), frozenset()),)
+
+    def view(self):
+        """Return a new view of the current state for a task."""
+        return StateView(self.layers)
+
+    def commit(self, view, new_state=None):
+        """Add the changes a task made to its view as a new layer.
+
+        The new_state is the task's return value. Following the original
+        engine behaviour a task returning None leaves the state untouched.
+        """
+        if new_state is None:
+            return
+        if new_state is not view:
+            view.replace(new_state)
+        if not view.changes and not view.removed:
+            return
+        layer = (dict(view.changes), frozenset(view.removed))
+        self.layers = (layer,) + self.layers
+        if len(self.layers) > self.compact_limit:
+            self.layers = ((dict(self.view()), frozenset()),)
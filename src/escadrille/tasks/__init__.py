@@ -15,17 +15,33 @@
 
 Rather than hardcoding the list of available Tasks, the find_tasks method
 provides a mechanism for searching the tasks package for appropriate task
-objects.
+objects. The results are cached in a manifest and tasks are only imported
+when used (see ``escadrille.tasks.registry``).
 """
 import os
 
+from escadrille.trace import span
+
 from . import core
+from .registry import MANIFEST_NAME
+from .registry import TaskManifest
+from .registry import TaskRegistry
 
 
 TASK_PATH, _ = os.path.split(core.__file__)
 TASK_PREFIX = core.__package__ + '.'
 
 
-def load_tasks():
-    """Wrap tasks.core.find_tasks with the required arguments."""
-    return core.find_tasks(TASK_PATH, TASK_PREFIX)
+def load_tasks(cache_dir=None):
+    """Return a lazy registry of the built-in and plugin tasks.
+
+    The manifest of built-in tasks is cached in cache_dir when it is given.
+    Built-in tasks take precedence over plugin tasks of the same name.
+    """
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(os.path.abspath(os.path.expanduser(
+            cache_dir)), MANIFEST_NAME)
+    with span('load tasks'):
+        manifest = TaskManifest(TASK_PATH, TASK_PREFIX, cache_file)
+        return TaskRegistry(manifest.locations(), manifest.plugin_locations)
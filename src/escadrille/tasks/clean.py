@@ -24,18 +24,21 @@ class CleanTask(GeneralDirsOpt, OtherDirsOpt, Task):
     """Clean out directories as needed."""
 
     config_name = 'clean'
+    requires = []
+    provides = ['clean']
 
-    def _remove(self, path):
+    async def _remove(self, path):
         """Remove a path."""
+        from escadrille.aio import check_call
         self.vprint('%sremoving %s' % (self.indent, path))
         try:
-            subprocess.check_call(['rm', '-r', '-f', path])
+            await check_call(['rm', '-r', '-f', path])
         except subprocess.CalledProcessError:
             err = '%sfailed to remove %s' % (self.indent, path)
             self.vprint(err)
             self.warnings.append(err)
 
-    def __call__(self, *args, **kwargs):
+    async def __call__(self, *args, **kwargs):
         """Execute the Clean Task."""
         print('Starting Clean Task.')
         super().__call__(*args, **kwargs)
@@ -43,9 +46,9 @@ class CleanTask(GeneralDirsOpt, OtherDirsOpt, Task):
             dirs = [self.config_file.output_dir, self.config_file.staging_dir,
                     self.config_file.tmp_dir]
             for path in dirs:
-                self._remove(path)
+                await self._remove(path)
         for path in self.other_dirs:
-            self._remove(path)
+            await self._remove(path)
         self._set_status()
 
     def _get_option_snippet(self):
@@ -14,9 +14,9 @@
 """Copy Files Task."""
 
 import os
-import subprocess
 import glob
-import shlex
+
+from escadrille.trace import async_span
 
 from .core import Task
 
@@ -50,16 +50,20 @@ class CopyFilesTask(Task):
     """
 
     config_name = 'copy_files'
+    requires = ['dirs']
+    provides = ['staging']
+    cacheable = True
 
     def __init__(self, *args, **kwargs):
         """Set up defaults for Copy Files Task instances."""
         self.jobs = []
         super().__init__(*args, **kwargs)
 
-    def __call__(self, *args, **kwargs):
+    async def __call__(self, *args, **kwargs):
         """Execute the Copy Files Task."""
         print('Starting Copy Files Task')
         super().__call__(*args, **kwargs)
+        from escadrille.aio import check_call
         self.dprint('%d copy jobs loaded from config file.' % len(self.jobs))
         for index, job in enumerate(self.jobs, 1):
             self.vprint('%s(%d/%d) %s' %
@@ -69,27 +73,65 @@ class CopyFilesTask(Task):
                 os.makedirs(destination)
             for source_dir in job.sources:
                 source_dir = os.path.abspath(os.path.expanduser(source_dir))
-                source_paths = [shlex.quote(path) for path in
-                                glob.glob(source_dir, recursive=True)]
+                source_paths = self.expand_source(source_dir)
                 if not source_paths:
                     self.vprint('%sno files to copy at "%s"' %
                                 (self.indent * 2, source_dir))
                     continue
                 self.vprint('%scopying "%s"...' % (self.indent * 2,
                                                    source_dir))
-                subprocess.check_call(
-                    ' '.join(['rsync', '-Pa', '--ignore-existing',
-                              '--cvs-exclude', *source_paths, destination]),
-                    shell=True)
+                # in order, as the first source copied to a path is kept
+                with async_span('rsync %s' % source_dir,
+                                category='copy_files'):
+                    await check_call(['rsync', '-Pa', '--ignore-existing',
+                                      '--cvs-exclude', *source_paths,
+                                      destination])
         self._set_status()
 
+    @staticmethod
+    def expand_source(source):
+        """Return the paths matched by a source glob pattern."""
+        return glob.glob(source, recursive=True)
+
+    def input_paths(self):
+        """Return the source files and directories of every job."""
+        paths = []
+        for job in self.jobs:
+            for source in job.sources:
+                paths.extend(self.expand_source(self.sanitize_path(source)))
+        return paths
+
+    def watch_paths(self):
+        """Return the source paths up to the first glob pattern component."""
+        paths = []
+        for job in self.jobs:
+            for source in job.sources:
+                parts = self.sanitize_path(source).split(os.sep)
+                for index, part in enumerate(parts):
+                    if any(char in part for char in '*?['):
+                        parts = parts[:index]
+                        break
+                paths.append(os.sep.join(parts) or os.sep)
+        return paths
+
+    def output_paths(self):
+        """Return the paths the sources of every job are copied to."""
+        paths = []
+        for job in self.jobs:
+            destination = self.sanitize_path(job.destination)
+            for source in job.sources:
+                for path in self.expand_source(self.sanitize_path(source)):
+                    path = path.rstrip('/')
+                    paths.append(os.path.join(destination,
+                                              os.path.basename(path)))
+        return paths
+
     def _load_config(self):
         """Generate a map of files and destinations for the Copy Files Task."""
         super()._load_config()
         jobs, src_suffix, dest_suffix = {}, '_src', '_dst'
         options = []
-        if (self.config_file.parser and
-                self.config_file.has_section(self.tag)):
+        if self.config_file.has_section(self.tag):
             options = self.config_file.section(self.tag).keys()
         for option in options:
             parts = option.split('_')
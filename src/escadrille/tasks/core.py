@@ -13,23 +13,25 @@
 # limitations under the License.
 """Tasks core library."""
 
-import pkgutil
+import importlib
 import inspect
 import os.path
 
+from escadrille.trace import span
 from escadrille.verbosity import dprint
 from escadrille.verbosity import vprint
 
 
 def find_tasks(module, prefix):
     """Return an enum of config file tasks mapping names to task callables."""
+    import pkgutil
     dprint('lib.tasks.core: finding tasks in %s (prefix: %s)' %
            (module, prefix))
     task_map = {}
-    for importer, modname, ispkg in pkgutil.walk_packages([module], prefix):
+    for _, modname, ispkg in pkgutil.walk_packages([module], prefix):
         if ispkg:
             continue
-        module = importer.find_module(modname).load_module(modname)
+        module = importlib.import_module(modname)
         for _, cls in inspect.getmembers(module, inspect.isclass):
             if issubclass(cls, Task) and cls != Task:
                 task_map[cls.config_name] = cls
@@ -59,7 +61,8 @@ class TaskCore(object):
         """A method to be subclassed to load info from the config file."""
         if not self.loaded:
             self.dprint('Loading the config for %s.' % self.tag)
-            self._load_config()
+            with span('%s load_config' % self.tag, category='task'):
+                self._load_config()
         self.loaded = True
 
     def _load_config(self):
@@ -111,14 +114,71 @@ class Task(TaskCore):
     The call method clears the "warnings", "errors" and "status" attributes
     before starting the task and then can use the "_set_status" method to
     update the status appropriately at the end of the task.
+
+    The requires and provides attributes declare the names used by the
+    scheduler to order tasks (see ``escadrille.scheduler``). Either can be
+    overridden per task with a space separated list in the task's config
+    section. Leaving them as None makes the task a barrier that runs after
+    every earlier task and before every later task.
+
+    Tasks that set cacheable to True can be skipped by the build cache (see
+    ``escadrille.cache``) when their config, input files and incoming shared
+    state are unchanged. Such tasks must report the files they read and write
+    through the input_paths and output_paths methods.
+
+    The __call__ method of a subclass may be a coroutine ("async def"). The
+    engine then awaits it on its asyncio event loop, which suits tasks that
+    mostly wait on subprocesses (see ``escadrille.aio``). Such a subclass
+    still calls the base class __call__ method, which is synchronous.
     """
 
+    requires = None
+    requires_key = 'requires'
+    provides = None
+    provides_key = 'provides'
+    edge_keys = [requires_key, provides_key]
+    cacheable = False
+
     def __call__(self, *args, **kwargs):
         """Execute the core task behaviour."""
         self._clear_status()
         self.load_config()
         self.dprint(self.debug_msg())
 
+    def is_async(self):
+        """Return True if the task's __call__ method is a coroutine."""
+        return inspect.iscoroutinefunction(self.__call__)
+
+    def _get_edges(self, key, default):
+        """Return a list of names for the given edge option."""
+        value = None
+        if self.config_file is not None:
+            value = self.config_file.get(self.tag, key)
+        if value is None:
+            return None if default is None else list(default)
+        return [name for name in value.split(self.config_file.list_sep)
+                if name != '']
+
+    def get_requires(self):
+        """Return the list of names this task requires, or None."""
+        return self._get_edges(self.requires_key, self.requires)
+
+    def get_provides(self):
+        """Return the list of names this task provides, or None."""
+        return self._get_edges(self.provides_key, self.provides)
+
+    def input_paths(self):
+        """Return the files and directories the task reads."""
+        return []
+
+    def output_paths(self):
+        """Return the files and directories the task writes."""
+        return []
+
+    def watch_paths(self):
+        """Return the files and directories watched for rebuilds."""
+        return self.input_paths()
+
     def debug_msg(self):
         """If supported, generate and return a debug string."""
         self.load_config()
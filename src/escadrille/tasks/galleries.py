@@ -11,12 +11,50 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""RST Image Galleries Task."""
+"""RST Image Galleries Task.
 
+With the "thumbs_dir" option set, the task makes the thumbnails of the
+gallery images itself: each gallery's thumbnails are written to
+"<thumbs_dir>/<gallery path>/thumbs/", which should be served at the same
+path as the images. The thumbnails are cached by image content and size in
+the cache_dir and made in worker processes (see ``escadrille.images``).
+
+With the "widths" option set as well, e.g. "300 600 1200", the task makes a
+copy of each image scaled down to each width instead of thumbnails, written to
+"<thumbs_dir>/<gallery path>/sizes/", and the gallery pages let the browser
+pick one with the "srcset" and "sizes" attributes. The images get width and
+height attributes from the dimensions of the made images so browsers can lay
+out the pages before the images are loaded.
+
+With the "catalog" option set, the images of the galleries are listed from a
+catalog of image metadata in the cache_dir (see ``escadrille.catalog``),
+which only reads new or changed images, instead of from the directory
+listings. The galleries then only list images, the "order" option can sort
+them by capture date and full size images get width and height attributes.
+
+With the "page_size" option set, a gallery is split into pages of that many
+images, "<gallery>.rst", "<gallery>-page-2.rst" and so on, linked to each
+other with pelican "{filename}" links. Each gallery is listed once. Pages
+are written one at a time, but only the catalog streams the images from the
+database as the pages are written. The directory listing is sorted in
+memory. With "thumbs_dir" the listing is kept as well, to make the images
+before the pages.
+
+The pages of different galleries are written by a pool of "writers" threads,
+which overlap the directory listings, stub reads and page writes of slow,
+e.g. network, storage. The pages and their names do not depend on the number
+of writers.
+"""
+
+import itertools
 import os
 from collections import OrderedDict
 
 import escadrille.rst as rst
+from escadrille.catalog import ORDERS
+from escadrille.images import is_image
+from escadrille.images import thumb_name
+from escadrille.trace import span
 from escadrille.verbosity import dprint
 
 from .core import Task
@@ -27,10 +65,39 @@ class GalleriesTask(OutputDirOpt, Task):
     """Make RST source pages for sets of images."""
 
     config_name = 'galleries'
+    requires = ['dirs']
+    provides = ['staging']
+    cacheable = True
     galleries_default = ""
     stubs_key = "stubs"
     stubs_default = {}
     stubs_dir_default = ""
+    thumbs_dir_key = 'thumbs_dir'
+    thumbs_dir_default = ''
+    thumb_size_key = 'thumb_size'
+    thumb_size_default = '300'
+    workers_key = 'workers'
+    workers_default = '1'
+    # space separated widths of the images made for srcset, e.g. "300 600"
+    widths_key = 'widths'
+    widths_default = ''
+    sizes_key = 'sizes'
+    sizes_default = '300px'
+    catalog_key = 'catalog'
+    catalog_default = False
+    # "name" or "date", sorting by capture date needs the catalog
+    order_key = 'order'
+    order_default = 'name'
+    catalog_name = 'catalog.sqlite'
+    # the number of images per page, 0 puts every image on one page
+    page_size_key = 'page_size'
+    page_size_default = '0'
+    media_prefix = '../images'  # TODO: add to config file
+    # number of threads writing gallery pages, 0 uses one per CPU
+    writers_key = 'writers'
+    writers_default = '1'
+    # the directories, in "<thumbs_dir>/<gallery path>/", of the made images
+    made_dirs = ('thumbs', 'sizes')
 
     def __init__(self, *args, **kwargs):
         """Set up defaults for Galleries Task instances."""
@@ -38,6 +105,18 @@ class GalleriesTask(OutputDirOpt, Task):
         self.galleries = self.galleries_default
         self.stubs_dir = self.stubs_dir_default
         self.stubs = self.stubs_default
+        self.thumbs_dir = self.thumbs_dir_default
+        self.thumb_size = int(self.thumb_size_default)
+        self.workers = int(self.workers_default)
+        self.widths = self.parse_widths(self.widths_default)
+        self.sizes = self.sizes_default
+        self.catalog = self.catalog_default
+        self.order = self.order_default
+        self.page_size = int(self.page_size_default)
+        self.writers = int(self.writers_default)
+        self.written = []
+        self.thumbnails = []
+        self.gallery_names = set()
         super().__init__(*args, **kwargs)
 
     def load_stubs(self):
@@ -64,44 +143,156 @@ class GalleriesTask(OutputDirOpt, Task):
         else:
             self.galleries = galleries
         self.load_stubs()
+        thumbs_dir = self.config_file.get(self.tag, self.thumbs_dir_key)
+        self.thumbs_dir = (self.sanitize_path(thumbs_dir) if thumbs_dir
+                           else self.thumbs_dir_default)
+        thumb_size = self.config_file.get(self.tag, self.thumb_size_key)
+        self.thumb_size = int(thumb_size if thumb_size is not None
+                              else self.thumb_size_default)
+        workers = self.config_file.get(self.tag, self.workers_key)
+        self.workers = int(workers if workers is not None
+                           else self.workers_default)
+        if self.workers < 1:
+            self.workers = os.cpu_count() or 1
+        self.widths = self.parse_widths(
+            self.config_file.get(self.tag, self.widths_key) or
+            self.widths_default)
+        self.sizes = (self.config_file.get(self.tag, self.sizes_key) or
+                      self.sizes_default)
+        catalog = self.config_file.getboolean(self.tag, self.catalog_key)
+        self.catalog = self.catalog_default if catalog is None else catalog
+        self.order = (self.config_file.get(self.tag, self.order_key) or
+                      self.order_default)
+        if self.order not in ORDERS:
+            raise ValueError('Unknown galleries order: %s' % self.order)
+        if self.order != 'name':
+            self.catalog = True
+        page_size = self.config_file.get(self.tag, self.page_size_key)
+        self.page_size = int(page_size if page_size is not None
+                             else self.page_size_default)
+        writers = self.config_file.get(self.tag, self.writers_key)
+        self.writers = int(writers if writers is not None
+                           else self.writers_default)
+        if self.writers < 1:
+            self.writers = os.cpu_count() or 1
+
+    @staticmethod
+    def parse_widths(widths):
+        """Return the sorted list of the widths in a space separated string."""
+        return sorted(set(int(width) for width in widths.split()))
 
-    def write_content(self, fout, title, path, fnames, thumbs=False):
-        """Write the actual image content for the gallery pages."""
+    @staticmethod
+    def variant_name(fname, width):
+        """Return the path of an image's variant in a gallery directory."""
+        stem, extension = os.path.splitext(fname)
+        return os.path.join('sizes', '%s-%d%s' % (stem, width, extension))
+
+    def variants(self, image, dimensions):
+        """Return the (name, width, height) of the variants of an image.
+
+        The variants are sorted by width, those made no wider than a smaller
+        one, from an image narrower than the widths, are left out.
+        """
+        variants = []
+        for width in self.widths:
+            name = self.variant_name(image, width)
+            if name not in dimensions:
+                continue
+            size = dimensions[name]
+            if not variants or size[0] > variants[-1][1]:
+                variants.append((name, size[0], size[1]))
+        return variants
+
+    def write_content(self, fout, title, path, fnames, thumbs=False,
+                      dimensions=None):
+        """Write the actual image content for the gallery pages.
+
+        The dimensions map the images and the made images, by path in the
+        gallery directory, to their (width, height).
+        """
+        dimensions = dimensions or {}
         for image in fnames:
             image_path = os.path.join(path, image)
-            if thumbs:
-                thumb_path = os.path.join(path, 'thumbs', image)
-                if (thumb_path.endswith('jpg') or
-                        thumb_path.endswith('JPG')):
-                    thumb_path = thumb_path[:-3] + 'png'
+            variants = self.variants(image, dimensions)
+            if variants:
+                srcset = ', '.join('%s %dw' % (os.path.join(path, name), width)
+                                   for name, width, _ in variants)
+                name, width, height = variants[0]
                 fout.write('    <a href="%s" data-lightbox="%s">'
-                           '<img src="%s"/></a>\n' %
-                           (image_path, title, thumb_path))
+                           '<img src="%s" srcset="%s" sizes="%s" '
+                           'width="%d" height="%d"/></a>\n' %
+                           (image_path, title, os.path.join(path, name),
+                            srcset, self.sizes, width, height))
+            elif thumbs:
+                name = os.path.join('thumbs', thumb_name(image))
+                size = ''
+                if name in dimensions:
+                    size = ' width="%d" height="%d"' % tuple(dimensions[name])
+                fout.write('    <a href="%s" data-lightbox="%s">'
+                           '<img src="%s"%s/></a>\n' %
+                           (image_path, title, os.path.join(path, name),
+                            size))
+            elif image in dimensions:
+                fout.write('    <a href="%s" data-lightbox="%s">'
+                           '<img src="%s" style="width: 300px; height: auto" '
+                           'width="%d" height="%d"/></a>\n' %
+                           ((image_path, title, image_path) +
+                            tuple(dimensions[image])))
             else:
                 thumb_path = image_path
                 fout.write('    <a href="%s" data-lightbox="%s">'
                            '<img src="%s" style="width: 300px"/></a>\n' %
                            (image_path, title, thumb_path))
 
-    def write_stubbed_gallery(self, title, path, fnames, thumbs=False):
-        """Write an RST Gallery page using a pre-written stub file."""
-        output_filename = os.path.join(self.output_dir,
-                                       "%s.%s" % (title, self.suffix))
+    def page_name(self, title, page):
+        """Return the name of a gallery's page, numbered after the first."""
+        return title if page == 1 else '%s-page-%d' % (title, page)
+
+    def write_navigation(self, fout, title, page, more=False):
+        """Write the links to the previous and next pages of a gallery."""
+        if page == 1 and not more:
+            return
+        fout.write('\n\n.. raw:: html\n\n    <nav class="gallery-pages">\n')
+        if page > 1:
+            fout.write('    <a href="{filename}%s.%s" rel="prev">Previous</a>'
+                       '\n' % (self.page_name(title, page - 1), self.suffix))
+        if more:
+            fout.write('    <a href="{filename}%s.%s" rel="next">Next</a>\n' %
+                       (self.page_name(title, page + 1), self.suffix))
+        fout.write('    </nav>\n')
+
+    def write_stubbed_gallery(self, title, path, fnames, thumbs=False,
+                              dimensions=None, page=1, more=False):
+        """Write an RST Gallery page using a pre-written stub file.
+
+        Returns the path of the written page.
+        """
+        output_filename = os.path.join(self.output_dir, "%s.%s" % (
+            self.page_name(title, page), self.suffix))
         self.dprint('  writing stubbed gallery: %s' % output_filename)
         with open(output_filename, 'w') as fout:
             with open(self.stubs[title], 'r') as stub_in:
                 fout.write(stub_in.read())
             fout.write('\n.. raw:: html\n\n    <div class="gallery">\n\n')
-            self.write_content(fout, title, path, fnames, thumbs)
+            self.write_content(fout, title, path, fnames, thumbs,
+                               dimensions)
             fout.write('\n.. raw:: html\n\n    </div>')
+            self.write_navigation(fout, title, page, more)
+        return output_filename
 
-    def write_generated_gallery(self, title, path, fnames, thumbs=False):
-        """Write an RST Gallery page from scratch using fallback metadata."""
-        output_filename = os.path.join(self.output_dir,
-                                       "%s.%s" % (title, self.suffix))
+    def write_generated_gallery(self, title, path, fnames, thumbs=False,
+                                dimensions=None, page=1, more=False):
+        """Write an RST Gallery page from scratch using fallback metadata.
+
+        Returns the path of the written page.
+        """
+        output_filename = os.path.join(self.output_dir, "%s.%s" % (
+            self.page_name(title, page), self.suffix))
         self.dprint('  writing generated gallery: %s' % output_filename)
         with open(output_filename, 'w') as fout:
-            fout.write(rst.title(title, underline_char=rst.SECTION_LEVELS[0],
+            heading = title if page == 1 else '%s (%d)' % (title, page)
+            fout.write(rst.title(heading,
+                                 underline_char=rst.SECTION_LEVELS[0],
                                  top_line=True))
             # TODO: add fallback metadata to config file
             metadata = OrderedDict()
@@ -111,44 +302,287 @@ class GalleriesTask(OutputDirOpt, Task):
             metadata['summary'] = ''
             fout.write(rst.metadata(metadata))
             fout.write('\n.. raw:: html\n\n    <div class="gallery">\n\n')
-            self.write_content(fout, title, path, fnames, thumbs)
+            self.write_content(fout, title, path, fnames, thumbs,
+                               dimensions)
             fout.write('\n.. raw:: html\n\n    </div>')
+            self.write_navigation(fout, title, page, more)
+        return output_filename
 
     def __call__(self, *args, **kwargs):
         """Execute the Galleries Task."""
         print('Starting Galleries Task.')
         super().__call__(*args, **kwargs)
+        self.written = []
+        self.thumbnails = []
+        galleries = self.find_galleries()
+        self.gallery_names = set(gallery[0] for gallery in galleries)
+        jobs, hashes, made, listings = [], {}, {}, {}
+        if self.thumbs_dir:
+            # the images are made before the pages, which use the listings
+            for _, dirpath, relative_path, _, _ in galleries:
+                listings[dirpath] = list(self.gallery_images(dirpath))
+                for fname, _, digest in listings[dirpath]:
+                    if digest is not None:
+                        hashes[os.path.join(dirpath, fname)] = digest
+                jobs.extend(self.image_jobs(
+                    dirpath, relative_path,
+                    [fname for fname, _, _ in listings[dirpath]]))
+        if jobs:
+            made = self.make_gallery_images(jobs, hashes)
+        if self.writers > 1 and len(galleries) > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            self.vprint('%swriting %d galleries with %d threads' %
+                        (self.indent, len(galleries), self.writers))
+            with ThreadPoolExecutor(max_workers=self.writers) as executor:
+                written = list(executor.map(
+                    lambda gallery: self.write_gallery(
+                        gallery, made, listings.pop(gallery[1], None)),
+                    galleries))
+        else:
+            written = [self.write_gallery(gallery, made,
+                                          listings.pop(gallery[1], None))
+                       for gallery in galleries]
+        # in the order of the galleries, whatever order they were written in
+        self.written = [path for paths in written for path in paths]
+        self._set_status()
+
+    def find_galleries(self):
+        """Return the galleries in the galleries directory.
+
+        Each gallery is a tuple of its name, directory, path relative to the
+        galleries directory, number of files and whether it has thumbnails.
+        """
+        galleries = []
         tmp = self.galleries
         self.galleries = tmp if tmp.endswith('/') else tmp + '/'
+        if self.catalog:
+            return self.catalog_galleries()
         for dirpath, dirnames, fnames in os.walk(self.galleries):
             dprint('GALLERY DIRPATH=%s' % dirpath)
-            if dirpath.endswith('thumbs') or dirpath.endswith('thumbs/'):
+            if self.skip_dir(dirpath):
                 continue
             common_prefix = os.path.commonprefix([dirpath, self.galleries])
             relative_path = dirpath[len(common_prefix):]
             if relative_path == "":
                 continue
             name = relative_path.replace('/', '-')
-            media_prefix = '../images'  # TODO: add to config file
             thumbs = False
-            if "thumbs" in dirnames:
+            if "thumbs" in dirnames or self.thumbs_dir:
                 thumbs = True
             cwd = '.'
             if cwd in fnames:
                 fnames.remove(cwd)
-            fnames.sort()
-            path = os.path.join(media_prefix, relative_path)
-            image_count = len(fnames)
-            if image_count == 0:
+            if len(fnames) == 0:
                 self.vprint('Skipping %s, no images.' % name)
                 continue
             self.vprint('Creating gallery: %s.%s - %s images' %
                         (name, self.suffix, len(fnames)))
-            if name in self.stubs:
-                self.write_stubbed_gallery(name, path, fnames, thumbs)
-            else:
-                self.write_generated_gallery(name, path, fnames, thumbs)
-        self._set_status()
+            galleries.append((name, dirpath, relative_path, len(fnames),
+                              thumbs))
+        return galleries
+
+    def skip_dir(self, dirpath):
+        """Return True if a directory holds thumbnails or made images.
+
+        Those are the "thumbs" directories, which hold the thumbnails of a
+        gallery, and the directories of the images the task makes, when the
+        thumbs_dir is in the galleries directory. Other directories named
+        like the latter are galleries like any other.
+        """
+        if dirpath.endswith('thumbs') or dirpath.endswith('thumbs/'):
+            return True
+        if not self.thumbs_dir:
+            return False
+        parent, name = os.path.split(os.path.abspath(dirpath))
+        if name not in self.made_dirs:
+            return False
+        relative_path = os.path.relpath(
+            parent, os.path.abspath(os.path.expanduser(self.thumbs_dir)))
+        # the galleries directory itself is not a gallery
+        if (relative_path == os.curdir or
+                relative_path.split(os.sep)[0] == os.pardir):
+            return False
+        return os.path.isdir(os.path.join(os.path.expanduser(
+            self.galleries), relative_path))
+
+    def catalog_galleries(self):
+        """Return the galleries, like find_galleries, from the catalog."""
+        from escadrille.catalog import MediaCatalog
+        galleries = []
+        root = os.path.abspath(os.path.expanduser(self.galleries))
+        with span('scan galleries', category='galleries'):
+            with MediaCatalog(self.catalog_path()) as catalog:
+                read, removed = catalog.scan(root, skip=self.skip_dir)
+                self.vprint('%scatalog: read %d images, removed %d' %
+                            (self.indent, read, removed))
+                for dirpath in catalog.directories(root):
+                    relative_path = os.path.relpath(dirpath, root)
+                    if relative_path == os.curdir:
+                        continue
+                    count = catalog.count(dirpath)
+                    name = relative_path.replace(os.sep, '-')
+                    thumbs = bool(self.thumbs_dir or os.path.isdir(
+                        os.path.join(dirpath, 'thumbs')))
+                    self.vprint('Creating gallery: %s.%s - %s images' %
+                                (name, self.suffix, count))
+                    galleries.append((name, dirpath, relative_path, count,
+                                      thumbs))
+        return galleries
+
+    def gallery_images(self, dirpath):
+        """Yield the file name, (width, height) and hash of each image.
+
+        The images of the gallery are read, in order, from the catalog or
+        from the sorted listing of the gallery directory, which knows
+        neither the dimensions nor the hashes, so they are None. Only the
+        catalog's images are streamed, the directory listing is sorted in
+        memory first.
+        """
+        if self.catalog:
+            from escadrille.catalog import MediaCatalog
+            # read only, as galleries may be listed by several threads
+            with MediaCatalog(self.catalog_path(), read_only=True) as catalog:
+                for record in catalog.iter_images(dirpath, self.order):
+                    yield (record.name, (record.width, record.height)
+                           if record.width else None, record.hash)
+            return
+        with os.scandir(dirpath) as entries:
+            fnames = sorted(entry.name for entry in entries
+                            if not entry.is_dir())
+        for fname in fnames:
+            yield fname, None, None
+
+    def paginate(self, images):
+        """Yield the lists of the images of each page of a gallery."""
+        if self.page_size < 1:
+            yield list(images)
+            return
+        images = iter(images)
+        page = list(itertools.islice(images, self.page_size))
+        while page:
+            yield page
+            page = list(itertools.islice(images, self.page_size))
+
+    def made_dimensions(self, relative_path, fnames, made):
+        """Return the dimensions of the images made for a gallery's images.
+
+        The made map is the map of made image path to (width, height) and
+        the returned map is keyed by path in the gallery directory.
+        """
+        dimensions = {}
+        if not made:
+            return dimensions
+        made_path = os.path.join(self.thumbs_dir, relative_path)
+        for fname in fnames:
+            names = [os.path.join('thumbs', thumb_name(fname))]
+            names.extend(self.variant_name(fname, width)
+                         for width in self.widths)
+            for name in names:
+                size = made.get(os.path.join(made_path, name))
+                if size is not None:
+                    dimensions[name] = size
+        return dimensions
+
+    def write_gallery(self, gallery, made, images=None):
+        """Write the pages of a gallery, reading its images as it goes.
+
+        The images are the gallery's listing when it was listed already,
+        otherwise it is listed now. The pages left from earlier runs after
+        the last page are removed. Returns the paths of the written pages.
+        Galleries are written in parallel threads when there are several
+        writers.
+        """
+        name, dirpath, relative_path, count, thumbs = gallery
+        path = os.path.join(self.media_prefix, relative_path)
+        if images is None:
+            images = self.gallery_images(dirpath)
+        pages = self.paginate(images)
+        written = []
+        with span('gallery %s' % name, category='galleries', images=count):
+            page, images = 1, next(pages, None)
+            while images is not None:
+                following = next(pages, None)
+                fnames = [fname for fname, _, _ in images]
+                dimensions = {fname: size for fname, size, _ in images
+                              if size}
+                dimensions.update(self.made_dimensions(relative_path, fnames,
+                                                       made))
+                if page == 1 and name in self.stubs:
+                    write = self.write_stubbed_gallery
+                else:
+                    write = self.write_generated_gallery
+                written.append(write(name, path, fnames, thumbs, dimensions,
+                                     page, following is not None))
+                page, images = page + 1, following
+            self.remove_pages(name, page)
+        return written
+
+    def remove_pages(self, title, page):
+        """Remove the pages of a gallery from the given page number on.
+
+        Pages are numbered without gaps, so the first missing page ends the
+        removal, as does a page named like another gallery.
+        """
+        while self.page_name(title, page) not in self.gallery_names:
+            output_filename = os.path.join(self.output_dir, "%s.%s" % (
+                self.page_name(title, page), self.suffix))
+            if not os.path.exists(output_filename):
+                break
+            self.dprint('  removing stale gallery page: %s' % output_filename)
+            os.remove(output_filename)
+            page += 1
+
+    def image_jobs(self, dirpath, relative_path, fnames):
+        """Return the (source, dest, params) jobs of a gallery's images.
+
+        The images are the variants of each width when there are widths and
+        the thumbnails otherwise.
+        """
+        made_path = os.path.join(self.thumbs_dir, relative_path)
+        sources = [fname for fname in fnames if is_image(fname)]
+        if self.widths:
+            return [(os.path.join(dirpath, fname),
+                     os.path.join(made_path, self.variant_name(fname, width)),
+                     {'width': width})
+                    for fname in sources for width in self.widths]
+        params = {'width': self.thumb_size, 'height': self.thumb_size}
+        return [(os.path.join(dirpath, fname),
+                 os.path.join(made_path, 'thumbs', thumb_name(fname)), params)
+                for fname in sources]
+
+    def make_gallery_images(self, jobs, hashes=None):
+        """Make the images that are not cached already.
+
+        The hashes are the known content hashes of the sources, from the
+        catalog. Returns the map of each made image to its (width, height).
+        """
+        from escadrille.images import ImageCache
+        from escadrille.images import make_images
+        cache = ImageCache(self.image_cache_dir())
+        resized, errors, made = make_images(cache, jobs, self.workers,
+                                            hashes=hashes)
+        self.vprint('%sresized %d of %d images' %
+                    (self.indent, resized, len(jobs)))
+        self.errors.extend(errors)
+        self.thumbnails = [dest for _, dest, _ in jobs]
+        return made
+
+    def image_cache_dir(self):
+        """Return the directory of the image cache and catalog."""
+        return os.path.join(os.path.abspath(os.path.expanduser(
+            self.config_file.cache_dir)), 'images')
+
+    def catalog_path(self):
+        """Return the path of the image catalog."""
+        return os.path.join(self.image_cache_dir(), self.catalog_name)
+
+    def input_paths(self):
+        """Return the gallery and stub directories read by the task."""
+        return [path for path in [self.galleries, self.stubs_dir] if path]
+
+    def output_paths(self):
+        """Return the gallery pages and thumbnails written by the task."""
+        return list(self.written) + list(self.thumbnails)
 
     def debug_msg(self):
         """Return some debug outut about the current state of the task."""
@@ -158,6 +592,22 @@ class GalleriesTask(OutputDirOpt, Task):
                                     self.galleries)
         msg += self.msg_template % (self.indent, self.stubs_key, self.stubs)
         msg += "%sstubs_dir: %s\n" % (self.indent, self.stubs_dir)
+        msg += self.msg_template % (self.indent, self.thumbs_dir_key,
+                                    self.thumbs_dir)
+        msg += self.msg_template % (self.indent, self.thumb_size_key,
+                                    self.thumb_size)
+        msg += self.msg_template % (self.indent, self.workers_key,
+                                    self.workers)
+        msg += self.msg_template % (self.indent, self.widths_key,
+                                    ' '.join(str(w) for w in self.widths))
+        msg += self.msg_template % (self.indent, self.sizes_key, self.sizes)
+        msg += self.msg_template % (self.indent, self.catalog_key,
+                                    self.catalog)
+        msg += self.msg_template % (self.indent, self.order_key, self.order)
+        msg += self.msg_template % (self.indent, self.page_size_key,
+                                    self.page_size)
+        msg += self.msg_template % (self.indent, self.writers_key,
+                                    self.writers)
         return msg
 
     @property
@@ -170,4 +620,22 @@ class GalleriesTask(OutputDirOpt, Task):
                                        self.galleries_default)
         config += self.msg_template % (self.indent, self.stubs_key,
                                        self.stubs_dir_default)
+        config += self.msg_template % (self.indent, self.thumbs_dir_key,
+                                       self.thumbs_dir_default)
+        config += self.msg_template % (self.indent, self.thumb_size_key,
+                                       self.thumb_size_default)
+        config += self.msg_template % (self.indent, self.workers_key,
+                                       self.workers_default)
+        config += self.msg_template % (self.indent, self.widths_key,
+                                       self.widths_default)
+        config += self.msg_template % (self.indent, self.sizes_key,
+                                       self.sizes_default)
+        config += self.msg_template % (self.indent, self.catalog_key,
+                                       self.catalog_default)
+        config += self.msg_template % (self.indent, self.order_key,
+                                       self.order_default)
+        config += self.msg_template % (self.indent, self.page_size_key,
+                                       self.page_size_default)
+        config += self.msg_template % (self.indent, self.writers_key,
+                                       self.writers_default)
         return config
@@ -14,12 +14,14 @@
 """Git Log Pages Task."""
 
 import os
+import re
 import time
-import subprocess
 from collections import OrderedDict
 
 import escadrille.rst as rst
 
+from escadrille.trace import async_span
+
 from .core import Task
 from .options import OutputDirOpt
 
@@ -28,6 +30,9 @@ class GitLogPagesTask(OutputDirOpt, Task):
     """Make RST source pages out of Git Repository Logs."""
 
     config_name = 'git_log_pages'
+    requires = ['dirs']
+    provides = ['staging']
+    cacheable = True
     repos_default = {}
 
     def __init__(self, *args, **kwargs):
@@ -38,27 +43,34 @@ class GitLogPagesTask(OutputDirOpt, Task):
     def _load_config(self):
         """Load task options from the config file."""
         super()._load_config()
-        self.repos = self.repos_default
+        self.repos = dict(self.repos_default)
         for option in self.config_file.section(self.tag):
             self.dprint('Loading option %s' % option)
             if option in [OutputDirOpt.output_dir_key, 'task']:
                 continue
+            if option in self.edge_keys:
+                continue
             self.repos[option] = os.path.abspath(os.path.expanduser(
                 self.config_file.get(self.tag, option)))
 
-    def read_git_log(self, path):
+    # strip email addresses from the log
+    email_pattern = re.compile('<.*>')
+
+    async def read_git_log(self, path):
         """Return a string representing git log output.
 
         Ensure that the log is RST compatible by using the "raw" directive to
         force the log to be preformatted text.
         """
+        from escadrille.aio import getoutput
         log = "::\n\n"
-        command = "git -C %s log --decorate=no | sed 's/<.*>//g'" % path
-        output = subprocess.getoutput(command).replace('\n', '\n    ')
-        log += '    ' + output
+        output = await getoutput(['git', '-C', path, 'log', '--decorate=no'])
+        output = '\n'.join(self.email_pattern.sub('', line)
+                           for line in output.split('\n'))
+        log += '    ' + output.replace('\n', '\n    ')
         return log + "\n\n[End of log]"
 
-    def construct_log_page(self, path, title):
+    async def construct_log_page(self, path, title):
         """Build an write a log page with the given options.
 
         Path is the path to the repository that the log will be created from.
@@ -71,27 +83,51 @@ class GitLogPagesTask(OutputDirOpt, Task):
         metavars['summary'] = ("A log of activity from the %s repository." %
                                title.lower())
         page += rst.metadata(metavars) + rst.HORIZONTAL_RULE
-        return page + self.read_git_log(path)
+        return page + await self.read_git_log(path)
 
     def write_log_page(self, page, output_filename):
         """Write a page stringe to a file."""
         with open(output_filename, 'w') as fout:
             fout.write(page)
 
-    def __call__(self, *args, **kwargs):
-        """Execute the Git Log Pages Task."""
+    def output_filename(self, repo):
+        """Return the path of the log page for a repository."""
+        # TODO: add filename suffix to config file
+        return os.path.join(self.output_dir, "%s_log.rst" % repo)
+
+    def input_paths(self):
+        """Return the git refs that determine each repository's log."""
+        paths = []
+        for repo_path in self.repos.values():
+            git_dir = os.path.join(repo_path, '.git')
+            paths.extend(os.path.join(git_dir, name)
+                         for name in ['HEAD', 'refs', 'packed-refs'])
+        return paths
+
+    def output_paths(self):
+        """Return the log pages written by the task."""
+        return [self.output_filename(repo) for repo in self.repos]
+
+    async def write_repo_log(self, repo):
+        """Construct and write the log page of one repository."""
+        output_filename = self.output_filename(repo)
+        title = "%s log" % repo.title()
+        self.vprint('Writing Log File %s: %s' % (title, output_filename))
+        with async_span('git log %s' % repo, category='git_log_pages'):
+            page = await self.construct_log_page(self.repos[repo], title)
+            self.write_log_page(page, output_filename)
+
+    async def __call__(self, *args, **kwargs):
+        """Execute the Git Log Pages Task.
+
+        The git processes of all the repositories run concurrently.
+        """
         print('Starting Git Log Pages Task.')
         super().__call__(*args, **kwargs)
-        for repo in self.repos:
-            if repo == OutputDirOpt.output_dir_key:
-                continue
-            # TODO: add filename suffix to config file
-            output_filename = os.path.join(self.output_dir, "%s_log.rst" %
-                                           repo)
-            title = "%s log" % repo.title()
-            self.vprint('Writing Log File %s: %s' % (title, output_filename))
-            page = self.construct_log_page(self.repos[repo], title)
-            self.write_log_page(page, output_filename)
+        import asyncio
+        await asyncio.gather(*[self.write_repo_log(repo)
+                               for repo in self.repos
+                               if repo != OutputDirOpt.output_dir_key])
         self._set_status()
 
     def debug_msg(self):
@@ -24,6 +24,8 @@ class MakeDirsTask(GeneralDirsOpt, OtherDirsOpt, Task):
     """Create any directories that may be needed by the escadrille run."""
 
     config_name = 'make_dirs'
+    requires = ['clean']
+    provides = ['dirs']
 
     def _make_dir(self, path):
         """Make a directory."""
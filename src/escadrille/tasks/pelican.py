@@ -11,18 +11,32 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Pelican Task."""
+"""Pelican Task.
 
-import subprocess
+When the "dtrees" shared state of the rst2dtree task is available, and pelican
+is installed for the same python as escadrille, pelican is run with the
+``escadrille.pelican_reader`` plugin so that it renders the doctrees instead
+of parsing the RST sources again.
+"""
+
+import os
+import shlex
+import sys
 
 from .core import Task
 from .options import OutputDirOpt
 
+# pelican setting and environment variable with the path of the doctree index
+DOCTREES_SETTING = 'ESCADRILLE_DOCTREES'
+
 
 class PelicanTask(OutputDirOpt, Task):
     """Run pelican using the options in the escadrille configuration file."""
 
     config_name = 'pelican'
+    requires = ['staging', 'dtrees']
+    provides = ['site']
+    cacheable = True
     output_dir_default = ''
     input_dir_key = 'input_dir'
     input_dir_default = ''
@@ -32,6 +46,10 @@ class PelicanTask(OutputDirOpt, Task):
     theme_dir_default = ''
     pelican_options_key = 'pelican_options'
     pelican_options_default = '-D'
+    doctrees_key = 'doctrees'
+    doctrees_default = True
+    dtree_key = 'dtrees'
+    reader_module = 'escadrille.pelican_reader'
 
     def __init__(self, *args, **kwargs):
         """Setup default values for Pelican Task instances."""
@@ -39,6 +57,7 @@ class PelicanTask(OutputDirOpt, Task):
         self.pelican_config = self.pelican_config_default
         self.theme_dir = self.theme_dir_default
         self.pelican_options = self.pelican_options_default
+        self.doctrees = self.doctrees_default
         super().__init__(*args, **kwargs)
 
     def _load_config(self):
@@ -57,19 +76,75 @@ class PelicanTask(OutputDirOpt, Task):
                                                self.pelican_options_key)
         if pelican_options is not None:
             self.pelican_options = pelican_options
+        doctrees = self.config_file.getboolean(self.tag, self.doctrees_key)
+        self.doctrees = (self.doctrees_default if doctrees is None
+                         else doctrees)
         super()._load_config()
 
-    def __call__(self, *args, **kwargs):
+    async def __call__(self, *args, **kwargs):
         """Execute the Pelican Task."""
         print('Starting Pelican Task.')
         super().__call__(*args, **kwargs)
-        command = "pelican %s -o %s -s %s -t %s %s" % (
-            self.input_dir, self.output_dir, self.pelican_config,
-            self.theme_dir, self.pelican_options)
-        subprocess.check_call(command, shell=True)
-        self.vprint('command: %s' % command)
+        from escadrille.aio import check_call
+        command, env = self.command()
+        await check_call(command, env=env)
+        self.vprint('command: %s' % ' '.join(map(shlex.quote, command)))
         self._set_status()
 
+    def command(self):
+        """Return the pelican command and its environment.
+
+        The environment is None when the command runs in the environment of
+        escadrille.
+        """
+        arguments = ([self.input_dir, '-o', self.output_dir,
+                      '-s', self.pelican_config, '-t', self.theme_dir] +
+                     shlex.split(self.pelican_options))
+        dtrees = self.shared_state.get(self.dtree_key)
+        if not (self.doctrees and dtrees and self.pelican_importable()):
+            return ['pelican'] + arguments, None
+        from escadrille.doctrees import DoctreeHandle
+        index = {os.path.realpath(handle.source): handle
+                 for handle in dtrees.values()
+                 if isinstance(handle, DoctreeHandle)}
+        self.vprint('%susing %d doctrees' % (self.indent, len(index)))
+        env = dict(os.environ)
+        env[DOCTREES_SETTING] = self.write_index(index)
+        src_dir = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env['PYTHONPATH'] = os.pathsep.join(
+            [src_dir] + [path for path in [env.get('PYTHONPATH')] if path])
+        return [sys.executable, '-m', self.reader_module] + arguments, env
+
+    @staticmethod
+    def pelican_importable():
+        """Return True if pelican can be imported by this python."""
+        import importlib.util
+        return importlib.util.find_spec('pelican') is not None
+
+    def index_path(self):
+        """Return the path of the doctree index for the reader plugin."""
+        return os.path.join(self.config_file.tmp_dir,
+                            '%s.doctrees.pkl' % self.tag)
+
+    def write_index(self, index):
+        """Write the map of real source path to doctree handle."""
+        import pickle
+        path = self.index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fout:
+            pickle.dump(index, fout)
+        return path
+
+    def input_paths(self):
+        """Return the content, config and theme read by pelican."""
+        return [path for path in [self.input_dir, self.pelican_config,
+                                  self.theme_dir] if path]
+
+    def output_paths(self):
+        """Return the directory pelican writes the site into."""
+        return [self.output_dir] if self.output_dir else []
+
     def debug_msg(self):
         """Return some debug outut about the current state of the task."""
         msg = super().debug_msg() + "\n"
@@ -83,6 +158,8 @@ class PelicanTask(OutputDirOpt, Task):
                                     self.theme_dir)
         msg += self.msg_template % (self.indent, self.pelican_options_key,
                                     self.pelican_options)
+        msg += self.msg_template % (self.indent, self.doctrees_key,
+                                    self.doctrees)
         return msg
 
     @property
@@ -99,4 +176,6 @@ class PelicanTask(OutputDirOpt, Task):
                                        self.theme_dir_default)
         config += self.msg_template % (self.indent, self.pelican_options_key,
                                        self.pelican_options_default)
+        config += self.msg_template % (self.indent, self.doctrees_key,
+                                       self.doctrees_default)
         return config
@@ -0,0 +1,205 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Lazy registry of the available task classes.
+
+The registry maps task config names to the location of the task class as a
+"module:Class" string and only imports a task module when its class is first
+looked up, so a run only imports the tasks its config file uses.
+
+The locations of the built-in tasks come from a manifest which is built by
+importing every module of the tasks package once (see
+``escadrille.tasks.core.find_tasks``) and is then cached as JSON. The cached
+manifest is rebuilt when any task module file changes.
+
+Third-party packages provide tasks through the "escadrille.tasks" entry point
+group, using the task's config name as the entry point name::
+
+    entry_points={'escadrille.tasks': ['my_task=my_package.tasks:MyTask']}
+"""
+
+import importlib
+import json
+import os
+import sys
+from collections.abc import Mapping
+
+from escadrille.trace import span
+from escadrille.verbosity import dprint
+from escadrille.version import VERSION
+
+from .core import find_tasks
+
+ENTRY_POINT_GROUP = 'escadrille.tasks'
+MANIFEST_NAME = 'tasks.json'
+
+
+def class_location(cls):
+    """Return the "module:Class" location of a class."""
+    return '%s:%s' % (cls.__module__, cls.__qualname__)
+
+
+def module_stats(path):
+    """Return a map of each python file below path to its stat info."""
+    stats = {}
+    for dirpath, _, fnames in os.walk(path):
+        for fname in fnames:
+            if fname.endswith('.py'):
+                fpath = os.path.join(dirpath, fname)
+                stat = os.stat(fpath)
+                stats[fpath] = [stat.st_mtime_ns, stat.st_size]
+    return stats
+
+
+def sys_path_stats():
+    """Return a map of each sys.path directory to its modification time."""
+    stats = {}
+    for path in sys.path:
+        try:
+            stats[path] = os.stat(path or os.curdir).st_mtime_ns
+        except OSError:
+            continue
+    return stats
+
+
+def entry_point_locations():
+    """Return a map of config name to location for plugin tasks."""
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        return {}
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=ENTRY_POINT_GROUP)
+    else:
+        eps = eps.get(ENTRY_POINT_GROUP, [])
+    return {ep.name: ep.value for ep in eps}
+
+
+class TaskRegistry(Mapping):
+    """Map task config names to task classes, importing them on first use.
+
+    Looking up entry points is slow, so the plugins callable, which returns
+    the locations of plugin tasks, is only called when a name is not one of
+    the given locations or when every task is listed. The given locations
+    take precedence over plugin tasks of the same name.
+    """
+
+    def __init__(self, locations, plugins=None):
+        """Set up instance vars for a TaskRegistry object."""
+        self.locations = dict(locations)
+        self.plugins = plugins
+        self.loaded = {}
+
+    def load_plugins(self):
+        """Add the locations of the plugin tasks, once."""
+        if self.plugins is None:
+            return
+        plugins, self.plugins = self.plugins(), None
+        for name, location in plugins.items():
+            self.locations.setdefault(name, location)
+
+    def __getitem__(self, name):
+        """Import and return the task class for a config name."""
+        if name not in self.loaded:
+            if name not in self.locations:
+                self.load_plugins()
+            module_name, _, class_name = self.locations[name].partition(':')
+            with span('import %s' % module_name, category='tasks'):
+                module = importlib.import_module(module_name)
+            cls = module
+            for attr in class_name.split('.'):
+                cls = getattr(cls, attr)
+            self.loaded[name] = cls
+        return self.loaded[name]
+
+    def __iter__(self):
+        """Iterate over the config names of the available tasks."""
+        self.load_plugins()
+        return iter(list(self.locations))
+
+    def __len__(self):
+        """Return the number of available tasks."""
+        self.load_plugins()
+        return len(self.locations)
+
+
+class TaskManifest(object):
+    """Locations of the task classes found in a tasks package and plugins.
+
+    The manifest is cached in a JSON file, when one is given. The built-in
+    task locations are stored along with the stat info of the package's
+    modules they were found in, and the plugin task locations along with the
+    modification times of the sys.path directories, which change when a
+    package is installed or removed.
+    """
+
+    def __init__(self, path, prefix, cache_file=None):
+        """Set up instance vars for a TaskManifest object."""
+        self.path = path
+        self.prefix = prefix
+        self.cache_file = cache_file
+
+    def load(self):
+        """Return the cached manifest dict, empty when there is none."""
+        if self.cache_file is None:
+            return {}
+        try:
+            with open(self.cache_file, 'r') as fin:
+                cached = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        if cached.get('version') != VERSION:
+            return {}
+        return cached
+
+    def store(self, **entries):
+        """Update the entries of the cached manifest."""
+        if self.cache_file is None:
+            return
+        cached = self.load()
+        cached.update(entries, version=VERSION)
+        temp_file = '%s.%d.tmp' % (self.cache_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(temp_file, 'w') as fout:
+                json.dump(cached, fout, sort_keys=True)
+            os.replace(temp_file, self.cache_file)
+        except OSError as exc:
+            dprint('tasks: cannot cache the task manifest: %s' % exc)
+
+    def locations(self):
+        """Return a map of config name to the location of built-in tasks."""
+        cached = self.load()
+        modules = {'path': self.path, 'modules': module_stats(self.path)}
+        if 'tasks' in cached and all(cached.get(key) == value
+                                     for key, value in modules.items()):
+            dprint('tasks: using cached manifest %s' % self.cache_file)
+            return cached['tasks']
+        with span('find tasks', category='tasks'):
+            task_map = find_tasks(self.path, self.prefix)
+        locations = {name: class_location(cls)
+                     for name, cls in task_map.items()}
+        self.store(tasks=locations, **modules)
+        return locations
+
+    def plugin_locations(self):
+        """Return a map of config name to the location of plugin tasks."""
+        cached = self.load()
+        sys_path = sys_path_stats()
+        if 'plugins' in cached and cached.get('sys_path') == sys_path:
+            return cached['plugins']
+        with span('find plugin tasks', category='tasks'):
+            locations = entry_point_locations()
+        self.store(plugins=locations, sys_path=sys_path)
+        return locations
@@ -11,25 +11,151 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-"""Task to publish RST files to a pickled doctree format."""
+"""Task to publish RST files to a pickled doctree format.
 
+The task is incremental: a manifest next to the output directory records the
+content hash and title of every source along with the docutils version and
+settings. Sources whose hash is unchanged keep their pickled doctree, only
+changed sources are parsed and the pickles of deleted sources are removed.
+
+With the "format" option set to "archive" the doctrees are packed into a
+single SQLite archive next to the output directory instead of one pickle file
+per source (see ``escadrille.doctrees``). Worker processes return the packed
+doctrees and only the task's process writes to the archive.
+
+Either way the "dtrees" shared state maps titles to lazy doctree handles
+which load through a shared LRU cache bounded by the "dtree_cache_mb" option.
+
+Setting up docutils (option parser, default settings, reader and parser) for
+every file costs about as much as parsing a small file, so each thread or
+worker process sets up one DoctreeParser per settings and reuses it.
+"""
+
+import json
 import os
 import pickle
+import threading
 
-from docutils.core import publish_doctree
-from docutils.io import FileInput
+from escadrille.cache import hash_file
+from escadrille.doctrees import DOCTREE_CACHE
+from escadrille.doctrees import DoctreeArchive
+from escadrille.doctrees import PickleHandle
+from escadrille.doctrees import dumps
+from escadrille import trace
+from escadrille.trace import span
 
 from .core import Task
 from .options import OutputDirOpt
 
 
+class DoctreeParser(object):
+    """A docutils publisher set up once and reused to parse many files.
+
+    This does the work of ``docutils.core.publish_doctree`` without building
+    new settings and components for each file.
+    """
+
+    def __init__(self, settings_overrides=None):
+        """Set up the docutils components and settings."""
+        # docutils is slow to import so only import it when parsing
+        from docutils.core import Publisher
+        from docutils.io import FileInput
+        from docutils.io import NullOutput
+        from docutils.parsers.rst import Parser
+        from docutils.readers.standalone import Reader
+        from docutils.writers.null import Writer
+        parser = Parser()
+        self.publisher = Publisher(
+            reader=Reader(parser=parser), parser=parser, writer=Writer(),
+            source_class=FileInput, destination_class=NullOutput)
+        self.publisher.process_programmatic_settings(
+            None, dict(settings_overrides or {}), None)
+
+    def parse(self, infile):
+        """Return the doctree of an RST file."""
+        self.publisher.set_source(source_path=infile)
+        self.publisher.set_destination()
+        self.publisher.publish()
+        return self.publisher.document
+
+
+_local = threading.local()
+
+
+def get_parser(settings_overrides=None):
+    """Return the calling thread's DoctreeParser for the settings."""
+    key = json.dumps(settings_overrides or {}, sort_keys=True)
+    parsers = getattr(_local, 'parsers', None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    if key not in parsers:
+        parsers[key] = DoctreeParser(settings_overrides)
+    return parsers[key]
+
+
+def parse_file(infile, outfile, settings_overrides=None, packed=False):
+    """Parse an RST file and return its title and packed doctree.
+
+    The doctree is pickled to outfile and None is returned in its place,
+    unless packed is True.
+    """
+    doctree = get_parser(settings_overrides).parse(infile)
+    if packed:
+        return doctree['title'], dumps(doctree)
+    outdir, _ = os.path.split(outfile)
+    if not os.path.exists(outdir):
+        os.makedirs(outdir, exist_ok=True)
+    with open(outfile, 'wb') as fout:
+        pickle.dump(doctree, fout)
+    return doctree['title'], None
+
+
+def parse_files(pairs, settings_overrides=None, packed=False):
+    """Parse a list of (outfile, infile) pairs.
+
+    Returns a list of (outfile, title, data, error) tuples where data is the
+    packed doctree, when packed is True, and error is None, or the message of
+    the failure that kept the file from being parsed. This is the function
+    run by the worker processes in parallel mode.
+    """
+    results = []
+    for outfile, infile in pairs:
+        try:
+            title, data = parse_file(infile, outfile, settings_overrides,
+                                     packed)
+            results.append((outfile, title, data, None))
+        except (Exception, SystemExit) as exc:
+            # docutils exits on severe errors
+            results.append((outfile, None, None, '%s: %s' % (infile, exc)))
+    return results
+
+
 class Rst2dtreeTask(OutputDirOpt, Task):
     """Make doctree itermediary files from RST source files."""
 
     config_name = 'rst2dtree'
+    requires = ['staging']
+    provides = ['dtrees']
+    cacheable = True
     inputs_key = 'inputs'
     inputs_default = {}  # output_file: input_file
     output_dir_default = ''
+    workers_key = 'workers'
+    workers_default = '1'
+    manifest_suffix = '.manifest.json'
+    # "pickle" for a pickle file per source or "archive" for one SQLite file
+    format_key = 'format'
+    format_default = 'pickle'
+    formats = ('pickle', 'archive')
+    archive_suffix = '.sqlite'
+    # bound of the doctree cache shared by the tasks of a run, in megabytes
+    cache_size_key = 'dtree_cache_mb'
+    cache_size_default = '64'
+    # a JSON object of docutils settings, e.g. {"report_level": 4}
+    settings_key = 'docutils_settings'
+    settings_default = '{}'
+    # number of shards per worker, more shards balance the load better
+    shards_per_worker = 4
 
     def __init__(self, *args, **kwargs):
         """Set up defaults for Galleries Task instances."""
@@ -37,11 +163,32 @@ class Rst2dtreeTask(OutputDirOpt, Task):
         self.suffix = 'rst'
         self.input_file_map = self.inputs_default
         self.dtree_key = 'dtrees'
+        self.workers = int(self.workers_default)
+        self.settings_overrides = json.loads(self.settings_default)
+        self.format = self.format_default
+        self.cache_size = int(self.cache_size_default)
         super().__init__(*args, **kwargs)
 
     def _load_config(self):
         """Load task options from the config file."""
         super()._load_config()
+        workers = self.config_file.get(self.tag, self.workers_key)
+        self.workers = int(workers if workers is not None
+                           else self.workers_default)
+        if self.workers < 1:
+            self.workers = os.cpu_count() or 1
+        settings = self.config_file.get(self.tag, self.settings_key)
+        self.settings_overrides = json.loads(
+            settings if settings is not None else self.settings_default)
+        self.format = (self.config_file.get(self.tag, self.format_key) or
+                       self.format_default)
+        if self.format not in self.formats:
+            raise ValueError('%s: unknown %s "%s", expected one of: %s' % (
+                self.tag, self.format_key, self.format,
+                ', '.join(self.formats)))
+        cache_size = self.config_file.get(self.tag, self.cache_size_key)
+        self.cache_size = int(cache_size if cache_size is not None
+                              else self.cache_size_default)
         self.load_input_output_pairs()
 
     def load_input_output_pairs(self):
@@ -50,7 +197,7 @@ class Rst2dtreeTask(OutputDirOpt, Task):
         Recursively search input directories for RST files.
         """
         inputs = self.config_file.get(self.tag, self.inputs_key)
-        self.input_file_map = self.inputs_default
+        self.input_file_map = dict(self.inputs_default)
         for item in inputs.split(' '):
             sane_path = self.sanitize_path(item)
             if (os.path.isfile(sane_path) and
@@ -90,27 +237,209 @@ class Rst2dtreeTask(OutputDirOpt, Task):
         """Parse input files into doctree and pickle results."""
         print('Starting rst2dtree Task.')
         super().__call__(*args, **kwargs)
-        dtree_map = {}
-        for outfile in self.input_file_map:
-            outdir, _ = os.path.split(outfile)
-            if not os.path.exists(outdir):
-                os.makedirs(outdir)
-            with open(self.input_file_map[outfile], 'r') as fin:
-                doctree = publish_doctree(
-                    source=fin, source_class=FileInput)
-            with open(outfile, 'wb') as fout:
-                pickle.dump(doctree, fout)
-            dtree_map[doctree['title']] = outfile
+        DOCTREE_CACHE.resize(self.cache_size * 1024 * 1024)
+        archive = None
+        if self.packed:
+            archive = DoctreeArchive(self.archive_path()).open()
+        try:
+            dtree_map = self.update(archive)
+        finally:
+            if archive is not None:
+                archive.close()
         self._set_status()
         self.shared_state[self.dtree_key] = dtree_map
         return self.shared_state
 
+    @property
+    def packed(self):
+        """Return True if the doctrees are packed into an archive."""
+        return self.format == 'archive'
+
+    def update(self, archive=None):
+        """Parse the changed sources and return the map of title to handle.
+
+        The doctrees are stored in the archive, if one is given, instead of
+        in pickle files.
+        """
+        key = self.manifest_key()
+        recorded = self.load_manifest(key)
+        stored = archive.sources() if archive is not None else None
+        files, hashes, pairs = {}, {}, []
+        with span('hash sources', category='rst2dtree'):
+            for outfile, infile in self.input_file_map.items():
+                try:
+                    hashes[outfile] = hash_file(infile)
+                except OSError as exc:
+                    self.errors.append('%s: %s' % (infile, exc))
+                    continue
+                entry = recorded.get(outfile)
+                if (entry is not None and entry['source'] == infile and
+                        entry['hash'] == hashes[outfile] and
+                        (infile in stored if archive is not None
+                         else os.path.exists(outfile))):
+                    files[outfile] = entry
+                else:
+                    pairs.append((outfile, infile))
+        self.vprint('%s%d of %d sources unchanged' %
+                    (self.indent, len(files), len(self.input_file_map)))
+        if archive is not None:
+            # the archive knows its sources, even those of other manifests
+            self.prune(stored.difference(self.input_file_map.values()),
+                       archive)
+        else:
+            self.prune([outfile for outfile in recorded
+                        if outfile not in self.input_file_map])
+        for outfile, title, data, error in self.parse(pairs):
+            infile = self.input_file_map[outfile]
+            if error is not None:
+                self.errors.append(error)
+                self.prune([infile if archive is not None else outfile],
+                           archive)
+                continue
+            if archive is not None:
+                archive.put(infile, title, hashes[outfile], data)
+            files[outfile] = {'source': infile, 'hash': hashes[outfile],
+                              'title': title}
+        if archive is not None:
+            archive.commit()
+        self.store_manifest(key, files)
+        # merge in input order so that the result does not depend on workers
+        dtree_map = {}
+        for outfile in self.input_file_map:
+            if outfile not in files:
+                continue
+            entry = files[outfile]
+            dtree_map[entry['title']] = (
+                archive.handle(entry['source'], entry['hash'])
+                if archive is not None
+                else PickleHandle(outfile, entry['source'], entry['hash']))
+        return dtree_map
+
+    def parse(self, pairs):
+        """Parse the (outfile, infile) pairs and return the results."""
+        if self.workers > 1 and len(pairs) > 1:
+            return self.parse_parallel(pairs)
+        results = []
+        for pair in pairs:
+            with span('parse %s' % pair[1], category='rst2dtree'):
+                results.extend(parse_files([pair], self.settings_overrides,
+                                           self.packed))
+        return results
+
+    def archive_path(self):
+        """Return the path of the doctree archive."""
+        output_dir = os.path.abspath(os.path.expanduser(self.output_dir))
+        return output_dir.rstrip(os.sep) + self.archive_suffix
+
+    def manifest_path(self):
+        """Return the path of the manifest next to the output directory."""
+        output_dir = os.path.abspath(os.path.expanduser(self.output_dir))
+        return output_dir.rstrip(os.sep) + self.manifest_suffix
+
+    def manifest_key(self):
+        """Return what, besides the sources, determines the doctrees."""
+        import docutils
+        key = {'docutils': docutils.__version__, 'format': self.format,
+               'settings': self.settings_overrides}
+        # the round trip makes the key comparable with the loaded one
+        return json.loads(json.dumps(key, sort_keys=True, default=repr))
+
+    def load_manifest(self, key):
+        """Return the manifest's map of outfile to its source entry.
+
+        The map is empty when there is no manifest or it was made with a
+        different key.
+        """
+        try:
+            with open(self.manifest_path(), 'r') as fin:
+                manifest = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('key') != key:
+            return {}
+        return manifest.get('files', {})
+
+    def store_manifest(self, key, files):
+        """Write the manifest of the parsed sources."""
+        path = self.manifest_path()
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w') as fout:
+            json.dump({'key': key, 'files': files}, fout, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def prune(self, names, archive=None):
+        """Remove the doctrees that are no longer valid.
+
+        The names are the pickle files to remove or, with an archive, the
+        sources whose doctrees are removed from the archive.
+        """
+        if archive is not None:
+            archive.remove(list(names))
+            return
+        for outfile in names:
+            if os.path.exists(outfile):
+                self.dprint('removing %s' % outfile)
+                os.remove(outfile)
+
+    def parse_parallel(self, pairs):
+        """Parse the pairs in a pool of worker processes.
+
+        The pairs are dealt round robin into shards, each shard is parsed
+        and pickled by a worker and the results of all shards are returned.
+        """
+        import functools
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        count = min(len(pairs), self.workers * self.shards_per_worker)
+        shards = [pairs[index::count] for index in range(count)]
+        self.vprint('%sparsing %d files in %d shards with %d workers' %
+                    (self.indent, len(pairs), count, self.workers))
+        results = []
+        # spawn as forking a process that runs threads is unsafe
+        context = multiprocessing.get_context('spawn')
+        with span('parse %d files' % len(pairs), category='rst2dtree'):
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=context) as executor:
+                parse = functools.partial(
+                    trace.collect, trace.tracing(), functools.partial(
+                        parse_files,
+                        settings_overrides=self.settings_overrides,
+                        packed=self.packed))
+                for shard_results, events in executor.map(parse, shards):
+                    results.extend(shard_results)
+                    trace.merge(events)
+        return results
+
+    def input_paths(self):
+        """Return the RST source files read by the task."""
+        return list(self.input_file_map.values())
+
+    def watch_paths(self):
+        """Return the configured input files and directories."""
+        inputs = self.config_file.get(self.tag, self.inputs_key) or ''
+        return [self.sanitize_path(item) for item in inputs.split(' ')
+                if item != '']
+
+    def output_paths(self):
+        """Return the doctrees and the manifest of the task."""
+        if self.packed:
+            return [self.archive_path(), self.manifest_path()]
+        return list(self.input_file_map) + [self.manifest_path()]
+
     def debug_msg(self):
         """Return debug output about current task state."""
         msg = super().debug_msg() + "\n"
         msg += self.config_snippet_output_dir
         msg += self.msg_template % (
             self.indent, self.inputs_key, str(self.input_file_map))
+        msg += self.msg_template % (self.indent, self.workers_key,
+                                    self.workers)
+        msg += self.msg_template % (self.indent, self.settings_key,
+                                    json.dumps(self.settings_overrides))
+        msg += self.msg_template % (self.indent, self.format_key, self.format)
+        msg += self.msg_template % (self.indent, self.cache_size_key,
+                                    self.cache_size)
         return msg
 
     @property
@@ -121,4 +450,12 @@ class Rst2dtreeTask(OutputDirOpt, Task):
         config += self.config_snippet_output_dir
         config += self.msg_template % (
             self.indent, self.inputs_key, ' ')
+        config += self.msg_template % (self.indent, self.workers_key,
+                                       self.workers_default)
+        config += self.msg_template % (self.indent, self.settings_key,
+                                       self.settings_default)
+        config += self.msg_template % (self.indent, self.format_key,
+                                       self.format_default)
+        config += self.msg_template % (self.indent, self.cache_size_key,
+                                       self.cache_size_default)
         return config
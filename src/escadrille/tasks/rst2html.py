@@ -0,0 +1,341 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Task to render the doctrees of the rst2dtree task to HTML.
+
+The doctrees are rendered in process with a docutils HTML writer, so RST
+sources are only parsed once, by the rst2dtree task. Each doctree is written
+to "<output_dir>/<title id>.html" as a whole page or as one of the parts of
+the docutils writer, such as "body" or "fragment".
+
+The task is incremental: a manifest next to the output directory records the
+doctree handle each page was rendered from along with the writer settings,
+and only pages whose doctree changed are rendered again.
+"""
+
+import json
+import os
+import threading
+
+from escadrille.doctrees import load_doctree
+from escadrille import trace
+from escadrille.trace import span
+
+from .core import Task
+from .options import OutputDirOpt
+
+
+class HtmlRenderer(object):
+    """A docutils publisher set up once and reused to render many doctrees.
+
+    This does the work of ``docutils.core.publish_parts`` for a doctree
+    without building new settings and components for each doctree.
+    """
+
+    def __init__(self, writer_name='html5', settings_overrides=None):
+        """Set up the docutils components and settings."""
+        # docutils is slow to import so only import it when rendering
+        from docutils.core import Publisher
+        from docutils.io import DocTreeInput
+        from docutils.io import StringOutput
+        from docutils.readers.doctree import Reader
+        from docutils.writers import get_writer_class
+        self.publisher = Publisher(
+            reader=Reader(), writer=get_writer_class(writer_name)(),
+            source_class=DocTreeInput, destination_class=StringOutput)
+        self.publisher.process_programmatic_settings(
+            None, dict(settings_overrides or {}), None)
+
+    def render(self, document):
+        """Render a doctree, which is modified, and return the parts."""
+        self.publisher.set_source(source=document)
+        self.publisher.set_destination()
+        self.publisher.publish()
+        return self.publisher.writer.parts
+
+
+_local = threading.local()
+
+
+def get_renderer(writer_name='html5', settings_overrides=None):
+    """Return the calling thread's HtmlRenderer for the writer settings."""
+    key = json.dumps([writer_name, settings_overrides or {}], sort_keys=True)
+    renderers = getattr(_local, 'renderers', None)
+    if renderers is None:
+        renderers = _local.renderers = {}
+    if key not in renderers:
+        renderers[key] = HtmlRenderer(writer_name, settings_overrides)
+    return renderers[key]
+
+
+def render_file(doctree, outfile, part='whole', writer_name='html5',
+                settings_overrides=None):
+    """Render a doctree and write one part of the output to outfile."""
+    parts = get_renderer(writer_name, settings_overrides).render(doctree)
+    outdir, _ = os.path.split(outfile)
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    with open(outfile, 'w') as fout:
+        fout.write(parts[part])
+
+
+def render_files(pairs, part='whole', writer_name='html5',
+                 settings_overrides=None):
+    """Render a list of (outfile, doctree handle) pairs.
+
+    Returns a list of (outfile, error) tuples where error is None, or the
+    message of the failure. This is the function run by the worker
+    processes in parallel mode, where the doctrees are read privately
+    instead of through the shared doctree cache.
+    """
+    results = []
+    for outfile, handle in pairs:
+        try:
+            doctree = (load_doctree(handle) if isinstance(handle, str)
+                       else handle.read()[0])
+            render_file(doctree, outfile, part, writer_name,
+                        settings_overrides)
+            results.append((outfile, None))
+        except (Exception, SystemExit) as exc:
+            results.append((outfile, '%s: %s' % (outfile, exc)))
+    return results
+
+
+class Rst2htmlTask(OutputDirOpt, Task):
+    """Render the doctrees of the rst2dtree task to HTML files."""
+
+    config_name = 'rst2html'
+    requires = ['dtrees']
+    provides = ['html']
+    cacheable = True
+    dtree_key = 'dtrees'
+    html_key = 'html'
+    suffix = 'html'
+    part_key = 'part'
+    part_default = 'whole'
+    writer_key = 'writer'
+    writer_default = 'html5'
+    workers_key = 'workers'
+    workers_default = '1'
+    # a JSON object of docutils settings, e.g. {"stylesheet_path": ""}
+    settings_key = 'docutils_settings'
+    settings_default = '{}'
+    manifest_suffix = '.manifest.json'
+    # number of shards per worker, more shards balance the load better
+    shards_per_worker = 4
+
+    def __init__(self, *args, **kwargs):
+        """Set up defaults for Rst2html Task instances."""
+        self.part = self.part_default
+        self.writer = self.writer_default
+        self.workers = int(self.workers_default)
+        self.settings_overrides = json.loads(self.settings_default)
+        self.outfiles = {}
+        super().__init__(*args, **kwargs)
+
+    def _load_config(self):
+        """Load task options from the config file."""
+        super()._load_config()
+        self.part = (self.config_file.get(self.tag, self.part_key) or
+                     self.part_default)
+        self.writer = (self.config_file.get(self.tag, self.writer_key) or
+                       self.writer_default)
+        workers = self.config_file.get(self.tag, self.workers_key)
+        self.workers = int(workers if workers is not None
+                           else self.workers_default)
+        if self.workers < 1:
+            self.workers = os.cpu_count() or 1
+        settings = self.config_file.get(self.tag, self.settings_key)
+        self.settings_overrides = json.loads(
+            settings if settings is not None else self.settings_default)
+
+    def output_files(self, titles):
+        """Return a map of title to output file for the titles.
+
+        The file names are the docutils ids of the titles, numbered when
+        several titles have the same id.
+        """
+        from docutils.nodes import make_id
+        outfiles, used = {}, set()
+        for title in titles:
+            name = make_id(title) or 'page'
+            unique, count = name, 1
+            while unique in used:
+                count += 1
+                unique = '%s-%d' % (name, count)
+            used.add(unique)
+            outfiles[title] = os.path.join(
+                self.output_dir, '%s.%s' % (unique, self.suffix))
+        return outfiles
+
+    def __call__(self, *args, **kwargs):
+        """Render the changed doctrees to HTML files."""
+        print('Starting rst2html Task.')
+        super().__call__(*args, **kwargs)
+        dtrees = self.shared_state.get(self.dtree_key) or {}
+        self.outfiles = self.output_files(dtrees)
+        key = self.manifest_key()
+        recorded = self.load_manifest(key)
+        files, pairs = {}, []
+        for title, handle in dtrees.items():
+            outfile = self.outfiles[title]
+            entry = {'handle': repr(handle), 'title': title}
+            if recorded.get(outfile) == entry and os.path.exists(outfile):
+                files[outfile] = entry
+            else:
+                files[outfile] = None
+                pairs.append((outfile, handle))
+        self.vprint('%s%d of %d pages unchanged' %
+                    (self.indent, len(files) - len(pairs), len(dtrees)))
+        self.prune([outfile for outfile in recorded if outfile not in files])
+        handles = dict(pairs)
+        for outfile, error in self.render(pairs):
+            if error is not None:
+                self.errors.append(error)
+                self.prune([outfile])
+                del files[outfile]
+            else:
+                files[outfile] = {'handle': repr(handles[outfile])}
+        titles = {outfile: title for title, outfile in self.outfiles.items()}
+        for outfile, entry in files.items():
+            entry['title'] = titles[outfile]
+        self.store_manifest(key, files)
+        self._set_status()
+        self.shared_state[self.html_key] = {
+            title: outfile for title, outfile in self.outfiles.items()
+            if outfile in files}
+        return self.shared_state
+
+    def render(self, pairs):
+        """Render the (outfile, handle) pairs and return the results."""
+        if self.workers > 1 and len(pairs) > 1:
+            return self.render_parallel(pairs)
+        results = []
+        for outfile, handle in pairs:
+            with span('render %s' % outfile, category='rst2html'):
+                try:
+                    # the cached doctree is shared, rendering modifies it
+                    doctree = load_doctree(handle).deepcopy()
+                    render_file(doctree, outfile, self.part, self.writer,
+                                self.settings_overrides)
+                    results.append((outfile, None))
+                except (Exception, SystemExit) as exc:
+                    results.append((outfile, '%s: %s' % (outfile, exc)))
+        return results
+
+    def render_parallel(self, pairs):
+        """Render the pairs in a pool of worker processes.
+
+        The pairs are dealt round robin into shards and each shard is read
+        and rendered by a worker. The handles are sent to the workers rather
+        than the doctrees, which are bigger.
+        """
+        import functools
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        count = min(len(pairs), self.workers * self.shards_per_worker)
+        shards = [pairs[index::count] for index in range(count)]
+        self.vprint('%srendering %d pages in %d shards with %d workers' %
+                    (self.indent, len(pairs), count, self.workers))
+        results = []
+        # spawn as forking a process that runs threads is unsafe
+        context = multiprocessing.get_context('spawn')
+        with span('render %d pages' % len(pairs), category='rst2html'):
+            with ProcessPoolExecutor(max_workers=self.workers,
+                                     mp_context=context) as executor:
+                render = functools.partial(
+                    trace.collect, trace.tracing(), functools.partial(
+                        render_files, part=self.part,
+                        writer_name=self.writer,
+                        settings_overrides=self.settings_overrides))
+                for shard_results, events in executor.map(render, shards):
+                    results.extend(shard_results)
+                    trace.merge(events)
+        return results
+
+    def manifest_path(self):
+        """Return the path of the manifest next to the output directory."""
+        output_dir = os.path.abspath(os.path.expanduser(self.output_dir))
+        return output_dir.rstrip(os.sep) + self.manifest_suffix
+
+    def manifest_key(self):
+        """Return what, besides the doctrees, determines the pages."""
+        import docutils
+        key = {'docutils': docutils.__version__, 'part': self.part,
+               'writer': self.writer, 'settings': self.settings_overrides}
+        # the round trip makes the key comparable with the loaded one
+        return json.loads(json.dumps(key, sort_keys=True, default=repr))
+
+    def load_manifest(self, key):
+        """Return the manifest's map of outfile to its doctree entry.
+
+        The map is empty when there is no manifest or it was made with a
+        different key.
+        """
+        try:
+            with open(self.manifest_path(), 'r') as fin:
+                manifest = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('key') != key:
+            return {}
+        return manifest.get('files', {})
+
+    def store_manifest(self, key, files):
+        """Write the manifest of the rendered pages."""
+        path = self.manifest_path()
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w') as fout:
+            json.dump({'key': key, 'files': files}, fout, sort_keys=True)
+        os.replace(temp_path, path)
+
+    def prune(self, outfiles):
+        """Remove the pages that are no longer valid."""
+        for outfile in outfiles:
+            if os.path.exists(outfile):
+                self.dprint('removing %s' % outfile)
+                os.remove(outfile)
+
+    def output_paths(self):
+        """Return the pages and the manifest of the task."""
+        return list(self.outfiles.values()) + [self.manifest_path()]
+
+    def debug_msg(self):
+        """Return debug output about current task state."""
+        msg = super().debug_msg() + "\n"
+        msg += self.config_snippet_output_dir
+        msg += self.msg_template % (self.indent, self.part_key, self.part)
+        msg += self.msg_template % (self.indent, self.writer_key,
+                                    self.writer)
+        msg += self.msg_template % (self.indent, self.workers_key,
+                                    self.workers)
+        msg += self.msg_template % (self.indent, self.settings_key,
+                                    json.dumps(self.settings_overrides))
+        return msg
+
+    @property
+    def default_config(self):
+        """Return default example section for config file."""
+        config = "[%s_tag]\n" % self.config_name
+        config += self.config_snippet_name
+        config += self.config_snippet_output_dir
+        config += self.msg_template % (self.indent, self.part_key,
+                                       self.part_default)
+        config += self.msg_template % (self.indent, self.writer_key,
+                                       self.writer_default)
+        config += self.msg_template % (self.indent, self.workers_key,
+                                       self.workers_default)
+        config += self.msg_template % (self.indent, self.settings_key,
+                                       self.settings_default)
+        return config
@@ -0,0 +1,275 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Task to build a full text search index from the rst2dtree doctrees.
+
+The index is written for client side search as JSON files in the output
+directory:
+
+- "docs.json" is a list with, at the index of each document id, the
+  document's [title, url, section titles], or null for unused ids.
+- "terms/<shard>.json" maps each term to its postings, a flat list of
+  document id and term weight pairs sorted by id. The shard of a term is the
+  hexadecimal code point of its first character, e.g. "terms/73.json" for
+  "search".
+
+Terms are the lower cased words of the text, words in the title and section
+titles weigh more. The task is incremental: a manifest next to the output
+directory records the source hash and the terms of every document, only
+documents whose source changed are read again and only the shards holding
+their terms are rewritten. Document ids are kept across builds, so unchanged
+documents keep their postings.
+"""
+
+import json
+import os
+import re
+
+from escadrille.doctrees import load_doctree
+from escadrille.trace import span
+
+from .core import Task
+from .options import OutputDirOpt
+
+WORD = re.compile(r'\w+')
+
+
+def shard_name(term):
+    """Return the name of the shard holding a term."""
+    return '%x' % ord(term[0])
+
+
+class SearchIndexTask(OutputDirOpt, Task):
+    """Build an inverted index of the doctrees for client side search."""
+
+    config_name = 'search_index'
+    requires = ['dtrees']
+    provides = ['search']
+    cacheable = True
+    dtree_key = 'dtrees'
+    search_key = 'search'
+    # the url of a document in the results, the values are the document's
+    # "title", its "slug" (the docutils id of the title) and its source's
+    # file "name" without the extension
+    url_key = 'url'
+    url_default = '%(name)s.html'
+    min_length_key = 'min_length'
+    min_length_default = '2'
+    title_weight_key = 'title_weight'
+    title_weight_default = '5'
+    manifest_suffix = '.manifest.json'
+    docs_name = 'docs.json'
+    terms_dir = 'terms'
+
+    def __init__(self, *args, **kwargs):
+        """Set up defaults for Search Index Task instances."""
+        self.url = self.url_default
+        self.min_length = int(self.min_length_default)
+        self.title_weight = int(self.title_weight_default)
+        super().__init__(*args, **kwargs)
+
+    def _load_config(self):
+        """Load task options from the config file."""
+        super()._load_config()
+        self.url = (self.config_file.get(self.tag, self.url_key) or
+                    self.url_default)
+        min_length = self.config_file.get(self.tag, self.min_length_key)
+        self.min_length = int(min_length if min_length is not None
+                              else self.min_length_default)
+        title_weight = self.config_file.get(self.tag, self.title_weight_key)
+        self.title_weight = int(title_weight if title_weight is not None
+                                else self.title_weight_default)
+
+    def terms(self, text, weight, terms):
+        """Add the weight of each word of the text to the terms map."""
+        for word in WORD.findall(text.lower()):
+            if len(word) >= self.min_length:
+                terms[word] = terms.get(word, 0) + weight
+
+    def index_document(self, title, handle):
+        """Return the manifest entry of a document."""
+        from docutils import nodes
+        doctree = load_doctree(handle)
+        walk = getattr(doctree, 'findall', doctree.traverse)
+        sections, terms = [], {}
+        for node in walk(nodes.title):
+            if not isinstance(node.parent, nodes.document):
+                sections.append(node.astext())
+            # the text below includes the titles, adding the last 1
+            self.terms(node.astext(), self.title_weight - 1, terms)
+        self.terms(doctree.astext(), 1, terms)
+        name = os.path.splitext(os.path.basename(handle.source))[0]
+        url = self.url % {'title': title, 'slug': nodes.make_id(title),
+                          'name': name}
+        return {'digest': handle.digest, 'title': title, 'url': url,
+                'sections': sections, 'terms': terms}
+
+    def __call__(self, *args, **kwargs):
+        """Index the changed doctrees and write the changed shards."""
+        print('Starting Search Index Task.')
+        super().__call__(*args, **kwargs)
+        dtrees = self.shared_state.get(self.dtree_key) or {}
+        key = self.manifest_key()
+        recorded = self.load_manifest(key)
+        docs, dirty, ids, indexed = {}, set(), {}, 0
+        if not recorded or not os.path.exists(self.docs_path()):
+            # rewrite every shard, as after changing the manifest key
+            dirty = None
+        with span('index documents', category='search_index'):
+            for title, handle in dtrees.items():
+                entry = recorded.get(handle.source)
+                if entry is not None:
+                    ids[handle.source] = entry['id']
+                if (entry is not None and entry['digest'] == handle.digest
+                        and entry['title'] == title):
+                    docs[handle.source] = entry
+                    continue
+                try:
+                    docs[handle.source] = self.index_document(title, handle)
+                except Exception as exc:
+                    self.errors.append('%s: %s' % (handle.source, exc))
+                    continue
+                indexed += 1
+                if dirty is not None:
+                    dirty.update(self.shards(docs[handle.source]))
+                    if entry is not None:
+                        dirty.update(self.shards(entry))
+        self.vprint('%sindexed %d of %d documents' %
+                    (self.indent, indexed, len(dtrees)))
+        for source, entry in recorded.items():
+            if source not in docs and dirty is not None:
+                dirty.update(self.shards(entry))
+        self.assign_ids(docs, ids)
+        self.write_index(docs, dirty)
+        self.store_manifest(key, docs)
+        self._set_status()
+        self.shared_state[self.search_key] = self.output_dir
+        return self.shared_state
+
+    @staticmethod
+    def shards(entry):
+        """Return the names of the shards holding the terms of an entry."""
+        return set(shard_name(term) for term in entry['terms'])
+
+    @staticmethod
+    def assign_ids(docs, ids):
+        """Give each document its previous id or the lowest unused one."""
+        used = set(ids[source] for source in docs if source in ids)
+        free = (number for number in range(len(docs) + len(used))
+                if number not in used)
+        for source in sorted(docs):
+            if source in ids:
+                docs[source]['id'] = ids[source]
+            else:
+                docs[source]['id'] = next(free)
+
+    def write_index(self, docs, dirty=None):
+        """Write the documents list and the dirty shards, None for all."""
+        count = max([entry['id'] + 1 for entry in docs.values()] or [0])
+        doc_list = [None] * count
+        for entry in docs.values():
+            doc_list[entry['id']] = [entry['title'], entry['url'],
+                                     entry['sections']]
+        self.write_json(self.docs_path(), doc_list)
+        shards = {}
+        for entry in sorted(docs.values(), key=lambda entry: entry['id']):
+            for term, weight in entry['terms'].items():
+                name = shard_name(term)
+                if dirty is None or name in dirty:
+                    shards.setdefault(name, {}).setdefault(term, []).extend(
+                        [entry['id'], weight])
+        terms_dir = os.path.join(self.output_dir, self.terms_dir)
+        if dirty is None:
+            dirty = set(fname[:-len('.json')] for fname in (
+                os.listdir(terms_dir) if os.path.isdir(terms_dir) else [])
+                if fname.endswith('.json'))
+        self.vprint('%swriting %d shards' % (self.indent, len(
+            dirty | set(shards))))
+        for name in dirty | set(shards):
+            path = os.path.join(terms_dir, '%s.json' % name)
+            if name in shards:
+                self.write_json(path, shards[name])
+            elif os.path.exists(path):
+                self.dprint('removing %s' % path)
+                os.remove(path)
+
+    @staticmethod
+    def write_json(path, data):
+        """Write compact JSON to a file, atomically."""
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, 'w') as fout:
+            json.dump(data, fout, sort_keys=True, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def docs_path(self):
+        """Return the path of the documents list."""
+        return os.path.join(self.output_dir, self.docs_name)
+
+    def manifest_path(self):
+        """Return the path of the manifest next to the output directory."""
+        output_dir = os.path.abspath(os.path.expanduser(self.output_dir))
+        return output_dir.rstrip(os.sep) + self.manifest_suffix
+
+    def manifest_key(self):
+        """Return what, besides the doctrees, determines the index."""
+        return {'url': self.url, 'min_length': self.min_length,
+                'title_weight': self.title_weight}
+
+    def load_manifest(self, key):
+        """Return the manifest's map of source to its document entry.
+
+        The map is empty when there is no manifest or it was made with a
+        different key.
+        """
+        try:
+            with open(self.manifest_path(), 'r') as fin:
+                manifest = json.load(fin)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get('key') != key:
+            return {}
+        return manifest.get('docs', {})
+
+    def store_manifest(self, key, docs):
+        """Write the manifest of the indexed documents."""
+        self.write_json(self.manifest_path(), {'key': key, 'docs': docs})
+
+    def output_paths(self):
+        """Return the index directory and the manifest of the task."""
+        return [self.output_dir, self.manifest_path()]
+
+    def debug_msg(self):
+        """Return debug output about current task state."""
+        msg = super().debug_msg() + "\n"
+        msg += self.config_snippet_output_dir
+        msg += self.msg_template % (self.indent, self.url_key, self.url)
+        msg += self.msg_template % (self.indent, self.min_length_key,
+                                    self.min_length)
+        msg += self.msg_template % (self.indent, self.title_weight_key,
+                                    self.title_weight)
+        return msg
+
+    @property
+    def default_config(self):
+        """Return default example section for config file."""
+        config = "[%s_tag]\n" % self.config_name
+        config += self.config_snippet_name
+        config += self.config_snippet_output_dir
+        config += self.msg_template % (self.indent, self.url_key,
+                                       self.url_default)
+        config += self.msg_template % (self.indent, self.min_length_key,
+                                       self.min_length_default)
+        config += self.msg_template % (self.indent, self.title_weight_key,
+                                       self.title_weight_default)
+        return config
@@ -13,7 +13,7 @@
 # limitations under the License.
 """Upload Task."""
 
-import subprocess
+import shlex
 
 from .core import Task
 
@@ -22,6 +22,8 @@ class UploadTask(Task):
     """Use rsync to upload the results to a webserver."""
 
     config_name = 'upload'
+    requires = ['site']
+    provides = []
     ssh_port_key = 'ssh_port'
     ssh_port_default = '22'
     source_dir_key = 'source_dir'
@@ -72,15 +74,17 @@ class UploadTask(Task):
             self.rsync_options = rsync_options
         super()._load_config()
 
-    def __call__(self, *args, **kwargs):
+    async def __call__(self, *args, **kwargs):
         """Execute the Upload Task."""
         print('Starting Upload Task.')
         super().__call__(*args, **kwargs)
-        command = 'rsync -e "ssh -p %s" %s %s %s@%s:%s' % (
-            self.ssh_port, self.rsync_options, self.source_dir, self.user,
-            self.server, self.remote_path)
-        self.dprint('command: %s' % command)
-        subprocess.check_call(command, shell=True)
+        from escadrille.aio import check_call
+        command = (['rsync', '-e', 'ssh -p %s' % self.ssh_port] +
+                   shlex.split(self.rsync_options) +
+                   [self.source_dir, '%s@%s:%s' % (
+                       self.user, self.server, self.remote_path)])
+        self.dprint('command: %s' % ' '.join(map(shlex.quote, command)))
+        await check_call(command)
         self._set_status()
 
     def debug_msg(self):
@@ -0,0 +1,154 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Library to record timing spans in the Chrome trace event format.
+
+The written file can be loaded into chrome://tracing or the Perfetto UI.
+Spans are only recorded once tracing is enabled, otherwise ``span`` is a
+cheap no-op.
+
+Blocks that await must use ``async_span``: the coroutines sharing the event
+loop thread interleave, so their blocks overlap without nesting, which the
+complete events of ``span`` cannot show. Async events are drawn on tracks of
+their own instead.
+
+Worker processes record their spans when they run their work through
+``collect``, given the ``tracing()`` value of the parent process, which adds
+the returned events to its trace with ``merge``.
+"""
+
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+EVENTS = None
+_LOCK = threading.Lock()
+_THREADS = set()
+_IDS = itertools.count(1)
+_ZERO = time.perf_counter()
+
+
+def enable():
+    """Start recording trace events."""
+    global EVENTS
+    with _LOCK:
+        EVENTS = []
+        _THREADS.clear()
+
+
+def _timestamp(counter):
+    """Convert a perf_counter value into trace microseconds."""
+    return (counter - _ZERO) * 1e6
+
+
+def _thread_event(pid, tid):
+    """Return the metadata event naming the current thread."""
+    return {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+            'args': {'name': threading.current_thread().name}}
+
+
+def _record(pid, tid, *events):
+    """Add events of the current thread to the trace."""
+    with _LOCK:
+        if EVENTS is not None:
+            if tid not in _THREADS:
+                _THREADS.add(tid)
+                EVENTS.append(_thread_event(pid, tid))
+            EVENTS.extend(events)
+
+
+@contextmanager
+def span(name, category='escadrille', **args):
+    """Record the time spent in the with block as a complete event."""
+    if EVENTS is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        pid, tid = os.getpid(), threading.get_ident()
+        event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid,
+                 'tid': tid, 'ts': _timestamp(start),
+                 'dur': _timestamp(end) - _timestamp(start)}
+        if args:
+            event['args'] = {key: str(value) for key, value in args.items()}
+        _record(pid, tid, event)
+
+
+@contextmanager
+def async_span(name, category='escadrille', **args):
+    """Record the time spent in a with block that awaits as async events."""
+    if EVENTS is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        pid, tid = os.getpid(), threading.get_ident()
+        begin = {'name': name, 'cat': category, 'ph': 'b', 'pid': pid,
+                 'tid': tid, 'id': next(_IDS), 'ts': _timestamp(start)}
+        if args:
+            begin['args'] = {key: str(value) for key, value in args.items()}
+        finish = dict(begin, ph='e', ts=_timestamp(end))
+        finish.pop('args', None)
+        _record(pid, tid, begin, finish)
+
+
+def tracing():
+    """Return what worker processes need to trace, None when not tracing."""
+    return None if EVENTS is None else _ZERO
+
+
+def collect(state, function, *args):
+    """Run a function in a worker process and return its result and events.
+
+    The state is the ``tracing()`` value of the parent process, the worker
+    shares its time origin so the events line up with the parent's. The
+    events are an empty list when the parent is not tracing.
+    """
+    global _ZERO, EVENTS
+    if state is None:
+        return function(*args), []
+    _ZERO = state
+    enable()
+    name = getattr(function, 'func', function).__name__
+    try:
+        with span(name, category='worker'):
+            result = function(*args)
+        return result, EVENTS
+    finally:
+        # the worker may run other work for a parent that is not tracing
+        EVENTS = None
+
+
+def merge(events):
+    """Add the events recorded by a worker process to the trace."""
+    with _LOCK:
+        if EVENTS is not None:
+            EVENTS.extend(events)
+
+
+def write(path):
+    """Write the recorded events to path as trace event JSON."""
+    with _LOCK:
+        events = list(EVENTS or [])
+    with open(path, 'w') as fout:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fout)
@@ -0,0 +1,191 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""File system watchers used by the escadrille watch mode.
+
+On Linux the watcher uses inotify through ctypes. Everywhere else, or when
+inotify is not usable, it falls back to periodically polling the stat info of
+the watched paths. Both watchers implement ``poll(timeout)`` which returns
+the set of paths that changed within the timeout.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from .verbosity import dprint
+
+
+def is_within(path, parent):
+    """Return True if path is parent or is inside the parent directory."""
+    return path == parent or path.startswith(parent.rstrip(os.sep) + os.sep)
+
+
+def collect_changes(watcher, debounce):
+    """Block until paths change and return them once the changes settle.
+
+    Changes are accumulated until no new change is seen for "debounce"
+    seconds so that one save or checkout triggers a single rebuild.
+    """
+    changed = set()
+    while not changed:
+        changed |= watcher.poll(None)
+    while True:
+        more = watcher.poll(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+class PollingWatcher(object):
+    """Detect changes by comparing snapshots of the paths' stat info."""
+
+    interval = 1.0
+
+    def __init__(self, paths):
+        """Set up instance vars and take the first snapshot."""
+        self.paths = list(paths)
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        """Return a map of every watched file to its stat info."""
+        snapshot = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                for dirpath, _, fnames in os.walk(path):
+                    for fname in fnames:
+                        self._stat(os.path.join(dirpath, fname), snapshot)
+            else:
+                self._stat(path, snapshot)
+        return snapshot
+
+    @staticmethod
+    def _stat(path, snapshot):
+        """Add the stat info of path to the snapshot if it exists."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+    def poll(self, timeout):
+        """Wait for timeout seconds and return the paths that changed."""
+        time.sleep(self.interval if timeout is None else timeout)
+        snapshot = self._scan()
+        changed = {path for path in set(snapshot) | set(self.snapshot)
+                   if snapshot.get(path) != self.snapshot.get(path)}
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        """Release the watcher's resources."""
+        pass
+
+
+class InotifyWatcher(object):
+    """Detect changes using the Linux inotify API."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_ISDIR = 0x40000000
+    mask = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+            IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF)
+    event_header = struct.Struct('iIII')
+
+    def __init__(self, paths):
+        """Set up an inotify instance watching the given paths."""
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux.')
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'),
+                                use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        for path in paths:
+            if os.path.isdir(path):
+                self._add_tree(path)
+            else:
+                # watch the nearest existing directory for the file
+                parent = os.path.dirname(path)
+                while parent and not os.path.isdir(parent):
+                    parent = os.path.dirname(parent)
+                if parent:
+                    self._add(parent)
+
+    def _add(self, path):
+        """Add a watch for a single directory."""
+        if path in self.watches.values():
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                         self.mask)
+        if wd < 0:
+            dprint('watch: cannot watch %s (errno %s)' %
+                   (path, ctypes.get_errno()))
+            return
+        self.watches[wd] = path
+
+    def _add_tree(self, path):
+        """Add watches for a directory and all directories below it."""
+        for dirpath, _, _ in os.walk(path):
+            self._add(dirpath)
+
+    def _read(self):
+        """Read the pending events and return the paths they name."""
+        changed = set()
+        data = os.read(self.fd, 1 << 16)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.event_header.unpack_from(data, offset)
+            offset += self.event_header.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            changed.add(path.rstrip(os.sep))
+            if mask & self.IN_ISDIR and mask & (self.IN_CREATE |
+                                                self.IN_MOVED_TO):
+                self._add_tree(path)
+        return changed
+
+    def poll(self, timeout):
+        """Wait up to timeout seconds and return the paths that changed."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        return self._read()
+
+    def close(self):
+        """Release the inotify file descriptor."""
+        os.close(self.fd)
+
+
+def create_watcher(paths):
+    """Return an inotify watcher for paths, or a polling one as fallback."""
+    try:
+        return InotifyWatcher(paths)
+    except (OSError, AttributeError) as exc:
+        dprint('watch: inotify unavailable (%s), polling instead.' % exc)
+        return PollingWatcher(paths)
@@ -0,0 +1,49 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's aio module."""
+import subprocess
+import sys
+import unittest
+
+from escadrille import aio
+
+
+class TestEventLoopThread(unittest.TestCase):
+    """Test running subprocesses on the background event loop."""
+
+    def setUp(self):
+        """Start an event loop for each unittest."""
+        self.event_loop = aio.EventLoopThread()
+
+    def tearDown(self):
+        """Stop the event loop."""
+        self.event_loop.close()
+
+    def run_coro(self, coro):
+        """Run a coroutine on the event loop and return its result."""
+        return self.event_loop.submit(coro).result(timeout=30)
+
+    def test_getoutput(self):
+        """Ensure output and errors are captured without raising."""
+        output = self.run_coro(aio.getoutput(
+            [sys.executable, '-c', 'import sys; print("out"); '
+             'sys.stderr.write("err\\n"); sys.exit(3)']))
+        self.assertEqual(sorted(output.split('\n')), ['err', 'out'])
+
+    def test_check_call(self):
+        """Ensure a failing command raises CalledProcessError."""
+        self.run_coro(aio.check_call([sys.executable, '-c', 'pass']))
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.run_coro(aio.check_call(
+                [sys.executable, '-c', 'raise SystemExit(2)']))
@@ -0,0 +1,114 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's batch module."""
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.batch import SiteBatch
+from escadrille.batch import read_manifest
+from escadrille.config import ConfigFile
+from escadrille.core import InterfaceCore
+from escadrille.tasks.core import Task
+
+RUNS = []
+
+
+class CountTask(Task):
+    """Test task recording each run in the module's RUNS list."""
+
+    config_name = 'count'
+    requires = []
+    provides = []
+
+    def __call__(self, *args, **kwargs):
+        """Record the run and publish it in the shared state."""
+        super().__call__(*args, **kwargs)
+        RUNS.append(self.config_file.filename)
+        self._set_status()
+        self.shared_state['counted'] = True
+        return self.shared_state
+
+
+class AsyncCountTask(CountTask):
+    """Test task with a coroutine __call__ method."""
+
+    async def __call__(self, *args, **kwargs):
+        """Record the run after yielding to the event loop."""
+        await asyncio.sleep(0)
+        return super().__call__(*args, **kwargs)
+
+
+class TestSiteBatch(unittest.TestCase):
+    """Test building several sites in one process."""
+
+    def setUp(self):
+        """Create config files for two sites."""
+        self.tmp = tempfile.mkdtemp()
+        del RUNS[:]
+
+    def tearDown(self):
+        """Remove the config files."""
+        shutil.rmtree(self.tmp)
+
+    def make_site(self, name, section, task_class=CountTask):
+        """Return an engine for a site with one count task."""
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=count\ncache_dir=%s\n'
+                       '[count]\ntask=count\n%s\n' % (
+                           os.path.join(self.tmp, 'cache'), section))
+        site = InterfaceCore()
+        site.config_file = ConfigFile(path)
+        site.config_file.load()
+        site.tasks = {'count': task_class}
+        site.skip, site.no_cache = [], True
+        return site
+
+    def test_dedup(self):
+        """Ensure identical tasks run once and share their results."""
+        sites = [self.make_site('a.cfg', 'x=1'),
+                 self.make_site('b.cfg', 'x=1')]
+        self.assertEqual(SiteBatch(sites, 2).run(), 0)
+        self.assertEqual(len(RUNS), 1)
+        for site in sites:
+            self.assertEqual(dict(site.shared_state.view()),
+                             {'counted': True})
+
+    def test_dedup_async(self):
+        """Ensure identical coroutine tasks run once across sites."""
+        sites = [self.make_site('a.cfg', 'x=1', AsyncCountTask),
+                 self.make_site('b.cfg', 'x=1', AsyncCountTask)]
+        self.assertEqual(SiteBatch(sites, 2).run(), 0)
+        self.assertEqual(len(RUNS), 1)
+        for site in sites:
+            self.assertEqual(dict(site.shared_state.view()),
+                             {'counted': True})
+
+    def test_distinct(self):
+        """Ensure tasks with different config run for each site."""
+        sites = [self.make_site('a.cfg', 'x=1'),
+                 self.make_site('b.cfg', 'x=2')]
+        self.assertEqual(SiteBatch(sites, 2).run(), 0)
+        self.assertEqual(len(RUNS), 2)
+
+    def test_read_manifest(self):
+        """Ensure manifests skip comments and resolve relative paths."""
+        path = os.path.join(self.tmp, 'sites.txt')
+        with open(path, 'w') as fout:
+            fout.write('# sites\na.cfg\n\n/abs/b.cfg\n')
+        self.assertEqual(read_manifest(path),
+                         [os.path.join(self.tmp, 'a.cfg'), '/abs/b.cfg'])
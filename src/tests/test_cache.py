@@ -0,0 +1,151 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's cache module."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.cache import BuildCache
+from escadrille.cache import hash_file
+from escadrille.config import ConfigFile
+from escadrille.core import InterfaceCore
+from escadrille.state import SharedState
+from escadrille.tasks.core import Task
+
+
+class UpperTask(Task):
+    """Test task writing an upper case copy of its input file."""
+
+    config_name = 'upper'
+    cacheable = True
+
+    def __init__(self, *args, **kwargs):
+        """Count the number of times the task really runs."""
+        self.runs = 0
+        super().__init__(*args, **kwargs)
+
+    def _load_config(self):
+        """Load the input and output paths."""
+        self.source = self.config_file.get(self.tag, 'source')
+        self.dest = self.config_file.get(self.tag, 'dest')
+        super()._load_config()
+
+    def input_paths(self):
+        """Return the input file."""
+        return [self.source]
+
+    def output_paths(self):
+        """Return the output file."""
+        return [self.dest]
+
+    def __call__(self, *args, **kwargs):
+        """Write the upper case copy."""
+        super().__call__(*args, **kwargs)
+        self.runs += 1
+        with open(self.source) as fin, open(self.dest, 'w') as fout:
+            fout.write(fin.read().upper())
+        self._set_status()
+        self.shared_state['upper'] = self.dest
+        return self.shared_state
+
+
+class RequiringTask(UpperTask):
+    """UpperTask declaring the one state key it reads."""
+
+    requires = ['wanted']
+
+
+class TestBuildCache(unittest.TestCase):
+    """Test the logic of escadrille.cache.BuildCache."""
+
+    def setUp(self):
+        """Create a config file and input file for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.source = os.path.join(self.tmp, 'in.txt')
+        self.dest = os.path.join(self.tmp, 'out.txt')
+        with open(self.source, 'w') as fout:
+            fout.write('hello')
+        config = os.path.join(self.tmp, 'test.cfg')
+        with open(config, 'w') as fout:
+            fout.write('[upper]\ntask=upper\nsource=%s\ndest=%s\n' %
+                       (self.source, self.dest))
+        self.config_file = ConfigFile(config)
+        self.config_file.load()
+        self.cache = BuildCache(os.path.join(self.tmp, 'cache'))
+
+    def tearDown(self):
+        """Remove the temporary files."""
+        shutil.rmtree(self.tmp)
+
+    def run_task(self, state=None, cls=UpperTask):
+        """Run a new UpperTask through the engine with the cache."""
+        view = SharedState(state).view()
+        task = cls(config_file=self.config_file, tag='upper',
+                   shared_state=view)
+        new_state = InterfaceCore.run_task(task, view, self.cache)
+        return task, new_state
+
+    def test_replay(self):
+        """Ensure an unchanged task is replayed and its outputs restored."""
+        task, _ = self.run_task()
+        self.assertEqual(task.runs, 1)
+        os.remove(self.dest)
+        task, new_state = self.run_task()
+        self.assertEqual(task.runs, 0)
+        self.assertEqual(task.status, 0)
+        self.assertEqual(dict(new_state), {'upper': self.dest})
+        with open(self.dest) as fin:
+            self.assertEqual(fin.read(), 'HELLO')
+
+    def test_invalidation(self):
+        """Ensure changes to inputs or shared state rerun the task."""
+        self.run_task()
+        task, _ = self.run_task({'other': 1})
+        self.assertEqual(task.runs, 1)
+        with open(self.source, 'w') as fout:
+            fout.write('changed input')
+        task, _ = self.run_task({'other': 1})
+        self.assertEqual(task.runs, 1)
+        with open(self.dest) as fin:
+            self.assertEqual(fin.read(), 'CHANGED INPUT')
+
+    def test_required_state(self):
+        """Ensure only the required shared state keys are fingerprinted."""
+        self.run_task({'wanted': 1, 'other': 1}, RequiringTask)
+        task, _ = self.run_task({'wanted': 1, 'other': 2}, RequiringTask)
+        self.assertEqual(task.runs, 0)
+        task, _ = self.run_task({'wanted': 2, 'other': 2}, RequiringTask)
+        self.assertEqual(task.runs, 1)
+
+    def test_linked_blobs(self):
+        """Ensure outputs are linked and blobs changed in place are unused."""
+        self.run_task()
+        blobs = os.path.join(self.tmp, 'cache', 'blobs')
+        self.assertEqual(os.stat(self.dest).st_nlink, 2)
+        self.assertEqual([fname for _, _, fnames in os.walk(blobs)
+                          for fname in fnames], [os.path.basename(
+                              self.cache._blob_path(hash_file(self.dest)))])
+        # rewriting the output in place also rewrites the linked blob
+        with open(self.dest, 'w') as fout:
+            fout.write('CHANGED')
+        task, _ = self.run_task()
+        self.assertEqual(task.runs, 1)
+        with open(self.dest) as fin:
+            self.assertEqual(fin.read(), 'HELLO')
+        os.remove(self.dest)
+        task, _ = self.run_task()
+        self.assertEqual(task.runs, 0)
+        with open(self.dest) as fin:
+            self.assertEqual(fin.read(), 'HELLO')
@@ -0,0 +1,209 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's media catalog."""
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.catalog import DATE_TIME_ORIGINAL
+from escadrille.catalog import EXIF_IFD
+from escadrille.catalog import ORIENTATION
+from escadrille.catalog import MediaCatalog
+from escadrille.catalog import exif_date
+from escadrille.config import ConfigFile
+from escadrille.state import SharedState
+from escadrille.tasks.galleries import GalleriesTask
+
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
+
+
+class TestMediaCatalog(unittest.TestCase):
+    """Test the catalog of image metadata."""
+
+    def setUp(self):
+        """Create a temporary directory for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmp, 'galleries')
+        os.makedirs(os.path.join(self.root, 'trip', 'thumbs'))
+        self.catalog = MediaCatalog(os.path.join(self.tmp, 'catalog.sqlite'))
+        self.catalog.open()
+
+    def tearDown(self):
+        """Close the catalog and remove the temporary directory."""
+        self.catalog.close()
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data=b'data'):
+        """Write a file in the galleries directory and return its path."""
+        path = os.path.join(self.root, name)
+        with open(path, 'wb') as fout:
+            fout.write(data)
+        return path
+
+    @staticmethod
+    def skip(dirpath):
+        """Return True for the thumbnail directories."""
+        return os.path.basename(dirpath) == 'thumbs'
+
+    def test_exif_date(self):
+        """Ensure EXIF dates are converted to sortable dates."""
+        self.assertEqual(exif_date('2017:08:27 10:11:12\x00'),
+                         '2017-08-27 10:11:12')
+        self.assertIsNone(exif_date(''))
+        self.assertIsNone(exif_date(None))
+
+    def test_scan(self):
+        """Ensure only new or changed images are read."""
+        first = self.write('trip/a.jpg')
+        self.write('trip/b.png')
+        self.write('trip/notes.txt')
+        self.write('trip/thumbs/a.png')
+        self.assertEqual(self.catalog.scan(self.root, skip=self.skip),
+                         (2, 0))
+        self.assertEqual(self.catalog.scan(self.root, skip=self.skip),
+                         (0, 0))
+        self.assertEqual(self.catalog.directories(self.root),
+                         [os.path.join(self.root, 'trip')])
+        self.assertEqual([record.name for record in self.catalog.images(
+            os.path.join(self.root, 'trip'))], ['a.jpg', 'b.png'])
+        self.write('trip/a.jpg', b'changed')
+        os.remove(os.path.join(self.root, 'trip', 'b.png'))
+        self.assertEqual(self.catalog.scan(self.root, skip=self.skip),
+                         (1, 1))
+        record = self.catalog.get(first)
+        self.assertEqual(record.size, len(b'changed'))
+        # unreadable images are catalogued without metadata
+        self.assertIsNone(record.width)
+
+    def test_scan_root(self):
+        """Ensure scanning a directory keeps the images outside of it."""
+        self.write('trip/a.jpg')
+        os.makedirs(os.path.join(self.tmp, 'galleries2'))
+        with open(os.path.join(self.tmp, 'galleries2', 'b.jpg'), 'wb'):
+            pass
+        self.catalog.scan(self.root)
+        self.assertEqual(self.catalog.scan(os.path.join(
+            self.tmp, 'galleries2')), (1, 0))
+        self.assertEqual(self.catalog.scan(self.root), (0, 0))
+
+    def test_read_only(self):
+        """Ensure a read only catalog reads without writing."""
+        import sqlite3
+        self.write('trip/a.jpg')
+        self.catalog.scan(self.root)
+        path = os.path.join(self.tmp, 'catalog.sqlite')
+        mtime = os.stat(path).st_mtime_ns
+        with MediaCatalog(path, read_only=True) as catalog:
+            self.assertEqual([record.name for record in catalog.iter_images(
+                os.path.join(self.root, 'trip'))], ['a.jpg'])
+            connection = catalog.connection
+            with self.assertRaises(sqlite3.OperationalError):
+                connection.execute('DELETE FROM images')
+        with MediaCatalog(path, read_only=True) as catalog:
+            self.assertIs(catalog.connection, connection)
+        self.assertEqual(os.stat(path).st_mtime_ns, mtime)
+
+    def test_order(self):
+        """Ensure an unknown order is an error."""
+        with self.assertRaises(ValueError):
+            self.catalog.images(self.root, 'size')
+
+
+@unittest.skipUnless(HAVE_PILLOW, 'image metadata needs Pillow')
+class TestCatalogGalleries(unittest.TestCase):
+    """Test galleries listed from the catalog."""
+
+    def setUp(self):
+        """Create a gallery of images with capture dates."""
+        from PIL import Image
+        self.tmp = tempfile.mkdtemp()
+        self.gallery = os.path.join(self.tmp, 'galleries', 'trip')
+        os.makedirs(self.gallery)
+        images = [('a.jpg', '2017:08:27 10:00:00', 1),
+                  ('b.jpg', '2017:08:26 10:00:00', 6),
+                  ('c.jpg', None, None)]
+        for name, taken, orientation in images:
+            exif = Image.Exif()
+            if taken:
+                exif.get_ifd(EXIF_IFD)[DATE_TIME_ORIGINAL] = taken
+            if orientation:
+                exif[ORIENTATION] = orientation
+            Image.new('RGB', (400, 300)).save(
+                os.path.join(self.gallery, name), exif=exif)
+        with open(os.path.join(self.gallery, 'notes.txt'), 'w') as fout:
+            fout.write('not an image')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def run_task(self, section=''):
+        """Run the galleries task with the catalog and return the page."""
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=gal\ncache_dir=%s\n'
+                       '[gal]\ntask=galleries\ngalleries=%s\n'
+                       'output_dir=%s\ncatalog=true\n%s' % (
+                           os.path.join(self.tmp, 'cache'),
+                           os.path.join(self.tmp, 'galleries'),
+                           os.path.join(self.tmp, 'pages'), section))
+        os.makedirs(os.path.join(self.tmp, 'pages'), exist_ok=True)
+        config_file = ConfigFile(path)
+        config_file.load()
+        task = GalleriesTask(config_file=config_file, tag='gal',
+                             shared_state=SharedState().view())
+        task()
+        self.assertEqual(task.errors, [])
+        with open(os.path.join(self.tmp, 'pages', 'trip.rst'), 'r') as fin:
+            return fin.read()
+
+    def test_metadata(self):
+        """Ensure the capture date, orientation and dimensions are read."""
+        with MediaCatalog(os.path.join(self.tmp, 'catalog.sqlite')) as cat:
+            cat.scan(os.path.join(self.tmp, 'galleries'))
+            records = {record.name: record for record in cat.images(
+                self.gallery, 'date')}
+        self.assertEqual(list(records), ['b.jpg', 'a.jpg', 'c.jpg'])
+        self.assertEqual(records['a.jpg'].taken, '2017-08-27 10:00:00')
+        self.assertEqual((records['a.jpg'].width, records['a.jpg'].height),
+                         (400, 300))
+        # rotated images are catalogued with their displayed dimensions
+        self.assertEqual((records['b.jpg'].width, records['b.jpg'].height),
+                         (300, 400))
+        self.assertEqual(records['b.jpg'].orientation, 6)
+
+    def test_galleries(self):
+        """Ensure the pages list the images with their dimensions."""
+        page = self.run_task()
+        self.assertNotIn('notes.txt', page)
+        self.assertIn('<img src="../images/trip/a.jpg" style="width: 300px; '
+                      'height: auto" width="400" height="300"/>', page)
+        self.assertLess(page.index('a.jpg'), page.index('b.jpg'))
+
+    def test_date_order(self):
+        """Ensure the images are sorted by capture date."""
+        page = self.run_task('order=date\n')
+        self.assertLess(page.index('b.jpg'), page.index('a.jpg'))
+        self.assertLess(page.index('a.jpg'), page.index('c.jpg'))
+
+    def test_hashes(self):
+        """Ensure thumbnails are made with the hashes of the catalog."""
+        page = self.run_task('thumbs_dir=%s\n' % os.path.join(self.tmp,
+                                                              'images'))
+        self.assertIn('../images/trip/thumbs/a.png', page)
+        cache = os.path.join(self.tmp, 'cache', 'images')
+        self.assertFalse(os.path.exists(os.path.join(cache, 'hashes.json')))
+        self.assertTrue(os.path.exists(os.path.join(cache, 'catalog.sqlite')))
@@ -0,0 +1,69 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's checkpoint module."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.checkpoint import Checkpoint
+from escadrille.state import SharedState
+
+
+class TestCheckpoint(unittest.TestCase):
+    """Test the logic of escadrille.checkpoint.Checkpoint."""
+
+    def setUp(self):
+        """Create a checkpoint log for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.checkpoint = Checkpoint(os.path.join(self.tmp, 'ckpt', 'a.pkl'))
+        self.checkpoint.start()
+
+    def tearDown(self):
+        """Remove the checkpoint log."""
+        shutil.rmtree(self.tmp)
+
+    def record(self, tag, shared_state, **changes):
+        """Commit and record a task's changes to the shared state."""
+        view = shared_state.view()
+        view.update(changes)
+        shared_state.commit(view, view)
+        self.checkpoint.record(tag, view)
+
+    def test_restore(self):
+        """Ensure the recorded tasks and their state are restored."""
+        shared_state = SharedState()
+        self.record('first', shared_state, a=1)
+        self.checkpoint.record('quiet', None)
+        self.record('second', shared_state, a=2, b=3)
+        records = self.checkpoint.load()
+        self.assertEqual(list(records), ['first', 'quiet', 'second'])
+        restored = self.checkpoint.restore(records)
+        self.assertEqual(dict(restored.view()), {'a': 2, 'b': 3})
+
+    def test_truncated(self):
+        """Ensure a partially written record is ignored."""
+        self.record('first', SharedState(), a=1)
+        with open(self.checkpoint.path, 'ab') as fout:
+            fout.write(b'\x80\x04\x95')
+        self.assertEqual(list(self.checkpoint.load()), ['first'])
+
+    def test_start_keeps_records(self):
+        """Ensure a resumed run keeps the records of the skipped tasks."""
+        self.record('first', SharedState(), a=1)
+        self.record('second', SharedState(), b=1)
+        records = self.checkpoint.load()
+        del records['second']
+        self.checkpoint.start(records)
+        self.assertEqual(self.checkpoint.load(), {'first': ({'a': 1}, [])})
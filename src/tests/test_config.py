@@ -0,0 +1,113 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's config module."""
+import os
+import shutil
+import tempfile
+import unittest
+from configparser import InterpolationError
+
+from escadrille.config import ConfigFile
+
+CONFIG = '''[general]
+tmp_dir=/tmp/site
+enabled_tasks=clean  docs
+jobs=3
+[docs]
+task=rst2dtree
+inputs=${general:tmp_dir}/staging
+flag=yes
+'''
+
+
+class NoParseConfigFile(ConfigFile):
+    """ConfigFile that fails if the config file is parsed."""
+
+    def parse(self):
+        """Fail the test."""
+        raise AssertionError('the config file was parsed')
+
+
+class TestConfigFile(unittest.TestCase):
+    """Test compiling and caching config files."""
+
+    def setUp(self):
+        """Write a config file for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'site.cfg')
+        self.cache = os.path.join(self.tmp, 'configs')
+        with open(self.path, 'w') as fout:
+            fout.write(CONFIG)
+
+    def tearDown(self):
+        """Remove the config file and cache."""
+        shutil.rmtree(self.tmp)
+
+    def load(self, cls=ConfigFile):
+        """Return the loaded config file."""
+        config_file = cls(self.path, compile_cache=self.cache)
+        config_file.load()
+        return config_file
+
+    def test_compiled(self):
+        """Ensure options are interpolated, typed and frozen."""
+        config_file = self.load()
+        self.assertEqual(config_file.get('docs', 'inputs'),
+                         '/tmp/site/staging')
+        self.assertIsNone(config_file.get('docs', 'bogus'))
+        self.assertIsNone(config_file.get('bogus', 'task'))
+        self.assertTrue(config_file.getboolean('docs', 'flag'))
+        self.assertEqual(config_file.enabled_tasks, ['clean', 'docs'])
+        self.assertEqual(config_file.jobs, 3)
+        self.assertEqual(config_file.date_format, '%Y-%m-%d %H:%M')
+        with self.assertRaises(TypeError):
+            config_file.section('docs')['task'] = 'clean'
+
+    def test_defaults(self):
+        """Ensure unloaded config files use the default options."""
+        config_file = ConfigFile(self.path)
+        self.assertEqual(config_file.enabled_tasks, [])
+        self.assertEqual(config_file.jobs, 1)
+        self.assertIsNone(config_file.get('docs', 'task'))
+
+    def test_cache(self):
+        """Ensure the compiled config is reused until the file changes."""
+        self.load()
+        config_file = self.load(NoParseConfigFile)
+        self.assertEqual(config_file.get('docs', 'inputs'),
+                         '/tmp/site/staging')
+        with open(self.path, 'a') as fout:
+            fout.write('extra=1\n')
+        self.assertRaises(AssertionError, self.load, NoParseConfigFile)
+        self.assertEqual(self.load().get('docs', 'extra'), '1')
+
+    def test_cache_missing(self):
+        """Ensure creating a missing config file invalidates the cache."""
+        os.remove(self.path)
+        self.assertEqual(self.load().enabled_tasks, [])
+        self.assertEqual(self.load(NoParseConfigFile).enabled_tasks, [])
+        with open(self.path, 'w') as fout:
+            fout.write(CONFIG)
+        self.assertEqual(self.load().enabled_tasks, ['clean', 'docs'])
+
+    def test_interpolation_error(self):
+        """Ensure options that cannot be interpolated only fail on lookup."""
+        with open(self.path, 'a') as fout:
+            fout.write('[notes]\nnote=costs $5\nother=${docs:task}\n')
+        for config_file in [self.load(), self.load(NoParseConfigFile)]:
+            self.assertEqual(config_file.get('notes', 'other'), 'rst2dtree')
+            self.assertEqual(config_file.section('notes')['note'],
+                             'costs $5')
+            with self.assertRaises(InterpolationError):
+                config_file.get('notes', 'note')
@@ -0,0 +1,75 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's doctrees module."""
+import pickle
+import unittest
+
+from escadrille.doctrees import DoctreeCache
+from escadrille.doctrees import DoctreeHandle
+
+
+class FakeHandle(DoctreeHandle):
+    """Handle of a fake doctree counting its reads."""
+
+    reads = 0
+
+    def read(self):
+        """Return a fake doctree and its size, the digest."""
+        FakeHandle.reads += 1
+        return {'title': self.path}, self.digest
+
+
+class TestDoctreeCache(unittest.TestCase):
+    """Test the size bounded LRU cache of doctrees."""
+
+    def setUp(self):
+        """Reset the read count."""
+        FakeHandle.reads = 0
+
+    def test_shared(self):
+        """Ensure a doctree is read once and shared by equal handles."""
+        cache = DoctreeCache(100)
+        first = cache.get(FakeHandle('a', 'a.rst', 10))
+        self.assertIs(cache.get(FakeHandle('a', 'a.rst', 10)), first)
+        self.assertEqual(FakeHandle.reads, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # a different digest is a different doctree
+        cache.get(FakeHandle('a', 'a.rst', 20))
+        self.assertEqual(FakeHandle.reads, 2)
+
+    def test_eviction(self):
+        """Ensure the least recently used doctrees are evicted by size."""
+        cache = DoctreeCache(100)
+        for name in 'abc':
+            cache.get(FakeHandle(name, name + '.rst', 40))
+        self.assertEqual(list(cache.entries),
+                         [FakeHandle('b', 'b.rst', 40),
+                          FakeHandle('c', 'c.rst', 40)])
+        cache.get(FakeHandle('b', 'b.rst', 40))
+        cache.get(FakeHandle('d', 'd.rst', 40))
+        self.assertEqual(list(cache.entries),
+                         [FakeHandle('b', 'b.rst', 40),
+                          FakeHandle('d', 'd.rst', 40)])
+        self.assertEqual(cache.size, 80)
+        cache.resize(50)
+        self.assertEqual(list(cache.entries), [FakeHandle('d', 'd.rst', 40)])
+        # too big to be cached at all
+        cache.get(FakeHandle('e', 'e.rst', 60))
+        self.assertEqual(cache.size, 40)
+
+    def test_pickle(self):
+        """Ensure handles survive pickling, for the checkpoint and cache."""
+        handle = FakeHandle('a', 'a.rst', 10)
+        self.assertEqual(pickle.loads(pickle.dumps(handle)), handle)
+        self.assertEqual(repr(handle), "FakeHandle('a', 'a.rst', 10)")
@@ -0,0 +1,163 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's galleries task."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.state import SharedState
+from escadrille.tasks.galleries import GalleriesTask
+
+
+class ListingTask(GalleriesTask):
+    """Galleries task counting the gallery listings, making no images."""
+
+    listed = []
+
+    def gallery_images(self, dirpath):
+        """Count the listings of a gallery."""
+        self.listed.append(os.path.basename(dirpath))
+        return super().gallery_images(dirpath)
+
+    def make_gallery_images(self, jobs, hashes=None):
+        """Make no images."""
+        self.thumbnails = [dest for _, dest, _ in jobs]
+        return {}
+
+
+class TestGalleries(unittest.TestCase):
+    """Test writing the gallery pages."""
+
+    def setUp(self):
+        """Create galleries of fake images for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.pages = os.path.join(self.tmp, 'pages')
+        self.stubs = os.path.join(self.tmp, 'stubs')
+        os.makedirs(self.pages)
+        os.makedirs(self.stubs)
+        for gallery, count in [('trip', 5), ('home', 1)]:
+            path = os.path.join(self.tmp, 'galleries', gallery)
+            os.makedirs(path)
+            for index in range(count):
+                with open(os.path.join(path, 'img%d.jpg' % index), 'w'):
+                    pass
+        with open(os.path.join(self.stubs, 'trip.rst'), 'w') as fout:
+            fout.write('Trip\n####\n')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def run_task(self, section='', cls=GalleriesTask):
+        """Run the galleries task and return it."""
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=gal\n'
+                       '[gal]\ntask=galleries\ngalleries=%s\n'
+                       'output_dir=%s\nstubs=%s\n%s' % (
+                           os.path.join(self.tmp, 'galleries'), self.pages,
+                           self.stubs, section))
+        config_file = ConfigFile(path)
+        config_file.load()
+        task = cls(config_file=config_file, tag='gal',
+                   shared_state=SharedState().view())
+        task()
+        self.assertEqual(task.errors, [])
+        return task
+
+    def read(self, name):
+        """Return the content of a written page."""
+        with open(os.path.join(self.pages, name), 'r') as fin:
+            return fin.read()
+
+    def test_single_page(self):
+        """Ensure every image is on one page by default."""
+        self.run_task()
+        self.assertEqual(sorted(os.listdir(self.pages)),
+                         ['home.rst', 'trip.rst'])
+        page = self.read('trip.rst')
+        self.assertTrue(page.startswith('Trip\n'))
+        self.assertEqual(page.count('data-lightbox'), 5)
+        self.assertNotIn('gallery-pages', page)
+
+    def test_pages(self):
+        """Ensure page_size splits galleries into linked pages."""
+        task = self.run_task('page_size=2\n')
+        self.assertEqual(sorted(os.listdir(self.pages)), [
+            'home.rst', 'trip-page-2.rst', 'trip-page-3.rst', 'trip.rst'])
+        self.assertEqual(len(task.output_paths()), 4)
+        first, second, last = [self.read(name) for name in [
+            'trip.rst', 'trip-page-2.rst', 'trip-page-3.rst']]
+        self.assertTrue(first.startswith('Trip\n'))
+        self.assertIn('img1.jpg', first)
+        self.assertNotIn('img2.jpg', first)
+        self.assertIn('href="{filename}trip-page-2.rst" rel="next"', first)
+        self.assertNotIn('rel="prev"', first)
+        # later pages of a stubbed gallery get a generated header
+        self.assertIn('trip (2)', second)
+        self.assertIn('href="{filename}trip.rst" rel="prev"', second)
+        self.assertIn('href="{filename}trip-page-3.rst" rel="next"', second)
+        self.assertEqual(last.count('data-lightbox'), 1)
+        self.assertNotIn('rel="next"', last)
+        self.assertNotIn('gallery-pages', self.read('home.rst'))
+
+    def test_shrinking(self):
+        """Ensure the pages a gallery no longer has are removed."""
+        self.run_task('page_size=2\n')
+        os.remove(os.path.join(self.tmp, 'galleries', 'trip', 'img4.jpg'))
+        self.run_task('page_size=2\n')
+        self.assertEqual(sorted(os.listdir(self.pages)), [
+            'home.rst', 'trip-page-2.rst', 'trip.rst'])
+        self.assertNotIn('rel="next"', self.read('trip-page-2.rst'))
+        self.run_task('page_size=5\n')
+        self.assertEqual(sorted(os.listdir(self.pages)),
+                         ['home.rst', 'trip.rst'])
+
+    def test_writers(self):
+        """Ensure parallel writers write the same pages in the same order."""
+        expected = self.run_task('page_size=2\n').output_paths()
+        pages = {name: self.read(name) for name in os.listdir(self.pages)}
+        shutil.rmtree(self.pages)
+        os.makedirs(self.pages)
+        task = self.run_task('page_size=2\nwriters=4\n')
+        self.assertEqual(task.output_paths(), expected)
+        self.assertEqual({name: self.read(name) for name in os.listdir(
+            self.pages)}, pages)
+
+    def test_made_dirs(self):
+        """Ensure only the directories of made images are not galleries."""
+        path = os.path.join(self.tmp, 'galleries', 'sizes')
+        os.makedirs(os.path.join(path, 'thumbs'))
+        with open(os.path.join(path, 'img0.jpg'), 'w'):
+            pass
+        task = self.run_task()
+        self.assertIn('sizes.rst', os.listdir(self.pages))
+        self.assertNotIn('sizes-thumbs.rst', os.listdir(self.pages))
+        # with the made images in the galleries directory
+        task.thumbs_dir = os.path.join(self.tmp, 'galleries')
+        os.makedirs(os.path.join(self.tmp, 'galleries', 'trip', 'sizes'))
+        self.assertTrue(task.skip_dir(os.path.join(
+            self.tmp, 'galleries', 'trip', 'sizes')))
+        self.assertFalse(task.skip_dir(path))
+
+    def test_listed_once(self):
+        """Ensure galleries are listed once for their images and pages."""
+        ListingTask.listed = []
+        task = self.run_task('page_size=2\nthumbs_dir=%s\n' % os.path.join(
+            self.tmp, 'images'), ListingTask)
+        self.assertEqual(sorted(ListingTask.listed), ['home', 'trip'])
+        self.assertEqual(len(task.thumbnails), 6)
+        self.assertIn('thumbs/img4.png', self.read('trip-page-3.rst'))
@@ -0,0 +1,187 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's images module and the gallery thumbnails."""
+import importlib.util
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.images import ImageCache
+from escadrille.images import make_images
+from escadrille.images import thumb_name
+from escadrille.state import SharedState
+from escadrille.tasks.galleries import GalleriesTask
+
+HAVE_PILLOW = importlib.util.find_spec('PIL') is not None
+
+
+class TestImageCache(unittest.TestCase):
+    """Test the content addressed cache of resized images."""
+
+    def setUp(self):
+        """Create a temporary directory for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.cache = ImageCache(os.path.join(self.tmp, 'cache'))
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, data):
+        """Write a fake image and return its path."""
+        path = os.path.join(self.tmp, name)
+        with open(path, 'wb') as fout:
+            fout.write(data)
+        return path
+
+    def test_thumb_name(self):
+        """Ensure JPEG thumbnails are PNGs."""
+        self.assertEqual(thumb_name('a.jpg'), 'a.png')
+        self.assertEqual(thumb_name('a.gif'), 'a.gif')
+
+    def test_cached_path(self):
+        """Ensure the cache key is the content and the parameters."""
+        first = self.write('a.jpg', b'one')
+        copy = self.write('b.jpg', b'one')
+        params = {'width': 10, 'height': 10}
+        cached = self.cache.cached_path(first, 'a.png', params)
+        self.assertEqual(self.cache.cached_path(copy, 'b.png', params),
+                         cached)
+        self.assertTrue(cached.endswith('.png'))
+        self.assertNotEqual(self.cache.cached_path(
+            first, 'a.png', {'width': 20, 'height': 20}), cached)
+        self.write('a.jpg', b'changed')
+        self.assertNotEqual(self.cache.cached_path(first, 'a.png', params),
+                            cached)
+
+    def test_hashes(self):
+        """Ensure the hashes of unchanged images are remembered."""
+        path = self.write('a.jpg', b'one')
+        digest = self.cache.source_hash(path)
+        self.cache.store_hashes()
+        cache = ImageCache(self.cache.path)
+        self.assertEqual(cache.source_hash(path), digest)
+        self.assertEqual(list(cache.hashes), [path])
+
+
+@unittest.skipUnless(HAVE_PILLOW, 'thumbnails need Pillow')
+class TestThumbnails(unittest.TestCase):
+    """Test making the thumbnails of the gallery images."""
+
+    def setUp(self):
+        """Create a gallery of images for each unittest."""
+        from PIL import Image
+        self.tmp = tempfile.mkdtemp()
+        self.gallery = os.path.join(self.tmp, 'galleries', 'trip')
+        os.makedirs(self.gallery)
+        for index, size in enumerate([(800, 600), (200, 100), (600, 900)]):
+            Image.new('RGB', size, (index * 80, 0, 0)).save(
+                os.path.join(self.gallery, 'img%d.jpg' % index))
+        with open(os.path.join(self.gallery, 'notes.txt'), 'w') as fout:
+            fout.write('not an image')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def run_task(self, section=''):
+        """Run the galleries task with thumbnails and return it."""
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=gal\ncache_dir=%s\n'
+                       '[gal]\ntask=galleries\ngalleries=%s\n'
+                       'output_dir=%s\nthumbs_dir=%s\nthumb_size=100\n%s' % (
+                           os.path.join(self.tmp, 'cache'),
+                           os.path.join(self.tmp, 'galleries'),
+                           os.path.join(self.tmp, 'pages'),
+                           os.path.join(self.tmp, 'images'), section))
+        os.makedirs(os.path.join(self.tmp, 'pages'), exist_ok=True)
+        config_file = ConfigFile(path)
+        config_file.load()
+        task = GalleriesTask(config_file=config_file, tag='gal',
+                             shared_state=SharedState().view())
+        task()
+        self.assertEqual(task.errors, [])
+        return task
+
+    def thumb_sizes(self):
+        """Return the sizes of the written thumbnails."""
+        from PIL import Image
+        thumbs = os.path.join(self.tmp, 'images', 'trip', 'thumbs')
+        sizes = {}
+        for fname in sorted(os.listdir(thumbs)):
+            with Image.open(os.path.join(thumbs, fname)) as image:
+                sizes[fname] = image.size
+        return sizes
+
+    def cached_images(self):
+        """Return the images in the image cache."""
+        return [fname for _, _, fnames in os.walk(os.path.join(
+            self.tmp, 'cache', 'images')) for fname in fnames
+                if fname.endswith('.png')]
+
+    def test_thumbnails(self):
+        """Ensure thumbnails are made and linked from the gallery page."""
+        task = self.run_task()
+        self.assertEqual(self.thumb_sizes(), {'img0.png': (100, 75),
+                                              'img1.png': (100, 50),
+                                              'img2.png': (67, 100)})
+        self.assertEqual(len(task.output_paths()), 4)
+        with open(os.path.join(self.tmp, 'pages', 'trip.rst'), 'r') as fin:
+            self.assertIn('<img src="../images/trip/thumbs/img0.png" '
+                          'width="100" height="75"/>', fin.read())
+
+    def test_cached(self):
+        """Ensure only new or changed images are resized."""
+        from PIL import Image
+        self.run_task()
+        self.assertEqual(make_images(ImageCache(os.path.join(
+            self.tmp, 'cache', 'images')), [], 1), (0, [], {}))
+        Image.new('RGB', (300, 300)).save(
+            os.path.join(self.gallery, 'img1.jpg'))
+        thumbs = os.path.join(self.tmp, 'images', 'trip', 'thumbs')
+        os.remove(os.path.join(thumbs, 'img0.png'))
+        cached = self.cached_images()
+        self.run_task()
+        self.assertEqual(len(self.cached_images()), len(cached) + 1)
+        self.assertEqual(self.thumb_sizes()['img1.png'], (100, 100))
+        self.assertIn('img0.png', os.listdir(thumbs))
+
+    def test_parallel(self):
+        """Ensure worker processes make the same thumbnails."""
+        self.run_task('workers=2\n')
+        self.assertEqual(len(self.thumb_sizes()), 3)
+
+    def test_variants(self):
+        """Ensure srcset variants are made for each width and linked."""
+        from PIL import Image
+        task = self.run_task('widths=600 300\nsizes=50vw\n')
+        sizes = os.path.join(self.tmp, 'images', 'trip', 'sizes')
+        with Image.open(os.path.join(sizes, 'img0-300.jpg')) as image:
+            self.assertEqual(image.size, (300, 225))
+        self.assertEqual(len(os.listdir(sizes)), 6)
+        self.assertEqual(len(task.output_paths()), 7)
+        self.assertFalse(os.path.exists(os.path.join(
+            self.tmp, 'images', 'trip', 'thumbs')))
+        with open(os.path.join(self.tmp, 'pages', 'trip.rst'), 'r') as fin:
+            page = fin.read()
+        prefix = '../images/trip/sizes/'
+        self.assertIn('<img src="%simg0-300.jpg" srcset="%simg0-300.jpg 300w, '
+                      '%simg0-600.jpg 600w" sizes="50vw" width="300" '
+                      'height="225"/>' % (prefix, prefix, prefix), page)
+        # variants no wider than a smaller one are left out of the srcset
+        self.assertIn('srcset="%simg1-300.jpg 200w" sizes="50vw" '
+                      'width="200" height="100"' % prefix, page)
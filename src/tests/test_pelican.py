@@ -0,0 +1,87 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's pelican task."""
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.doctrees import PickleHandle
+from escadrille.state import SharedState
+from escadrille.tasks.pelican import DOCTREES_SETTING
+from escadrille.tasks.pelican import PelicanTask
+
+
+class InstalledPelicanTask(PelicanTask):
+    """Pelican task for a python that can import pelican."""
+
+    @staticmethod
+    def pelican_importable():
+        """Pretend pelican is installed."""
+        return True
+
+
+class TestPelicanTask(unittest.TestCase):
+    """Test the pelican command and the doctree reader plugin index."""
+
+    def setUp(self):
+        """Create a temporary directory for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.handle = PickleHandle(os.path.join(self.tmp, 'page.pkl'),
+                                   os.path.join(self.tmp, 'page.rst'), 'abc')
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.tmp)
+
+    def make_task(self, section='', task_class=InstalledPelicanTask,
+                  dtrees=True):
+        """Return a pelican task, with a dtrees shared state by default."""
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=site\ntmp_dir=%s\n'
+                       '[site]\ntask=pelican\ninput_dir=%s\n%s' % (
+                           os.path.join(self.tmp, 'tmp'),
+                           os.path.join(self.tmp, 'content'), section))
+        config_file = ConfigFile(path)
+        config_file.load()
+        view = SharedState().view()
+        if dtrees:
+            view['dtrees'] = {'Page': self.handle}
+        task = task_class(config_file=config_file, tag='site',
+                          shared_state=view)
+        task.load_config()
+        return task
+
+    def test_reader_plugin(self):
+        """Ensure pelican runs with the plugin and an index of doctrees."""
+        command, env = self.make_task().command()
+        self.assertEqual(command[:3],
+                         [sys.executable, '-m', 'escadrille.pelican_reader'])
+        self.assertEqual(command[3], os.path.join(self.tmp, 'content'))
+        with open(env[DOCTREES_SETTING], 'rb') as fin:
+            index = pickle.load(fin)
+        self.assertEqual(index, {os.path.realpath(self.handle.source):
+                                 self.handle})
+
+    def test_plain_pelican(self):
+        """Ensure the pelican command is used when doctrees are not."""
+        for task in [self.make_task(dtrees=False),
+                     self.make_task('doctrees=false\n')]:
+            command, env = task.command()
+            self.assertEqual(command[0], 'pelican')
+            self.assertIsNone(env)
@@ -0,0 +1,66 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's lazy task registry."""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import escadrille
+from escadrille.tasks import load_tasks
+from escadrille.tasks.clean import CleanTask
+from escadrille.tasks.registry import MANIFEST_NAME
+from escadrille.tasks.registry import TaskRegistry
+
+
+class TestTaskRegistry(unittest.TestCase):
+    """Test the task manifest and the lazy task lookups."""
+
+    def setUp(self):
+        """Create a cache directory for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """Remove the cache directory."""
+        shutil.rmtree(self.tmp)
+
+    def test_manifest(self):
+        """Ensure the manifest is cached and maps names to locations."""
+        tasks = load_tasks(self.tmp)
+        self.assertIs(tasks['clean'], CleanTask)
+        with open(os.path.join(self.tmp, MANIFEST_NAME), 'r') as fin:
+            cached = json.load(fin)
+        self.assertEqual(cached['tasks']['clean'],
+                         'escadrille.tasks.clean:CleanTask')
+        self.assertEqual(load_tasks(self.tmp).locations, tasks.locations)
+
+    def test_unknown_task(self):
+        """Ensure unknown config names raise KeyError."""
+        self.assertRaises(KeyError, TaskRegistry({}).__getitem__, 'bogus')
+
+    def test_lazy_import(self):
+        """Ensure only the looked up task modules are imported."""
+        load_tasks(self.tmp)
+        code = ('import sys; from escadrille.tasks import load_tasks; '
+                'load_tasks(%r)["clean"]; '
+                'print(sorted(name for name in sys.modules '
+                'if name.startswith("escadrille.tasks.")))' % self.tmp)
+        src_dir = os.path.dirname(os.path.dirname(escadrille.__file__))
+        output = subprocess.check_output([sys.executable, '-c', code],
+                                         cwd=src_dir, universal_newlines=True)
+        self.assertIn('escadrille.tasks.clean', output)
+        self.assertNotIn('escadrille.tasks.rst2dtree', output)
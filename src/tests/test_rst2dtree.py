@@ -0,0 +1,175 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's rst2dtree task."""
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.doctrees import ArchiveHandle
+from escadrille.doctrees import load_doctree
+from escadrille.doctrees import read_connection
+from escadrille.state import SharedState
+from escadrille.tasks.rst2dtree import Rst2dtreeTask
+from escadrille.tasks.rst2dtree import get_parser
+
+
+class RecordingTask(Rst2dtreeTask):
+    """Rst2dtree task recording the sources it parses."""
+
+    parsed = None
+
+    def parse(self, pairs):
+        """Record the parsed sources."""
+        RecordingTask.parsed = sorted(os.path.basename(infile)
+                                      for _, infile in pairs)
+        return super().parse(pairs)
+
+
+class TestRst2dtreeTask(unittest.TestCase):
+    """Test parsing RST sources into pickled doctrees."""
+
+    def setUp(self):
+        """Write RST sources for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, 'src')
+        os.makedirs(os.path.join(self.src, 'sub'))
+        for index in range(5):
+            self.write('sub/page%d.rst' % index if index % 2 else
+                       'page%d.rst' % index,
+                       'Page %d\n======\n\nBody %d.\n' % (index, index))
+        # a document without a title cannot be added to the dtrees map
+        self.write('untitled.rst', 'Just a paragraph.\n')
+
+    def tearDown(self):
+        """Remove the sources and outputs."""
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        """Write an RST source file."""
+        with open(os.path.join(self.src, name), 'w') as fout:
+            fout.write(text)
+
+    def run_task(self, section='', out='out'):
+        """Run the task and return it with its shared state."""
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=docs\n'
+                       '[docs]\ntask=rst2dtree\ninputs=%s\noutput_dir=%s\n%s'
+                       % (self.src, os.path.join(self.tmp, out), section))
+        config_file = ConfigFile(path)
+        config_file.load()
+        task = RecordingTask(config_file=config_file, tag='docs',
+                             shared_state=SharedState().view())
+        return task, task()
+
+    def check(self, task, state):
+        """Ensure titled documents are parsed and the failure reported."""
+        dtrees = state['dtrees']
+        self.assertEqual(sorted(dtrees),
+                         ['Page %d' % index for index in range(5)])
+        self.assertEqual(load_doctree(dtrees['Page 3'])['title'], 'Page 3')
+        # loaded once and shared through the doctree cache
+        self.assertIs(dtrees['Page 3'].load(), dtrees['Page 3'].load())
+        self.assertEqual(task.status, 1)
+        self.assertEqual(len(task.errors), 1)
+        self.assertIn('untitled.rst', task.errors[0])
+
+    def test_sequential(self):
+        """Ensure files are parsed one at a time by default."""
+        self.check(*self.run_task())
+
+    def test_parallel(self):
+        """Ensure worker processes produce the same results."""
+        _, sequential = self.run_task()
+        task, state = self.run_task('workers=2\n', out='parallel')
+        self.check(task, state)
+        self.assertEqual(
+            [(title, handle.path.replace('/parallel/', '/out/'),
+              handle.digest) for title, handle in state['dtrees'].items()],
+            [(title, handle.path, handle.digest)
+             for title, handle in sequential['dtrees'].items()])
+
+    def test_incremental(self):
+        """Ensure only changed sources are parsed and deleted ones pruned."""
+        _, state = self.run_task()
+        deleted = state['dtrees']['Page 4'].path
+        self.write('page0.rst', 'Page Zero\n=========\n')
+        os.remove(os.path.join(self.src, 'page4.rst'))
+        task, state = self.run_task()
+        self.assertEqual(RecordingTask.parsed, ['page0.rst', 'untitled.rst'])
+        self.assertEqual(sorted(state['dtrees']),
+                         ['Page 1', 'Page 2', 'Page 3', 'Page Zero'])
+        self.assertFalse(os.path.exists(deleted))
+        self.assertEqual(task.status, 1)
+
+    def test_parser_reuse(self):
+        """Ensure a thread reuses one parser per settings."""
+        self.assertIs(get_parser(), get_parser({}))
+        self.assertIsNot(get_parser(), get_parser({'doctitle_xform': False}))
+
+    def test_settings_overrides(self):
+        """Ensure docutils settings from the config reach the parser."""
+        task, state = self.run_task(
+            'docutils_settings={"doctitle_xform": false}\n')
+        # without the title transform no document has a title
+        self.assertEqual(dict(state['dtrees']), {})
+        self.assertEqual(len(task.errors), 6)
+
+    def test_archive(self):
+        """Ensure doctrees are packed into one archive and loaded lazily."""
+        task, state = self.run_task('format=archive\n')
+        self.check(task, state)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'out')))
+        handle = state['dtrees']['Page 1']
+        self.assertIsInstance(handle, ArchiveHandle)
+        self.assertEqual(handle.path, os.path.join(self.tmp, 'out.sqlite'))
+        self.assertEqual(pickle.loads(pickle.dumps(handle)), handle)
+
+    def test_archive_read(self):
+        """Ensure doctrees are read through one read only connection."""
+        _, state = self.run_task('format=archive\n')
+        handle = state['dtrees']['Page 1']
+        stat = os.stat(handle.path)
+        self.assertEqual(handle.read()[0]['title'], 'Page 1')
+        self.assertIs(read_connection(handle.path),
+                      read_connection(handle.path))
+        with self.assertRaises(sqlite3.OperationalError):
+            read_connection(handle.path).execute(
+                'DELETE FROM doctrees').fetchall()
+        self.assertEqual(os.stat(handle.path).st_mtime_ns,
+                         stat.st_mtime_ns)
+        # reading never creates an archive
+        with self.assertRaises(OSError):
+            ArchiveHandle(handle.path + '.missing', handle.source,
+                          handle.digest).read()
+
+    def test_archive_incremental(self):
+        """Ensure the archive only gets the changed sources."""
+        _, state = self.run_task('format=archive\n')
+        unchanged = state['dtrees']['Page 1']
+        self.write('page0.rst', 'Page Zero\n=========\n')
+        os.remove(os.path.join(self.src, 'page4.rst'))
+        _, state = self.run_task('format=archive\n')
+        self.assertEqual(RecordingTask.parsed, ['page0.rst', 'untitled.rst'])
+        self.assertEqual(state['dtrees']['Page 1'], unchanged)
+        self.assertEqual(load_doctree(state['dtrees']['Page Zero'])['title'],
+                         'Page Zero')
+        self.assertNotIn('Page 4', state['dtrees'])
+        with self.assertRaises(KeyError):
+            ArchiveHandle(unchanged.path, os.path.join(self.src, 'page4.rst'),
+                          '').load()
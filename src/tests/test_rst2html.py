@@ -0,0 +1,133 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's rst2html task."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.state import SharedState
+from escadrille.tasks.rst2dtree import Rst2dtreeTask
+from escadrille.tasks.rst2html import Rst2htmlTask
+
+
+class RecordingTask(Rst2htmlTask):
+    """Rst2html task recording the pages it renders."""
+
+    rendered = None
+
+    def render(self, pairs):
+        """Record the rendered pages."""
+        RecordingTask.rendered = sorted(os.path.basename(outfile)
+                                        for outfile, _ in pairs)
+        return super().render(pairs)
+
+
+class TestRst2htmlTask(unittest.TestCase):
+    """Test rendering doctrees to HTML pages."""
+
+    def setUp(self):
+        """Write RST sources for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, 'src')
+        os.makedirs(self.src)
+        for index in range(4):
+            self.write('page%d.rst' % index,
+                       'Page %d\n======\n\nBody *%d*.\n' % (index, index))
+
+    def tearDown(self):
+        """Remove the sources and outputs."""
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        """Write an RST source file."""
+        with open(os.path.join(self.src, name), 'w') as fout:
+            fout.write(text)
+
+    def run_tasks(self, section='', dtree_section='', default_dir=False):
+        """Run the rst2dtree and rst2html tasks and return the html task."""
+        if not default_dir:
+            section += 'output_dir=%s\n' % os.path.join(self.tmp, 'html')
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=docs html\nstaging_dir=%s\n'
+                       '[docs]\ntask=rst2dtree\ninputs=%s\noutput_dir=%s\n%s'
+                       '[html]\ntask=rst2html\n%s' % (
+                           os.path.join(self.tmp, 'staging'), self.src,
+                           os.path.join(self.tmp, 'dtrees'), dtree_section,
+                           section))
+        config_file = ConfigFile(path)
+        config_file.load()
+        state = SharedState()
+        view = state.view()
+        Rst2dtreeTask(config_file=config_file, tag='docs',
+                      shared_state=view)()
+        task = RecordingTask(config_file=config_file, tag='html',
+                             shared_state=view)
+        return task, task()
+
+    def read(self, name):
+        """Return the text of a rendered page."""
+        with open(os.path.join(self.tmp, 'html', name), 'r') as fin:
+            return fin.read()
+
+    def check(self, task, state):
+        """Ensure every doctree is rendered to a whole page."""
+        self.assertEqual(task.status, 0)
+        self.assertEqual(sorted(state['html']),
+                         ['Page %d' % index for index in range(4)])
+        self.assertEqual(state['html']['Page 2'],
+                         os.path.join(self.tmp, 'html', 'page-2.html'))
+        page = self.read('page-2.html')
+        self.assertIn('<html', page)
+        self.assertIn('<em>2</em>', page)
+
+    def test_sequential(self):
+        """Ensure doctrees are rendered in process."""
+        self.check(*self.run_tasks())
+
+    def test_parallel(self):
+        """Ensure worker processes render the same pages."""
+        self.check(*self.run_tasks('workers=2\n', 'format=archive\n'))
+
+    def test_part(self):
+        """Ensure a part of the writer output can be written instead."""
+        self.run_tasks('part=body\n')
+        page = self.read('page-1.html')
+        self.assertNotIn('<html', page)
+        self.assertIn('<em>1</em>', page)
+
+    def test_incremental(self):
+        """Ensure only changed doctrees are rendered again."""
+        self.run_tasks()
+        self.write('page0.rst', 'Page 0\n======\n\nChanged.\n')
+        os.remove(os.path.join(self.src, 'page3.rst'))
+        _, state = self.run_tasks()
+        self.assertEqual(RecordingTask.rendered, ['page-0.html'])
+        self.assertIn('Changed.', self.read('page-0.html'))
+        self.assertNotIn('Page 3', state['html'])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tmp, 'html', 'page-3.html')))
+
+    def test_default_output_dir(self):
+        """Ensure pages are written to the staging directory by default."""
+        staging = os.path.join(self.tmp, 'staging')
+        task, state = self.run_tasks(default_dir=True)
+        self.assertEqual(task.status, 0)
+        self.assertEqual(state['html']['Page 2'],
+                         os.path.join(staging, 'page-2.html'))
+        self.assertEqual(task.manifest_path(),
+                         staging + task.manifest_suffix)
+        self.assertTrue(os.path.exists(task.manifest_path()))
@@ -0,0 +1,150 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's scheduler module."""
+import asyncio
+import threading
+import unittest
+from collections import OrderedDict
+
+import escadrille.scheduler as scheduler
+
+
+def make_edges():
+    """Return the edges of a typical site build."""
+    return OrderedDict([
+        ('clean', ([], ['clean'])),
+        ('make_dirs', (['clean'], ['dirs'])),
+        ('git_log', (['dirs'], ['staging'])),
+        ('galleries', (['dirs'], ['staging'])),
+        ('doctrees', (['staging'], ['dtrees'])),
+        ('pss', (None, None)),
+        ('upload', (['site'], [])),
+    ])
+
+
+class TestGraph(unittest.TestCase):
+    """Test the construction and selection of task graphs."""
+
+    def setUp(self):
+        """Build the graph for each unittest."""
+        self.graph = scheduler.build_graph(make_edges())
+
+    def test_build_graph(self):
+        """Ensure edges follow requires/provides and barriers."""
+        self.assertEqual(self.graph['clean'], set())
+        self.assertEqual(self.graph['git_log'], {'make_dirs'})
+        self.assertEqual(self.graph['galleries'], {'make_dirs'})
+        self.assertEqual(self.graph['doctrees'], {'git_log', 'galleries'})
+        self.assertEqual(self.graph['pss'], {'clean', 'make_dirs', 'git_log',
+                                             'galleries', 'doctrees'})
+        self.assertEqual(self.graph['upload'], {'pss'})
+
+    def test_select(self):
+        """Ensure selected tasks include their transitive dependencies."""
+        self.assertEqual(scheduler.select(self.graph, ['galleries']),
+                         ['clean', 'make_dirs', 'galleries'])
+        self.assertRaises(KeyError, scheduler.select, self.graph, ['bogus'])
+
+    def test_downstream(self):
+        """Ensure the consumers of a task are found transitively."""
+        self.assertEqual(scheduler.downstream(self.graph, ['galleries']),
+                         ['galleries', 'doctrees', 'pss', 'upload'])
+
+
+class TestScheduler(unittest.TestCase):
+    """Test the logic of escadrille.scheduler.Scheduler."""
+
+    def setUp(self):
+        """Build the graph for each unittest."""
+        self.graph = scheduler.build_graph(make_edges())
+
+    def test_sequential_order(self):
+        """Ensure a single job runs the tasks in config order."""
+        order = []
+        status = scheduler.Scheduler(self.graph, 1).run(
+            lambda tag: lambda: order.append(tag), lambda tag, _: 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(order, list(self.graph))
+
+    def test_concurrent(self):
+        """Ensure independent tasks are in flight at the same time."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def start(tag):
+            """Make the two independent tasks wait for each other."""
+            if tag in ('git_log', 'galleries'):
+                return barrier.wait
+            return lambda: None
+
+        status = scheduler.Scheduler(self.graph, 4).run(
+            start, lambda tag, _: 0)
+        self.assertEqual(status, 0)
+
+    def test_fail_fast(self):
+        """Ensure no tasks are started after a task fails."""
+        order = []
+        status = scheduler.Scheduler(self.graph, 1).run(
+            lambda tag: lambda: order.append(tag),
+            lambda tag, _: 3 if tag == 'make_dirs' else 0)
+        self.assertEqual(status, 3)
+        self.assertEqual(order, ['clean', 'make_dirs'])
+
+    def test_skip(self):
+        """Ensure skipped tasks still satisfy their dependents."""
+        order = []
+
+        def start(tag):
+            """Skip the make_dirs task."""
+            if tag == 'make_dirs':
+                return None
+            return lambda: order.append(tag)
+
+        scheduler.Scheduler(self.graph, 1).run(start, lambda tag, _: 0)
+        self.assertNotIn('make_dirs', order)
+        self.assertIn('upload', order)
+
+    def test_coroutine_work(self):
+        """Ensure coroutine work runs on the event loop thread."""
+        threads = {}
+
+        async def work(tag):
+            """Record the thread running the coroutine."""
+            await asyncio.sleep(0)
+            return threading.current_thread().name
+
+        status = scheduler.Scheduler(self.graph, 2).run(
+            work, lambda tag, name: threads.setdefault(tag, name) and 0)
+        self.assertEqual(status, 0)
+        self.assertEqual(set(threads), set(self.graph))
+        self.assertEqual(set(threads.values()), {'escadrille-asyncio'})
+
+    def test_coroutines_beside_pool(self):
+        """Ensure coroutines do not take the slot of a single job."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        def start(tag):
+            """Make a pooled and a coroutine task wait for each other."""
+            if tag == 'galleries':
+                return barrier.wait
+
+            async def work():
+                """Wait for the pooled task when git_log."""
+                if tag == 'git_log':
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, barrier.wait)
+            return work()
+
+        status = scheduler.Scheduler(self.graph, 1).run(
+            start, lambda tag, _: 0)
+        self.assertEqual(status, 0)
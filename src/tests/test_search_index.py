@@ -0,0 +1,138 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's search_index task."""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille.config import ConfigFile
+from escadrille.state import SharedState
+from escadrille.tasks.rst2dtree import Rst2dtreeTask
+from escadrille.tasks.search_index import SearchIndexTask
+
+
+class RecordingTask(SearchIndexTask):
+    """Search index task recording the documents it indexes."""
+
+    indexed = []
+
+    def index_document(self, title, handle):
+        """Record the indexed document."""
+        RecordingTask.indexed.append(title)
+        return super().index_document(title, handle)
+
+
+class TestSearchIndexTask(unittest.TestCase):
+    """Test building the search index from doctrees."""
+
+    def setUp(self):
+        """Write RST sources for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmp, 'src')
+        self.index = os.path.join(self.tmp, 'search')
+        os.makedirs(self.src)
+        self.write('apples.rst', 'Apples\n======\n\nRed fruit.\n\n'
+                   'Kinds\n-----\n\nGala and fuji apples.\n')
+        self.write('bananas.rst', 'Bananas\n=======\n\nYellow fruit.\n')
+        del RecordingTask.indexed[:]
+
+    def tearDown(self):
+        """Remove the sources and outputs."""
+        shutil.rmtree(self.tmp)
+
+    def write(self, name, text):
+        """Write an RST source file."""
+        with open(os.path.join(self.src, name), 'w') as fout:
+            fout.write(text)
+
+    def run_tasks(self, section=None):
+        """Run the rst2dtree and search_index tasks."""
+        if section is None:
+            section = 'output_dir=%s\n' % self.index
+        path = os.path.join(self.tmp, 'site.cfg')
+        with open(path, 'w') as fout:
+            fout.write('[general]\nenabled_tasks=docs search\n'
+                       'staging_dir=%s\n'
+                       '[docs]\ntask=rst2dtree\ninputs=%s\noutput_dir=%s\n'
+                       '[search]\ntask=search_index\n%s' % (
+                           os.path.join(self.tmp, 'staging'), self.src,
+                           os.path.join(self.tmp, 'dtrees'), section))
+        config_file = ConfigFile(path)
+        config_file.load()
+        view = SharedState().view()
+        Rst2dtreeTask(config_file=config_file, tag='docs',
+                      shared_state=view)()
+        task = RecordingTask(config_file=config_file, tag='search',
+                             shared_state=view)
+        task()
+        self.assertEqual(task.status, 0)
+        return task
+
+    def read(self, *path):
+        """Return the data of an index file."""
+        with open(os.path.join(self.index, *path), 'r') as fin:
+            return json.load(fin)
+
+    def postings(self, term):
+        """Return the map of document title to weight for a term."""
+        docs = self.read('docs.json')
+        postings = self.read('terms', '%x.json' % ord(term[0])).get(term, [])
+        return {docs[postings[index]][0]: postings[index + 1]
+                for index in range(0, len(postings), 2)}
+
+    def test_index(self):
+        """Ensure words and weighted titles are indexed."""
+        self.run_tasks()
+        self.assertEqual(sorted(doc[:2] for doc in self.read('docs.json')),
+                         [['Apples', 'apples.html'],
+                          ['Bananas', 'bananas.html']])
+        self.assertIn(['Apples', 'apples.html', ['Kinds']],
+                      self.read('docs.json'))
+        self.assertEqual(self.postings('fruit'), {'Apples': 1, 'Bananas': 1})
+        # in the title and the text
+        self.assertEqual(self.postings('apples'), {'Apples': 6})
+        self.assertEqual(self.postings('kinds'), {'Apples': 5})
+
+    def test_incremental(self):
+        """Ensure only changed documents and their shards are rewritten."""
+        self.run_tasks()
+        docs = self.read('docs.json')
+        kept = os.path.join(self.index, 'terms', '%x.json' % ord('g'))
+        mtime = os.stat(kept).st_mtime_ns
+        del RecordingTask.indexed[:]
+        self.write('bananas.rst', 'Bananas\n=======\n\nYellow berries.\n')
+        self.write('cherries.rst', 'Cherries\n========\n\nRed berries.\n')
+        self.run_tasks()
+        self.assertEqual(sorted(RecordingTask.indexed),
+                         ['Bananas', 'Cherries'])
+        self.assertEqual(self.read('docs.json')[:2], docs)
+        self.assertEqual(self.postings('berries'),
+                         {'Bananas': 1, 'Cherries': 1})
+        self.assertEqual(self.postings('fruit'), {'Apples': 1})
+        self.assertEqual(os.stat(kept).st_mtime_ns, mtime)
+        os.remove(os.path.join(self.src, 'apples.rst'))
+        self.run_tasks()
+        self.assertEqual(self.read('docs.json')[0], None)
+        self.assertFalse(os.path.exists(kept))
+
+    def test_default_output_dir(self):
+        """Ensure the index is written to the staging directory by default."""
+        staging = os.path.join(self.tmp, 'staging')
+        task = self.run_tasks('')
+        self.assertEqual(task.output_dir, staging)
+        self.index = staging
+        self.assertEqual(self.postings('fruit'), {'Apples': 1, 'Bananas': 1})
+        self.assertTrue(os.path.exists(staging + task.manifest_suffix))
@@ -0,0 +1,103 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's serve module."""
+import io
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+
+import escadrille.serve as serve
+
+
+class TestBuildServer(unittest.TestCase):
+    """Test the build daemon socket protocol."""
+
+    def setUp(self):
+        """Start a build server in a thread for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'test.sock')
+        self.requests = []
+        self.server = serve.BuildServer(self.path, self.build)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        """Stop the build server."""
+        self.server.shutdown()
+        self.thread.join()
+        self.server.server_close()
+        shutil.rmtree(self.tmp)
+
+    def build(self, request):
+        """Record the request and respond with a fake build."""
+        self.requests.append(request)
+        return {'status': len(request.get('only', [])), 'output': 'built\n'}
+
+    def test_round_trip(self):
+        """Ensure requests reach the build callable and responses return."""
+        response = serve.send_request(self.path, {'only': ['a', 'b']})
+        self.assertEqual(response, {'status': 2, 'output': 'built\n'})
+        self.assertEqual(self.requests, [{'only': ['a', 'b']}])
+
+    def test_already_serving(self):
+        """Ensure a second daemon refuses to replace a live socket."""
+        errors = []
+        self.server.handle_error = lambda *args: errors.append(args)
+        self.assertRaises(OSError, serve.BuildServer, self.path, self.build)
+        # the liveness check is not a request and gets no answer
+        self.assertEqual(serve.send_request(self.path, {})['output'],
+                         'built\n')
+        self.assertEqual(self.requests, [{}])
+        self.assertEqual(errors, [])
+
+    def test_stale_socket(self):
+        """Ensure a stale socket file is replaced."""
+        path = os.path.join(self.tmp, 'stale.sock')
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(path)
+        stale.close()
+        server = serve.BuildServer(path, self.build)
+        server.server_close()
+        self.assertFalse(os.path.exists(path))
+
+    def test_no_answer(self):
+        """Ensure the client fails when the daemon closes without answer."""
+        path = os.path.join(self.tmp, 'mute.sock')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as mute:
+            mute.bind(path)
+            mute.listen(1)
+
+            def read_and_close():
+                """Read the request and close without answering."""
+                connection = mute.accept()[0]
+                connection.makefile('rb').readline()
+                connection.close()
+
+            thread = threading.Thread(target=read_and_close)
+            thread.start()
+            argv, sys.argv = sys.argv, ['escadrille-client', '--socket', path]
+            try:
+                with redirect_stdout(io.StringIO()) as output:
+                    with self.assertRaises(SystemExit) as exit_info:
+                        serve.client_main()
+            finally:
+                sys.argv = argv
+                thread.join()
+        self.assertEqual(exit_info.exception.code, 1)
+        self.assertIn('without answering', output.getvalue())
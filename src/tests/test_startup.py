@@ -0,0 +1,95 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cold start of escadrille."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from escadrille import startup
+
+# the import time budget, in milliseconds, of the light command lines
+STARTUP_BUDGET_MS = 100
+# modules that the light command lines must never import
+HEAVY_MODULES = ['docutils', 'asyncio', 'concurrent.futures', 'PIL',
+                 'sqlite3', 'multiprocessing', 'importlib.metadata']
+
+
+class TestStartup(unittest.TestCase):
+    """Test the import cost of the light command lines."""
+
+    def setUp(self):
+        """Create a config file with its own cache directory."""
+        self.tmp = tempfile.mkdtemp()
+        self.config = os.path.join(self.tmp, 'site.cfg')
+        with open(self.config, 'w') as fout:
+            fout.write('[general]\ncache_dir=%s\n'
+                       'enabled_tasks=clean doctrees\n'
+                       '[clean]\ntask=clean\n'
+                       '[doctrees]\ntask=rst2dtree\ninputs=%s\n' %
+                       (self.tmp, self.tmp))
+
+    def tearDown(self):
+        """Remove the config file and cache directory."""
+        shutil.rmtree(self.tmp)
+
+    def args(self, *args):
+        """Return the command line using the config file and its cache."""
+        return ['-c', self.config, '--config-cache',
+                os.path.join(self.tmp, 'configs')] + list(args)
+
+    def assert_light(self, args):
+        """Ensure a command line stays within budget and imports no heavy
+        modules."""
+        returncode, records = startup.profile_command(args)
+        self.assertEqual(returncode, 0)
+        names = {name for name, _, _, _ in records}
+        for heavy in HEAVY_MODULES:
+            self.assertNotIn(heavy, names, 'escadrille %s imports %s' %
+                             (' '.join(args), heavy))
+        costs = startup.attribute(records)
+        total_us = sum(cost['self'] + cost['deps']
+                       for module, cost in costs.items()
+                       if module != startup.TOP_LEVEL)
+        self.assertLess(total_us / 1000.0, STARTUP_BUDGET_MS)
+
+    def test_version(self):
+        """Ensure --version is light."""
+        self.assert_light(['--version'])
+
+    def test_list(self):
+        """Ensure --list is light, with and without the task manifest."""
+        self.assert_light(self.args('-l'))
+        self.assert_light(self.args('-l'))
+
+    def test_default_config(self):
+        """Ensure --default-config is light once the manifest is cached."""
+        startup.profile_command(self.args('--default-config'))
+        self.assert_light(self.args('--default-config'))
+
+    def test_attribute(self):
+        """Ensure imports are attributed to the escadrille module."""
+        records = startup.parse_importtime([
+            'import time: self [us] | cumulative | imported package',
+            'import time:        10 |         10 |       sre',
+            'import time:        20 |         30 |     re',
+            'import time:         5 |         35 |   escadrille.core',
+            'import time:         1 |         36 | escadrille',
+            'import time:         7 |          7 | site',
+        ])
+        costs = startup.attribute(records)
+        self.assertEqual(costs['escadrille.core'],
+                         {'self': 5, 'deps': 30, 'heaviest': {'re': 30}})
+        self.assertEqual(costs['escadrille']['self'], 1)
+        self.assertEqual(costs[startup.TOP_LEVEL]['heaviest'], {'site': 7})
@@ -0,0 +1,69 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's state module."""
+import unittest
+
+from escadrille.state import SharedState
+
+
+class TestSharedState(unittest.TestCase):
+    """Test the logic of escadrille.state.SharedState and StateView."""
+
+    def setUp(self):
+        """Create a shared state for each unittest."""
+        self.state = SharedState({'a': 1, 'b': 2})
+
+    def test_isolation(self):
+        """Ensure views do not see each other's uncommitted changes."""
+        first, second = self.state.view(), self.state.view()
+        first['c'] = 3
+        del first['a']
+        self.assertEqual(dict(first), {'b': 2, 'c': 3})
+        self.assertEqual(dict(second), {'a': 1, 'b': 2})
+        self.assertEqual(first.changes, {'c': 3})
+        self.assertEqual(first.removed, {'a'})
+
+    def test_commit(self):
+        """Ensure concurrent views are committed without losing changes."""
+        first, second = self.state.view(), self.state.view()
+        first['c'] = 3
+        second['d'] = 4
+        del second['b']
+        self.state.commit(first, first)
+        self.state.commit(second, second)
+        self.assertEqual(dict(self.state.view()), {'a': 1, 'c': 3, 'd': 4})
+
+    def test_commit_none(self):
+        """Ensure a task returning no state leaves the state untouched."""
+        view = self.state.view()
+        view['c'] = 3
+        self.state.commit(view, None)
+        self.assertEqual(dict(self.state.view()), {'a': 1, 'b': 2})
+
+    def test_commit_plain_dict(self):
+        """Ensure tasks returning a plain dict have their changes found."""
+        view = self.state.view()
+        self.state.commit(view, {'a': 1, 'c': 3})
+        self.assertEqual(view.changes, {'c': 3})
+        self.assertEqual(dict(self.state.view()), {'a': 1, 'c': 3})
+
+    def test_compaction(self):
+        """Ensure the layers are flattened once the stack grows too deep."""
+        for index in range(SharedState.compact_limit):
+            view = self.state.view()
+            view[index] = index
+            self.state.commit(view, view)
+        self.assertEqual(len(self.state.layers), 1)
+        self.assertEqual(len(self.state.view()),
+                         SharedState.compact_limit + 2)
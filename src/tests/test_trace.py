@@ -0,0 +1,85 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's trace module."""
+import json
+import os
+import tempfile
+import unittest
+
+import escadrille.trace as trace
+
+
+class TestTrace(unittest.TestCase):
+    """Test the logic of escadrille.trace."""
+
+    def tearDown(self):
+        """Disable tracing after each unittest."""
+        trace.EVENTS = None
+
+    def test_disabled(self):
+        """Ensure nothing is recorded until tracing is enabled."""
+        with trace.span('ignored'):
+            pass
+        self.assertIsNone(trace.EVENTS)
+
+    def test_write(self):
+        """Ensure nested spans are written as complete events."""
+        trace.enable()
+        with trace.span('outer'):
+            with trace.span('inner', category='test', count=3):
+                pass
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            trace.write(path)
+            with open(path) as fin:
+                events = json.load(fin)['traceEvents']
+        finally:
+            os.remove(path)
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in spans],
+                         ['inner', 'outer'])
+        inner, outer = spans
+        self.assertEqual(inner['args'], {'count': '3'})
+        self.assertGreaterEqual(inner['ts'], outer['ts'])
+        self.assertLessEqual(inner['ts'] + inner['dur'],
+                             outer['ts'] + outer['dur'])
+
+    def test_async_span(self):
+        """Ensure blocks that await are recorded as matching async events."""
+        trace.enable()
+        with trace.async_span('first', count=1):
+            with trace.async_span('second'):
+                pass
+        spans = [event for event in trace.EVENTS if event['ph'] in 'be']
+        self.assertEqual([(event['name'], event['ph']) for event in spans],
+                         [('second', 'b'), ('second', 'e'),
+                          ('first', 'b'), ('first', 'e')])
+        self.assertEqual(spans[2]['args'], {'count': '1'})
+        self.assertEqual(spans[0]['id'], spans[1]['id'])
+        self.assertNotEqual(spans[0]['id'], spans[2]['id'])
+
+    def test_collect(self):
+        """Ensure the spans of worker functions are merged into the trace."""
+        self.assertEqual(trace.collect(None, sum, [1, 2]), (3, []))
+        trace.enable()
+        parent = trace.EVENTS
+        result, events = trace.collect(trace.tracing(), sum, [1, 2])
+        # collect runs in worker processes, which have traces of their own
+        self.assertIsNone(trace.EVENTS)
+        trace.EVENTS = parent
+        trace.merge(events)
+        self.assertEqual(result, 3)
+        self.assertEqual([event['name'] for event in trace.EVENTS
+                          if event['ph'] == 'X'], ['sum'])
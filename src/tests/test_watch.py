@@ -0,0 +1,172 @@
+# Copyright 2017 Curtis Sand <curtissand@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for escadrille's watch module and watch mode."""
+import os
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+import escadrille.watch as watch
+from escadrille.core import WatchMixin
+from escadrille.scheduler import build_graph
+
+
+class TestWatchers(unittest.TestCase):
+    """Test the logic of the escadrille.watch watchers."""
+
+    def setUp(self):
+        """Create a directory to watch for each unittest."""
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'page.rst')
+
+    def tearDown(self):
+        """Remove the watched directory."""
+        shutil.rmtree(self.tmp)
+
+    def check_watcher(self, watcher):
+        """Ensure the watcher reports a new file."""
+        try:
+            with open(self.path, 'w') as fout:
+                fout.write('content')
+            changed = watch.collect_changes(watcher, 0.05)
+        finally:
+            watcher.close()
+        self.assertIn(self.path, changed)
+
+    def test_polling(self):
+        """Ensure the polling watcher notices new files."""
+        watcher = watch.PollingWatcher([self.tmp])
+        watcher.interval = 0.05
+        self.check_watcher(watcher)
+
+    def test_create_watcher(self):
+        """Ensure the best available watcher notices new files."""
+        self.check_watcher(watch.create_watcher([self.tmp]))
+
+    def test_is_within(self):
+        """Ensure path containment does not match on name prefixes."""
+        self.assertTrue(watch.is_within('/a/b/c', '/a/b'))
+        self.assertTrue(watch.is_within('/a/b', '/a/b'))
+        self.assertFalse(watch.is_within('/a/bc', '/a/b'))
+
+
+class StopWatching(Exception):
+    """Raised by the scripted watcher once its changes are consumed."""
+
+
+class ScriptedWatcher(object):
+    """Watcher returning queued batches of changed paths."""
+
+    def __init__(self):
+        """Set up the queue of changes."""
+        self.changes = []
+        self.closed = False
+
+    def poll(self, timeout):
+        """Return the next queued changes, none while debouncing."""
+        if timeout is not None:
+            return set()
+        if not self.changes:
+            raise StopWatching()
+        return self.changes.pop(0)
+
+    def close(self):
+        """Record that the watcher was closed."""
+        self.closed = True
+
+
+class OutputTask(object):
+    """Task stub writing into /out."""
+
+    @staticmethod
+    def sanitize_path(path):
+        """Return the path unchanged."""
+        return path
+
+    @staticmethod
+    def output_paths():
+        """Return the written directory."""
+        return ['/out']
+
+
+class ScriptedWatch(WatchMixin):
+    """Watch mode with one task and a scripted watcher."""
+
+    debounce = 0
+
+    def __init__(self):
+        """Set up a config file stub and the records of the run."""
+        super().__init__()
+        self.config_file = type('Config', (object,), {'filename': '/cfg'})
+        self.watchers = []
+        self.rebuilds = []
+
+    def create_tasks(self):
+        """Return the one task."""
+        return OrderedDict([('docs', OutputTask())])
+
+    @staticmethod
+    def task_graph(tasks):
+        """Return the graph of the one task."""
+        return build_graph(OrderedDict([('docs', ([], ['html']))]))
+
+    def watched_paths(self, tasks):
+        """Watch the sources and, to check they are ignored, the outputs."""
+        return OrderedDict([('docs', ['/src', '/out'])])
+
+    def create_watcher(self, watched):
+        """Return a scripted watcher with one change to a source."""
+        watcher = ScriptedWatcher()
+        watcher.changes.append({'/src/a.rst'})
+        self.watchers.append(watcher)
+        return watcher
+
+    def run_tasks(self, tasks, graph, shared_state=None, checkpoint=None):
+        """Record the rebuild, the first one sees a save and its outputs."""
+        self.rebuilds.append(list(graph))
+        if len(self.rebuilds) == 1:
+            self.watchers[-1].changes.append({'/out/a.html', '/src/b.rst'})
+            self.watchers[-1].changes.append({'/out/b.html'})
+        return 0
+
+
+class TestWatchMixin(unittest.TestCase):
+    """Test the selection of tasks to rebuild in watch mode."""
+
+    def test_affected_tasks(self):
+        """Ensure the changed task and its consumers are rebuilt."""
+        graph = build_graph(OrderedDict([
+            ('make_dirs', ([], ['dirs'])),
+            ('galleries', (['dirs'], ['staging'])),
+            ('git_log', (['dirs'], ['staging'])),
+            ('doctrees', (['staging'], ['dtrees'])),
+        ]))
+        watched = {'galleries': ['/pics'], 'git_log': ['/repo/.git/refs'],
+                   'doctrees': ['/staging']}
+        self.assertEqual(
+            WatchMixin.affected_tasks(graph, watched, {'/pics/a/1.jpg'}),
+            ['galleries', 'doctrees'])
+        self.assertEqual(
+            WatchMixin.affected_tasks(graph, watched, {'/elsewhere'}), [])
+
+    def test_watch_inputs(self):
+        """Ensure changes saved during a rebuild trigger the next one."""
+        interface = ScriptedWatch()
+        with self.assertRaises(StopWatching):
+            interface.watch_inputs()
+        self.assertEqual(len(interface.watchers), 1)
+        self.assertTrue(interface.watchers[0].closed)
+        # the written /out/b.html alone does not rebuild
+        self.assertEqual(interface.rebuilds, [['docs'], ['docs']])